@@ -1,34 +1,36 @@
-import json
+"""
+Export du schéma OpenAPI sans serveur : importe freshkeeper.main et écrit
+docs/openapi.json et Doc/freshkeeper-openapi.yaml (PyYAML requis pour le YAML).
 
-import requests
+Usage :
+  python export_openapi_yaml.py
+  python export_openapi_yaml.py --json build/openapi.json --yaml ""
+"""
 
-try:
-    import yaml  # pyyaml
-except ImportError:
-    yaml = None
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+# import seul : ni scheduler ni connexion à la base
+os.environ.setdefault("ENABLE_SCHEDULER", "0")
+
+from freshkeeper.openapi_schema import JSON_EXPORT, YAML_EXPORT, export
 
 
 def main():
-    url = "http://127.0.0.1:8000/openapi.json"
-    print(f"Fetching {url} ...")
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    # Save JSON
-    with open("openapi.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    # Save YAML (fallback to json->.yaml if pyyaml missing)
-    if yaml:
-        with open("freshkeeper-openapi.yaml", "w", encoding="utf-8") as f:
-            yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
-        print("Wrote freshkeeper-openapi.yaml (via PyYAML)")
-    else:
-        with open("freshkeeper-openapi.yaml", "w", encoding="utf-8") as f:
-            f.write(json.dumps(data, ensure_ascii=False, indent=2))
-        print(
-            "PyYAML not found, wrote JSON text into .yaml (install with: pip install pyyaml)"
-        )
-    print("Done.")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default=str(JSON_EXPORT))
+    parser.add_argument("--yaml", default=str(YAML_EXPORT), help='"" : pas de YAML')
+    args = parser.parse_args()
+
+    from freshkeeper.main import app
+
+    schema = export(app, Path(args.json), Path(args.yaml) if args.yaml else None)
+    print(f"{len(schema.get('paths', {}))} chemins -> {args.json}")
+    if args.yaml:
+        print(f"YAML -> {args.yaml}")
 
 
 if __name__ == "__main__":
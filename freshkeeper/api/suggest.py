@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from freshkeeper.database import get_db
+from freshkeeper.database import get_read_db
 from freshkeeper.services.detection import (
     add_days_iso,
     guess_category_by_keywords,
@@ -30,8 +30,13 @@ def suggest_product(
         ..., min_length=1, description="Nom libre saisi par l'utilisateur"
     ),
     location: str = Query("pantry", pattern="^(pantry|fridge|freezer)$"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
+    return _suggest(db, name, location)
+
+
+def _suggest(db, name: str, location: str) -> Dict[str, Any]:
+    # `db` : Session, ou Connection (variante async via run_sync)
     n = normalize_name(name)
 
     # 1) exact match (name)
@@ -0,0 +1,188 @@
+# freshkeeper/cache.py
+"""
+Cache mémoire (par worker) des données de référence : catégories et
+emplacements, qui changent rarement mais sont relues à chaque appel du mobile.
+
+TTL + LRU borné, clé = (endpoint, paramètres de requête). Chaque entrée est
+étiquetée par ses tables sources :
+  - invalidate("products") est appelé par les chemins d'écriture de main.py,
+    qui publient aussi le changement aux autres workers (NOTIFY, cf.
+    freshkeeper/jobs/change_bus.py) : les TTL peuvent donc être longs ;
+  - quand la version des tables est connue (freshkeeper/conditional.py), elle
+    est stockée avec l'entrée et une version différente vaut un miss : une
+    écriture faite par un AUTRE worker est donc vue immédiatement, sans
+    attendre le TTL (et l'ETag envoyé correspond toujours au contenu servi).
+
+REF_CACHE_TTL_SECONDS (300 ; 0 désactive), REF_CACHE_MAXSIZE (256).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires: float
+    tables: FrozenSet[str]
+    version: Optional[str]
+
+
+class TTLCache:
+    """LRU borné à `maxsize` entrées, chacune valable `ttl` secondes."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, version: Optional[str] = None) -> Tuple[bool, Any]:
+        """(trouvé, valeur) ; entrée expirée ou d'une autre version = miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (
+                entry.expires <= now
+                or (version is not None and entry.version != version)
+            ):
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tables: Sequence[str] = (),
+        version: Optional[str] = None,
+    ) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        entry = _Entry(value, time.monotonic() + self.ttl, frozenset(tables), version)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        tables: Sequence[str] = (),
+        version: Optional[str] = None,
+    ) -> Any:
+        found, value = self.get(key, version)
+        if found:
+            return value
+        value = loader()
+        self.set(key, value, tables, version)
+        return value
+
+    def invalidate(self, *tables: str) -> int:
+        """
+        Supprime les entrées issues de `tables` (toutes si aucune), y compris
+        celles étiquetées par ligne ("products:42") ; retourne leur nombre.
+        """
+        if not tables:
+            return self._drop(None)
+        prefixes = tuple(f"{t}:" for t in tables)
+        return self._drop(lambda tag: tag in tables or tag.startswith(prefixes))
+
+    def evict(self, table: str, keys: Optional[Iterable[Any]] = None) -> int:
+        """
+        Éviction fine : entrées de la table entière ("products") et celles des
+        seules lignes `keys` ("products:42") ; sans `keys`, comme invalidate().
+        """
+        if keys is None:
+            return self.invalidate(table)
+        wanted = {table, *(f"{table}:{k}" for k in keys)}
+        return self._drop(wanted.__contains__)
+
+    def _drop(self, match: Optional[Callable[[str], bool]]) -> int:
+        with self._lock:
+            keys = [
+                k
+                for k, e in self._data.items()
+                if match is None or any(match(t) for t in e.tables)
+            ]
+            for k in keys:
+                del self._data[k]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+reference_cache = TTLCache(
+    maxsize=int(_get_float("REF_CACHE_MAXSIZE", 256)),
+    ttl=_get_float("REF_CACHE_TTL_SECONDS", 300.0),
+)
+
+
+def cache_key(name: str, params: Any = None) -> Hashable:
+    """Clé (endpoint, paramètres) ; `params` : request.query_params ou dict."""
+    items = (
+        params.multi_items()
+        if hasattr(params, "multi_items")
+        else (params or {}).items()
+    )
+    return (name, tuple(sorted(items)))
+
+
+def invalidate(*tables: str) -> int:
+    """Hook des chemins d'écriture : invalide les entrées issues de `tables`."""
+    return reference_cache.invalidate(*tables)
+
+
+def prime(name: str, loader: Callable[[], Any], tables: Sequence[str]) -> None:
+    """Primer de warm-up : charge l'entrée sans paramètres de `name`."""
+    from freshkeeper.conditional import current_version
+
+    version = current_version(tables)  # lue AVANT les lignes (cf. conditional.py)
+    reference_cache.set(cache_key(name), loader(), tables, version)
@@ -0,0 +1,359 @@
+# freshkeeper/conditional.py
+"""
+GET conditionnels (ETag / Last-Modified / 304) pour les listes lues en boucle
+par le mobile : /api/products, /api/lots, /api/alerts, /api/categories,
+/api/storage-locations.
+
+Le validateur est calculé AVANT la lecture des lignes, à partir de la version
+des tables sources :
+  - journal `table_change_log` (scripts/sql/patch_table_changes.sql) : une
+    ligne ajoutée par trigger à chaque INSERT/UPDATE/DELETE/TRUNCATE, sans
+    verrou partagé entre écrivains ; version = sum(weight), nombre
+    d'instructions validées. Compacté par le scheduler (compact_table_changes,
+    TABLE_CHANGES_COMPACT_MINUTES) et, sans attendre, dès qu'une lecture de
+    version somme plus de TABLE_CHANGES_COMPACT_ROWS lignes : quelques lignes
+    par table à sommer, même sans scheduler ;
+  - à défaut, count(*) + max(updated_at) de la table ;
+  - sinon (pas de updated_at, ou base non PostgreSQL) : pas de validateur, la
+    route répond normalement.
+
+Si le client renvoie le même ETag (If-None-Match), on répond 304 sans lire ni
+sérialiser les lignes.
+
+Ordre de lecture : validateur puis données. Une écriture intercalée donne au
+pire un ETag plus ancien que le contenu (rechargement superflu), jamais
+l'inverse.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import weakref
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+CHANGES_TABLE = "table_change_log"
+# un seul compactage à la fois, tous workers confondus (verrou de transaction)
+COMPACT_LOCK_KEY = zlib.crc32(b"freshkeeper:table_change_log")
+
+# Source de version détectée une fois par engine :
+# {engine: {table: "seq" | "updated_at" | None}}
+_sources: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+@dataclass
+class Validator:
+    etag: str
+    last_modified: Optional[datetime] = None
+    version: Optional[str] = (
+        None  # versions des tables seules (cf. freshkeeper/cache.py)
+    )
+    # horodatage fiable pour If-Modified-Since. Jamais le cas ici : avec
+    # max(updated_at), une suppression ne bouge pas la date ; dans le journal,
+    # une transaction validée tard peut porter une date antérieure à la
+    # dernière servie. L'ETag (If-None-Match) reste exact.
+    exact_time: bool = False
+
+
+def _detect(conn, tables: Sequence[str]) -> Dict[str, Optional[str]]:
+    if conn.dialect.name != "postgresql":
+        return {t: None for t in tables}
+    has_changes = conn.execute(
+        text("SELECT to_regclass(:t) IS NOT NULL"), {"t": CHANGES_TABLE}
+    ).scalar()
+    if has_changes:
+        return {t: "seq" for t in tables}
+    with_updated_at = {
+        r[0]
+        for r in conn.execute(
+            text(
+                "SELECT table_name FROM information_schema.columns "
+                "WHERE column_name = 'updated_at' AND table_name = ANY(:t) "
+                "AND table_schema = ANY(current_schemas(false))"
+            ),
+            {"t": list(tables)},
+        )
+    }
+    return {t: ("updated_at" if t in with_updated_at else None) for t in tables}
+
+
+def _source_of(eng, conn, table: str) -> Optional[str]:
+    known = _sources.setdefault(eng, {})
+    if table not in known:
+        known.update(_detect(conn, [table]))
+    return known[table]
+
+
+def table_versions(
+    eng, tables: Sequence[str]
+) -> Optional[Tuple[List[str], Optional[datetime], bool]]:
+    """
+    (versions, dernière modification, exact_time) des tables, ou None si une
+    des tables n'a pas de source de version.
+    """
+    with eng.connect() as conn:
+        return _versions_on(conn, eng, tables)
+
+
+def _versions_on(conn, eng, tables: Sequence[str]):
+    # `eng` : clé du cache de détection (engine sync, ou .sync_engine en async)
+    versions: List[str] = []
+    stamps: List[datetime] = []
+    kinds = {t: _source_of(eng, conn, t) for t in tables}
+    if any(k is None for k in kinds.values()):
+        return None
+    seq_tables = [t for t, k in kinds.items() if k == "seq"]
+    seq_rows = {}
+    if seq_tables:
+        rows = conn.execute(
+            text(
+                f"SELECT name, sum(weight) AS seq, max(changed_at) AS changed_at, "
+                f"count(*) AS n FROM {CHANGES_TABLE} WHERE name = ANY(:t) "
+                f"GROUP BY name"
+            ),
+            {"t": seq_tables},
+        ).all()
+        seq_rows = {r.name: (r.seq, r.changed_at) for r in rows}
+        _maybe_compact(sum(r.n for r in rows))
+    for t in tables:
+        if kinds[t] == "seq":
+            seq, changed_at = seq_rows.get(t, (0, None))
+            versions.append(f"{t}:{seq}")
+        else:
+            count, changed_at = conn.execute(
+                text(f"SELECT count(*), max(updated_at)::timestamptz FROM {t}")
+            ).one()
+            versions.append(
+                f"{t}:{count}:{changed_at.isoformat() if changed_at else ''}"
+            )
+        if changed_at is not None:
+            stamps.append(changed_at)
+    return versions, (max(stamps) if stamps else None), False
+
+
+# Lignes visibles remplacées par une ligne par table, même somme : la version
+# ne bouge pas. Une ligne encore non validée n'est pas vue, elle s'ajoutera.
+COMPACT_SQL = text(
+    f"""
+    WITH folded AS (
+        DELETE FROM {CHANGES_TABLE} RETURNING name, weight, changed_at
+    ),
+    kept AS (
+        INSERT INTO {CHANGES_TABLE} (name, weight, changed_at)
+        SELECT name, sum(weight), max(changed_at) FROM folded GROUP BY name
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM folded) - (SELECT count(*) FROM kept)
+    """
+)
+
+
+def compact_table_changes(engine=None) -> int:
+    """
+    Compacte le journal des versions ; renvoie les lignes retirées (0 si un
+    autre compactage est en cours).
+    """
+    from freshkeeper.database import get_engine
+
+    with (engine or get_engine()).begin() as c:
+        present = c.execute(
+            text("SELECT to_regclass(:t) IS NOT NULL"), {"t": CHANGES_TABLE}
+        ).scalar()
+        if not present:
+            return 0
+        locked = c.execute(
+            text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": COMPACT_LOCK_KEY}
+        ).scalar()
+        return int(c.execute(COMPACT_SQL).scalar()) if locked else 0
+
+
+def _get_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+_compacting = threading.Lock()
+
+
+def _maybe_compact(rows: int) -> None:
+    """
+    Journal trop long pour la lecture qui vient de le sommer : compactage en
+    arrière-plan sur le primaire (un à la fois par process), la requête
+    n'attend pas. TABLE_CHANGES_COMPACT_ROWS=0 : scheduler seul.
+    """
+    limit = _get_int("TABLE_CHANGES_COMPACT_ROWS", 1000)
+    if limit <= 0 or rows <= limit or not _compacting.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            n = compact_table_changes()
+            log.debug("Journal des versions compacté à la lecture : %s lignes", n)
+        except Exception:
+            log.warning("Compactage du journal des versions échoué", exc_info=True)
+        finally:
+            _compacting.release()
+
+    threading.Thread(target=run, name="freshkeeper-compact", daemon=True).start()
+
+
+async def table_versions_async(aeng, tables: Sequence[str]):
+    """table_versions() sur un engine async (mêmes requêtes, via run_sync)."""
+    async with aeng.connect() as conn:
+        return await conn.run_sync(_versions_on, aeng.sync_engine, tables)
+
+
+def _lookup(tables: Sequence[str], engine=None):
+    from freshkeeper.database import get_read_engine
+
+    if engine is None and not os.getenv("DATABASE_URL"):
+        return None
+    try:
+        return table_versions(engine or get_read_engine(), tables)
+    except Exception:
+        log.debug("Validateur indisponible pour %s", tables, exc_info=True)
+        return None
+
+
+def current_version(tables: Sequence[str], engine=None) -> Optional[str]:
+    """Version courante de `tables` (None si inconnue), hors requête HTTP."""
+    found = _lookup(tables, engine)
+    return "|".join(found[0]) if found else None
+
+
+async def _lookup_async(tables: Sequence[str], engine=None):
+    from freshkeeper.database import get_read_async_engine
+
+    if engine is None and not os.getenv("DATABASE_URL"):
+        return None
+    try:
+        return await table_versions_async(engine or get_read_async_engine(), tables)
+    except Exception:
+        log.debug("Validateur indisponible pour %s", tables, exc_info=True)
+        return None
+
+
+def compute_validator(
+    request: Request, tables: Sequence[str], engine=None
+) -> Optional[Validator]:
+    """Validateur de la réponse (None : pas de GET conditionnel possible)."""
+    return _validator(request, _lookup(tables, engine))
+
+
+def _validator(request: Request, found) -> Optional[Validator]:
+    from freshkeeper.streaming import wants_stream
+
+    if found is None:
+        return None
+    versions, last_modified, exact = found
+    # même contenu <=> mêmes versions + même requête (filtres, page, format)
+    key = "|".join(
+        [
+            os.getenv("FRESHKEEPER_VERSION", "0.1.0"),
+            request.url.path,
+            request.url.query,
+            "ndjson" if wants_stream(request) else "json",
+            *versions,
+        ]
+    )
+    digest = hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+    return Validator(f'W/"{digest}"', last_modified, "|".join(versions), exact)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # comparaison faible (RFC 9110 §13.1.2) : on ignore le préfixe W/
+    if header.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == wanted for t in header.split(","))
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+@dataclass
+class Conditional:
+    """Résultat de `conditional_get` : 304 à renvoyer, ou en-têtes à poser."""
+
+    validator: Optional[Validator] = None
+    not_modified: bool = False
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.validator.version if self.validator else None
+
+    def not_modified_response(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+    def apply(self, response: Response) -> Response:
+        response.headers.update(self.headers)
+        return response
+
+
+def conditional_get(request: Request, *tables: str, engine=None) -> Conditional:
+    """
+    Évalue If-None-Match / If-Modified-Since contre la version de `tables`.
+
+        cond = conditional_get(request, "lots")
+        if cond.not_modified:
+            return cond.not_modified_response()
+        ...
+        return cond.apply(response)
+    """
+    return _evaluate(request, compute_validator(request, tables, engine))
+
+
+async def conditional_get_async(
+    request: Request, *tables: str, engine=None
+) -> Conditional:
+    """conditional_get() pour les handlers async (`engine` : AsyncEngine)."""
+    found = await _lookup_async(tables, engine)
+    return _evaluate(request, _validator(request, found))
+
+
+def _evaluate(request: Request, validator: Optional[Validator]) -> Conditional:
+    if validator is None:
+        return Conditional()
+    headers = {"ETag": validator.etag, "Cache-Control": "no-cache"}
+    if validator.last_modified is not None:
+        lm = validator.last_modified
+        if lm.tzinfo is None:
+            lm = lm.replace(tzinfo=timezone.utc)
+        lm = lm.astimezone(timezone.utc)
+        headers["Last-Modified"] = format_datetime(lm, usegmt=True)
+    else:
+        lm = None
+
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        # If-None-Match prime sur If-Modified-Since (RFC 9110 §13.2.2)
+        not_modified = _etag_matches(inm, validator.etag)
+    else:
+        ims = request.headers.get("if-modified-since")
+        not_modified = bool(
+            ims
+            and lm is not None
+            and validator.exact_time
+            and _not_modified_since(ims, lm)
+        )
+    return Conditional(validator, not_modified, headers)
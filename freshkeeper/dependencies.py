@@ -1,10 +1,3 @@
 ﻿# app/dependencies.py
-from freshkeeper.database import SessionLocal
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# get_db unique : session sur le pool partagé de freshkeeper.database
+from freshkeeper.database import get_conn, get_db  # noqa: F401
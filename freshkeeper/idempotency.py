@@ -0,0 +1,404 @@
+# freshkeeper/idempotency.py
+"""
+En-tête Idempotency-Key sur les POST de création (produits, lots, lots/bulk).
+
+Les upserts de lots additionnent les quantités : un POST rejoué après un
+timeout du mobile (axios, 15 s) doublait le stock. Avec Idempotency-Key, le
+premier passage réserve la clé, exécute la requête et stocke la réponse ; les
+rejeux renvoient la réponse stockée (en-tête Idempotent-Replayed: true) sans
+toucher aux tables.
+
+  - Clés propres à chaque client : préfixées par une empreinte de
+    l'en-tête Authorization (ou, à défaut, X-Client-Id, toujours envoyé par
+    le mobile) ; deux clients qui tirent la même clé ne voient jamais la
+    réponse l'un de l'autre. Sans l'un ni l'autre, pas de portée : la
+    requête passe telle quelle, sans protection contre les rejeux.
+  - Table idempotency_keys (scripts/sql/patch_idempotency_keys.sql) : clé en
+    clé primaire, empreinte de la requête (16 octets), statut, corps.
+  - Une seule instruction par requête : INSERT ... ON CONFLICT DO UPDATE
+    (réservation, ou reprise d'une clé expirée) + lecture de la ligne
+    existante dans la même CTE, par la clé primaire.
+  - Les réponses terminées sont aussi gardées en mémoire par worker
+    (IDEMPOTENCY_CACHE_SIZE, 1024) : une rafale de rejeux ne touche pas la base.
+  - Même clé, requête différente : 422. Clé en cours de traitement : 409 +
+    Retry-After ; réservation orpheline (worker tombé) reprise après
+    IDEMPOTENCY_PENDING_SECONDS (60).
+  - Réponse 5xx : la clé est libérée, le rejeu réexécute la requête.
+  - Rétention IDEMPOTENCY_TTL_HOURS (24) ; purge par le scheduler (leader).
+
+Sans la table (patch non appliqué) ou avec IDEMPOTENCY_ENABLED=0, les
+requêtes passent telles quelles.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from freshkeeper.metrics import canonical_route
+
+log = logging.getLogger(__name__)
+
+HEADER = b"idempotency-key"
+# portée de la clé : premier en-tête présent
+CLIENT_HEADERS = (b"authorization", b"x-client-id")
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+TABLE = "idempotency_keys"
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() not in ("0", "false", "no", "")
+
+
+# Réservation ou lecture de l'existant, un seul aller-retour : la sous-requête
+# voit l'instantané d'avant l'INSERT, donc la ligne déjà commitée ; une clé
+# réservée par une transaction encore ouverte n'apparaît ni dans l'un ni dans
+# l'autre (=> en cours).
+CLAIM_SQL = text(
+    """
+    WITH claimed AS (
+        INSERT INTO idempotency_keys (key, fingerprint)
+        VALUES (:key, :fingerprint)
+        ON CONFLICT (key) DO UPDATE
+           SET fingerprint = EXCLUDED.fingerprint, status = NULL,
+               content_type = NULL, body = NULL, created_at = now()
+         WHERE idempotency_keys.created_at < now() - make_interval(secs => :ttl)
+            OR (idempotency_keys.status IS NULL
+                AND idempotency_keys.created_at
+                    < now() - make_interval(secs => :pending))
+        RETURNING key
+    )
+    SELECT TRUE AS claimed, NULL::bytea AS fingerprint, NULL::smallint AS status,
+           NULL::text AS content_type, NULL::bytea AS body
+      FROM claimed
+    UNION ALL
+    SELECT FALSE, fingerprint, status, content_type, body
+      FROM idempotency_keys
+     WHERE key = :key AND NOT EXISTS (SELECT 1 FROM claimed)
+    """
+)
+
+STORE_SQL = text(
+    """
+    UPDATE idempotency_keys
+       SET status = :status, content_type = :content_type, body = :body
+     WHERE key = :key AND fingerprint = :fingerprint
+    """
+)
+
+RELEASE_SQL = text(
+    "DELETE FROM idempotency_keys WHERE key = :key AND fingerprint = :fingerprint"
+)
+
+PURGE_SQL = text(
+    "DELETE FROM idempotency_keys WHERE created_at < now() - make_interval(secs => :ttl)"
+)
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: bytes
+    status: int
+    content_type: Optional[str]
+    body: bytes
+    expires_at: float  # time.monotonic()
+
+
+class _ResponseCache:
+    """LRU borné des réponses terminées (immutables jusqu'à expiration)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._items.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return stored
+
+    def put(self, key: str, stored: StoredResponse) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = stored
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+# {engine : table présente ?} ; vérifié une fois par engine
+_tables: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _engine():
+    from freshkeeper.database import get_engine
+
+    eng = get_engine()
+    if eng not in _tables:
+        with eng.connect() as c:
+            present = c.execute(
+                text("SELECT to_regclass(:t) IS NOT NULL"), {"t": TABLE}
+            ).scalar()
+        if not present:
+            log.warning("Table %s absente : Idempotency-Key ignoré", TABLE)
+        _tables[eng] = bool(present)
+    return eng if _tables[eng] else None
+
+
+def scoped_key(headers, key: str) -> Optional[str]:
+    """
+    `key` préfixée par l'empreinte du client (Authorization, X-Client-Id) ;
+    None pour une requête anonyme.
+    """
+    found = dict(headers)
+    for name in CLIENT_HEADERS:
+        client = found.get(name)
+        if client:
+            digest = hashlib.blake2b(name + b"\0" + client, digest_size=8)
+            return f"{digest.hexdigest()}:{key}"
+    return None
+
+
+def fingerprint(method: str, path: str, query: bytes, body: bytes) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in (method.encode(), path.encode(), query, body):
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.digest()
+
+
+def purge_expired(engine=None, ttl_hours: Optional[float] = None) -> int:
+    """Supprime les clés plus vieilles que IDEMPOTENCY_TTL_HOURS ; renvoie le nombre."""
+    from freshkeeper.database import get_engine
+
+    ttl = (
+        ttl_hours if ttl_hours is not None else _get_float("IDEMPOTENCY_TTL_HOURS", 24)
+    )
+    with (engine or get_engine()).begin() as c:
+        return c.execute(PURGE_SQL, {"ttl": ttl * 3600}).rowcount
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI : POST avec Idempotency-Key exécuté au plus une fois."""
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = _flag("IDEMPOTENCY_ENABLED", "1")
+        self.ttl = _get_float("IDEMPOTENCY_TTL_HOURS", 24) * 3600
+        self.pending = _get_float("IDEMPOTENCY_PENDING_SECONDS", 60)
+        self.cache = _ResponseCache(int(_get_float("IDEMPOTENCY_CACHE_SIZE", 1024)))
+
+    def _applies(self, scope) -> bool:
+        return (
+            self.enabled
+            and scope["type"] == "http"
+            and scope["method"] == "POST"
+            and not canonical_route(scope["path"]).startswith("/admin")
+        )
+
+    async def __call__(self, scope, receive, send):
+        key = None
+        if self._applies(scope):
+            for name, value in scope["headers"]:
+                if name == HEADER:
+                    key = value.decode("latin-1").strip()
+                    break
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _json(send, 400, b'{"detail":"Idempotency-Key too long"}')
+            return
+        key = scoped_key(scope["headers"], key)
+        if key is None:  # anonyme : une portée commune mélangerait les clients
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fp = fingerprint(scope["method"], scope["path"], scope["query_string"], body)
+
+        stored = self.cache.get(key)
+        if stored is None:
+            eng = await run_in_threadpool(_engine)
+            if eng is None:
+                await self.app(scope, _replay(body), send)
+                return
+            claimed, stored = await run_in_threadpool(self._claim, eng, key, fp)
+            if claimed:
+                await self._execute(eng, key, fp, scope, body, send)
+                return
+            if stored is None:
+                await _json(
+                    send,
+                    409,
+                    b'{"detail":"A request with this Idempotency-Key is in progress"}',
+                    [(b"retry-after", b"1")],
+                )
+                return
+            self.cache.put(key, stored)
+
+        if stored.fingerprint != fp:
+            await _json(
+                send,
+                422,
+                b'{"detail":"Idempotency-Key reused with a different request"}',
+            )
+            return
+        await _send_stored(send, stored)
+
+    def _claim(self, eng, key: str, fp: bytes) -> Tuple[bool, Optional[StoredResponse]]:
+        with eng.begin() as c:
+            row = c.execute(
+                CLAIM_SQL,
+                {
+                    "key": key,
+                    "fingerprint": fp,
+                    "ttl": self.ttl,
+                    "pending": self.pending,
+                },
+            ).first()
+        if row is None or row.claimed:
+            return row is not None, None
+        if row.status is None:  # réservée par une requête en cours
+            return False, None
+        return False, self._stored(bytes(row.fingerprint), row)
+
+    def _stored(self, fp: bytes, row) -> StoredResponse:
+        return StoredResponse(
+            fp,
+            row.status,
+            row.content_type,
+            bytes(row.body or b""),
+            time.monotonic() + self.ttl,
+        )
+
+    async def _execute(self, eng, key, fp, scope, body, send):
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _replay(body), capture)
+        except BaseException:
+            await run_in_threadpool(_release, eng, key, fp)
+            raise
+
+        status = start.get("status", 500)
+        if status >= 500:
+            await run_in_threadpool(_release, eng, key, fp)
+            return
+        content_type = None
+        for name, value in start.get("headers", []):
+            if name == b"content-type":
+                content_type = value.decode("latin-1")
+        stored = StoredResponse(
+            fp, status, content_type, b"".join(chunks), time.monotonic() + self.ttl
+        )
+        await run_in_threadpool(_store, eng, key, stored)
+        self.cache.put(key, stored)
+
+
+def _store(eng, key: str, stored: StoredResponse) -> None:
+    with eng.begin() as c:
+        c.execute(
+            STORE_SQL,
+            {
+                "key": key,
+                "fingerprint": stored.fingerprint,
+                "status": stored.status,
+                "content_type": stored.content_type,
+                "body": stored.body,
+            },
+        )
+
+
+def _release(eng, key: str, fp: bytes) -> None:
+    with eng.begin() as c:
+        c.execute(RELEASE_SQL, {"key": key, "fingerprint": fp})
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay(body: bytes):
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+async def _json(send, status: int, body: bytes, headers=()) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_stored(send, stored: StoredResponse) -> None:
+    headers = [
+        (b"content-length", str(len(stored.body)).encode()),
+        (REPLAYED_HEADER, b"true"),
+    ]
+    if stored.content_type:
+        headers.append((b"content-type", stored.content_type.encode("latin-1")))
+    await send(
+        {"type": "http.response.start", "status": stored.status, "headers": headers}
+    )
+    await send({"type": "http.response.body", "body": stored.body})
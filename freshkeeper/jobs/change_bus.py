@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import select
+import socket
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "freshkeeper_changes"
+# NOTIFY refuse les charges > 8000 octets : au-delà, invalidation de la table entière
+MAX_PAYLOAD = 7900
+
+_BUS_SINGLETON: "ChangeListener | None" = None
+
+Handler = Callable[[str, Optional[List[Any]]], Any]
+
+
+def _cache_handler(table: str, keys: Optional[List[Any]]) -> None:
+    from freshkeeper.cache import reference_cache
+
+    reference_cache.evict(table, keys)
+
+
+_HANDLERS: List[Handler] = [_cache_handler]
+
+
+def on_change(fn: Handler) -> Handler:
+    """Enregistre un handler (table, keys|None) appelé à chaque notification."""
+    _HANDLERS.append(fn)
+    return fn
+
+
+def is_bus_enabled() -> bool:
+    return os.getenv("CHANGE_BUS_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+
+
+def publish(conn, table: str, keys: Optional[Iterable[Any]] = None) -> None:
+    """
+    NOTIFY freshkeeper_changes dans la transaction de l'écriture : Postgres ne
+    le livre qu'au COMMIT (et jamais en cas de ROLLBACK). `conn` : Connection
+    ou Session. No-op hors PostgreSQL.
+    """
+    bind = conn.get_bind() if hasattr(conn, "get_bind") else conn
+    if bind.dialect.name != "postgresql":
+        return
+    payload = json.dumps(
+        {"table": table, "keys": list(keys) if keys is not None else None},
+        default=str,
+    )
+    if len(payload) > MAX_PAYLOAD:
+        payload = json.dumps({"table": table, "keys": None})
+    conn.execute(text("SELECT pg_notify(:c, :p)"), {"c": CHANNEL, "p": payload})
+
+
+def dispatch(payload: str) -> None:
+    try:
+        msg = json.loads(payload)
+        table, keys = msg["table"], msg.get("keys")
+    except Exception:
+        logger.warning("Notification %s illisible : %r", CHANNEL, payload)
+        return
+    for fn in list(_HANDLERS):
+        try:
+            fn(table, keys)
+        except Exception:
+            logger.exception("Handler %s en erreur", getattr(fn, "__name__", fn))
+
+
+class ChangeListener:
+    """
+    Thread d'écoute par worker : LISTEN freshkeeper_changes sur une connexion
+    dédiée (détachée du pool, autocommit) et appel des handlers à chaque
+    NOTIFY (par défaut, éviction du cache mémoire).
+
+    Une notification émise pendant une coupure est perdue : à chaque
+    (re)connexion, le cache est vidé entièrement avant de reprendre l'écoute.
+    """
+
+    def __init__(self, engine=None, poll_seconds: float = 1.0):
+        from freshkeeper.database import get_engine
+
+        self.engine = engine or get_engine()
+        self.poll_seconds = poll_seconds
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._dbapi = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = threading.Event()
+        self.since: Optional[datetime] = None
+        self.received = 0
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> threading.Thread:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="freshkeeper-change-bus", daemon=True
+            )
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close()
+
+    def _connect(self):
+        raw = self.engine.raw_connection()
+        dbapi = raw.driver_connection
+        raw.detach()  # connexion propre au thread : ne revient jamais au pool
+        self._dbapi = dbapi
+        dbapi.autocommit = True
+        cur = dbapi.cursor()
+        cur.execute(f"LISTEN {CHANNEL}")
+        cur.close()
+        return dbapi
+
+    def _close(self) -> None:
+        dbapi, self._dbapi = self._dbapi, None
+        self.connected.clear()
+        if dbapi is not None:
+            try:
+                dbapi.close()
+            except Exception:
+                pass
+
+    def _wait(self, dbapi) -> List[str]:
+        if hasattr(dbapi, "notifies") and callable(dbapi.notifies):
+            # psycopg 3 : générateur borné par timeout
+            return [n.payload for n in dbapi.notifies(timeout=self.poll_seconds)]
+        # psycopg2 : select() sur le socket puis poll()
+        if select.select([dbapi], [], [], self.poll_seconds) == ([], [], []):
+            return []
+        dbapi.poll()
+        payloads = [n.payload for n in dbapi.notifies]
+        dbapi.notifies.clear()
+        return payloads
+
+    def _run(self) -> None:
+        from freshkeeper.cache import invalidate
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                dbapi = self._connect()
+                invalidate()  # notifications manquées pendant la coupure
+                self.since = datetime.now(timezone.utc)
+                self.connected.set()
+                backoff = 1.0
+                logger.info("Worker %s à l'écoute de %s", self.worker, CHANNEL)
+                while not self._stop.is_set():
+                    for payload in self._wait(dbapi):
+                        self.received += 1
+                        dispatch(payload)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.last_error = str(e)
+                self.reconnects += 1
+                logger.warning("Écoute %s interrompue (%s), reprise", CHANNEL, e)
+                self._close()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+        self._close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker,
+            "channel": CHANNEL,
+            "connected": self.connected.is_set(),
+            "listening_since": self.since.isoformat() if self.since else None,
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
+
+def install_change_listener(engine=None) -> Optional[ChangeListener]:
+    """Démarre l'écoute (PostgreSQL seulement) ; None si désactivée."""
+    global _BUS_SINGLETON
+    if _BUS_SINGLETON is not None:
+        return _BUS_SINGLETON
+    listener = ChangeListener(engine)
+    if listener.engine.dialect.name != "postgresql":
+        return None
+    _BUS_SINGLETON = listener
+    listener.start()
+    return listener
+
+
+def get_change_listener() -> ChangeListener | None:
+    return _BUS_SINGLETON
+
+
+def shutdown_change_listener() -> None:
+    global _BUS_SINGLETON
+    listener, _BUS_SINGLETON = _BUS_SINGLETON, None
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.triggers.date import DateTrigger
+
+from freshkeeper.jobs.change_bus import on_change
+
+logger = logging.getLogger(__name__)
+
+TIMER_JOB_ID = "alerts_scan_job"
+_TIMER_SINGLETON: "ExpiryTimer | None" = None
+
+# Chargement des transitions par paquets (curseur serveur, mémoire bornée)
+_LOAD_BATCH = 10_000
+
+
+class DayWheel:
+    """
+    Roue de timers à la journée : {jour ordinal -> array('q') d'ids produits}
+    + un tas des jours non vides. Les transitions d'alertes sont à la journée
+    (comparaisons sur des DATE), donc un seau par jour suffit : ~8 octets par
+    entrée au lieu d'un tuple (datetime, id) par transition dans un heapq.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: Dict[int, array] = {}
+        self._days: List[int] = []
+        self._lock = threading.Lock()
+
+    def add(self, day: date, product_id: int) -> None:
+        key = day.toordinal()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = array("q")
+                heapq.heappush(self._days, key)
+            bucket.append(product_id)
+
+    def next_day(self) -> Optional[date]:
+        with self._lock:
+            return date.fromordinal(self._days[0]) if self._days else None
+
+    def pop_due(self, today: date) -> Set[int]:
+        """Vide tous les seaux <= today et retourne les ids (dédoublonnés)."""
+        limit = today.toordinal()
+        due: Set[int] = set()
+        with self._lock:
+            while self._days and self._days[0] <= limit:
+                due.update(self._buckets.pop(heapq.heappop(self._days)))
+        return due
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(b) for b in self._buckets.values())
+
+
+def transitions(
+    quantity, expiry_date: Optional[date], today: date, soon_days: int
+) -> List[date]:
+    """
+    Prochains jours (> today) où l'état d'alerte d'un produit change :
+      - entrée dans la fenêtre SOON (expiry_date - soon_days)
+      - passage EXPIRED (expiry_date)
+      - OUT_OF_STOCK : l'alerte est re-datée chaque jour (due_date = today),
+        donc réveil le lendemain tant que le stock est nul.
+    """
+    days: List[date] = []
+    if quantity is not None and quantity < 1:  # trunc(quantity) <= 0
+        days.append(today + timedelta(days=1))
+    if expiry_date is not None:
+        for day in (expiry_date - timedelta(days=soon_days), expiry_date):
+            if day > today:
+                days.append(day)
+    return days
+
+
+def _utc_today() -> date:
+    # même horloge que run_scan
+    return datetime.utcnow().date()
+
+
+def _urgent(quantity, expiry_date: Optional[date], today: date, soon_days: int) -> bool:
+    """Déjà en alerte : stock tombé à zéro, DLC passée ou proche."""
+    return (quantity is not None and quantity < 1) or (
+        expiry_date is not None and expiry_date <= today + timedelta(days=soon_days)
+    )
+
+
+class ExpiryTimer:
+    """
+    Remplace le scan à intervalle fixe : un seul job APScheduler (DateTrigger)
+    armé sur le prochain jour de transition ; au réveil, scan ciblé des seuls
+    produits concernés, puis réarmement. Aucun tick quand rien n'expire.
+    """
+
+    def __init__(self, scheduler: BaseScheduler, job_id: str = TIMER_JOB_ID):
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.wheel = DayWheel()
+        self._run_lock = threading.Lock()
+
+    # -- chargement -----------------------------------------------------------
+    def rebuild(self, scan: bool = True) -> Dict[str, int]:
+        """
+        Scan incrémental (rattrape les écritures hors API) puis reconstruction
+        complète de la roue depuis products. Appelé à chaque élection et par le
+        balayage de sécurité ; scan=False à l'élection de démarrage, où le scan
+        est celui du warm-up (SCAN_RUN_AT_STARTUP).
+        """
+        from sqlalchemy import text
+
+        from freshkeeper.database import get_engine
+        from freshkeeper.services.alert_runner import EXPIRE_SOON_DAYS, run_scan
+
+        with self._run_lock:
+            if scan:
+                run_scan()
+            today = _utc_today()
+            wheel = DayWheel()
+            loaded = 0
+            with get_engine().connect() as conn:
+                result = conn.execution_options(
+                    stream_results=True, yield_per=_LOAD_BATCH
+                ).execute(
+                    text(
+                        """
+                        SELECT id, quantity, expiry_date FROM products
+                         WHERE quantity < 1 OR expiry_date > :today
+                        """
+                    ),
+                    {"today": today},
+                )
+                for pid, qty, expiry in result:
+                    for day in transitions(qty, expiry, today, EXPIRE_SOON_DAYS):
+                        wheel.add(day, pid)
+                    loaded += 1
+            self.wheel = wheel
+            self._arm()
+        logger.info(
+            "Timer d'expiration rechargé : %s produits, %s réveils, prochain=%s",
+            loaded,
+            len(wheel),
+            wheel.next_day(),
+        )
+        return {"products": loaded, "entries": len(wheel)}
+
+    def _reschedule(
+        self, product_ids: Iterable[int], today: date, urgent_now: bool = False
+    ) -> None:
+        from sqlalchemy import text
+
+        from freshkeeper.database import get_engine
+        from freshkeeper.services.alert_runner import EXPIRE_SOON_DAYS
+
+        with get_engine().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, quantity, expiry_date FROM products "
+                    "WHERE id = ANY(:pids)"
+                ),
+                {"pids": sorted(product_ids)},
+            ).all()
+        for pid, qty, expiry in rows:
+            if urgent_now and _urgent(qty, expiry, today, EXPIRE_SOON_DAYS):
+                self.wheel.add(today, pid)
+            for day in transitions(qty, expiry, today, EXPIRE_SOON_DAYS):
+                self.wheel.add(day, pid)
+
+    def refresh(self, product_ids: Optional[Iterable[int]]) -> None:
+        """
+        Leader : produits modifiés par un autre worker (bus de changements),
+        transitions relues en base. None = table entière (import) : rechargement
+        complet planifié hors du thread d'écoute.
+        """
+        if product_ids is None:
+            self.scheduler.add_job(
+                func=self.rebuild,
+                id="alerts_timer_reload",
+                name="Rebuild expiry timer after bulk change",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            return
+        self._reschedule(product_ids, _utc_today(), urgent_now=True)
+        self._arm()
+
+    # -- réveils --------------------------------------------------------------
+    def fire(self) -> Dict[str, int]:
+        """Job APScheduler : scan ciblé des produits arrivés à échéance."""
+        from freshkeeper.jobs.leader import is_leader
+        from freshkeeper.services.alert_runner import run_scan
+
+        with self._run_lock:
+            if not is_leader():  # bail perdu : le nouveau leader recharge sa roue
+                self.wheel = DayWheel()
+                self._arm()
+                return {"due": 0}
+            today = _utc_today()
+            due = self.wheel.pop_due(today)
+            summary: Dict[str, int] = {"due": len(due)}
+            if due:
+                summary.update(
+                    {
+                        k: v
+                        for k, v in run_scan(product_ids=due).items()
+                        if k != "status"
+                    }
+                )
+                self._reschedule(due, today)
+            self._arm()
+        logger.info("Réveil timer d'expiration %s -> %s", today, summary)
+        return summary
+
+    def notify(
+        self, product_id: int, quantity=None, expiry_date: Optional[date] = None
+    ) -> None:
+        """
+        Hook des chemins d'écriture : planifie les transitions du produit et,
+        s'il est déjà en alerte (stock tombé à zéro, DLC passée ou proche),
+        déclenche un réveil immédiat.
+        En standby, pas de roue : le NOTIFY publié par l'écriture parvient au
+        leader, qui planifie le produit (refresh). Sans bus de changements
+        (CHANGE_BUS_ENABLED=0, hors PostgreSQL), seul le scan ciblé immédiat
+        tourne ici ; les transitions futures attendent le balayage du leader.
+        Bloquant : à appeler via run_in_threadpool depuis une route async.
+        """
+        from freshkeeper.jobs.change_bus import get_change_listener
+        from freshkeeper.jobs.leader import is_leader
+        from freshkeeper.services.alert_runner import EXPIRE_SOON_DAYS, run_scan
+
+        today = _utc_today()
+        urgent = _urgent(quantity, expiry_date, today, EXPIRE_SOON_DAYS)
+        if not is_leader():
+            if urgent and get_change_listener() is None:
+                run_scan(product_ids=[product_id])
+            return
+        if urgent:
+            self.wheel.add(today, product_id)
+        for day in transitions(quantity, expiry_date, today, EXPIRE_SOON_DAYS):
+            self.wheel.add(day, product_id)
+        self._arm()
+
+    def _arm(self) -> None:
+        nxt = self.wheel.next_day()
+        if nxt is None:
+            if self.scheduler.get_job(self.job_id):
+                self.scheduler.remove_job(self.job_id)
+            return
+        run_date = max(
+            datetime.combine(nxt, time.min, tzinfo=timezone.utc),
+            datetime.now(timezone.utc),
+        )
+        self.scheduler.add_job(
+            func=self.fire,
+            trigger=DateTrigger(run_date=run_date),
+            id=self.job_id,
+            name=f"Expiry wake-up {nxt.isoformat()}",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=None,  # un réveil manqué doit toujours tourner
+        )
+
+
+def install_expiry_timer(scheduler: BaseScheduler) -> ExpiryTimer:
+    global _TIMER_SINGLETON
+    _TIMER_SINGLETON = ExpiryTimer(scheduler)
+    return _TIMER_SINGLETON
+
+
+def get_expiry_timer() -> ExpiryTimer | None:
+    return _TIMER_SINGLETON
+
+
+def notify_product_change(
+    product_id: int, quantity=None, expiry_date: Optional[date] = None
+) -> None:
+    """No-op si le scheduler tourne en mode intervalle (ou pas du tout)."""
+    timer = _TIMER_SINGLETON
+    if timer is None:
+        return
+    try:
+        timer.notify(product_id, quantity, expiry_date)
+    except Exception:
+        logger.exception("Planification timer échouée pour le produit %s", product_id)
+
+
+@on_change
+def _on_products_change(table: str, keys: Optional[List[int]]) -> None:
+    """Écritures de produits des autres workers, reçues par le leader."""
+    from freshkeeper.jobs.leader import is_leader
+
+    timer = _TIMER_SINGLETON
+    if table != "products" or timer is None or not is_leader():
+        return
+    timer.refresh(keys)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import socket
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+ROLE_LEADER = "leader"
+ROLE_STANDBY = "standby"
+ROLE_SINGLE = "single"  # base sans advisory locks (SQLite) : processus seul maître
+
+# Clé stable commune à tous les workers (bigint côté Postgres)
+LEADER_LOCK_KEY_DEFAULT = zlib.crc32(b"freshkeeper:scheduler")
+
+_LEASE_SINGLETON: "LeaderLease | None" = None
+
+
+def _lock_key() -> int:
+    try:
+        return int(os.getenv("LEADER_LOCK_KEY", str(LEADER_LOCK_KEY_DEFAULT)))
+    except Exception:
+        return LEADER_LOCK_KEY_DEFAULT
+
+
+class LeaderLease:
+    """
+    Élection de leader par pg_try_advisory_lock (verrou de session).
+
+    Le verrou vit tant que la connexion dédiée vit : si le worker meurt ou perd
+    sa connexion, Postgres le libère et un autre worker le prend au heartbeat
+    suivant. heartbeat() est appelé périodiquement par le scheduler :
+      - leader  : SELECT 1 sur la connexion qui porte le verrou (sinon perdu) ;
+      - standby : nouvelle tentative pg_try_advisory_lock.
+    """
+
+    def __init__(self, engine=None, key: Optional[int] = None):
+        from freshkeeper.database import get_engine
+
+        self.engine = engine or get_engine()
+        self.key = _lock_key() if key is None else key
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.on_elected: Optional[Callable[[], Any]] = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._single = self.engine.dialect.name != "postgresql"
+        self.since: Optional[datetime] = None
+        self.last_heartbeat: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.elections = 0
+
+    @property
+    def role(self) -> str:
+        if self._single:
+            return ROLE_SINGLE
+        return ROLE_LEADER if self._conn is not None else ROLE_STANDBY
+
+    @property
+    def is_leader(self) -> bool:
+        return self._single or self._conn is not None
+
+    def heartbeat(self) -> bool:
+        elected = False
+        with self._lock:
+            self.last_heartbeat = datetime.now(timezone.utc)
+            if self._single:
+                return True
+            if self._conn is not None:
+                try:
+                    self._conn.execute(text("SELECT 1"))
+                    self._conn.commit()
+                    return True
+                except Exception as e:
+                    logger.warning("Bail leader perdu (%s) : passage en standby", e)
+                    self.last_error = str(e)
+                    self._close()
+            elected = self._try_acquire()
+        if elected and self.on_elected is not None:
+            try:
+                self.on_elected()
+            except Exception:
+                logger.exception("Callback d'élection en erreur")
+        return self.is_leader
+
+    def _try_acquire(self) -> bool:
+        conn = None
+        try:
+            conn = self.engine.connect()
+            got = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+            ).scalar()
+            # le verrou de session survit au commit ; évite "idle in transaction"
+            conn.commit()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning("Tentative d'élection échouée : %s", e)
+            if conn is not None:
+                conn.close()
+            return False
+        if not got:
+            conn.close()
+            return False
+        self._conn = conn
+        self.since = datetime.now(timezone.utc)
+        self.elections += 1
+        logger.info("Worker %s élu leader (clé %s)", self.worker, self.key)
+        return True
+
+    def _close(self) -> None:
+        conn, self._conn, self.since = self._conn, None, None
+        if conn is not None:
+            try:
+                conn.invalidate()  # connexion douteuse : ne pas la rendre au pool
+            except Exception:
+                pass
+
+    def release(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+                )
+                self._conn.commit()
+                self._conn.close()
+            except Exception:
+                logger.exception("Libération du verrou leader échouée")
+            self._conn, self.since = None, None
+
+    def holder_pid(self) -> Optional[int]:
+        """PID serveur de la session qui tient le verrou (tous workers confondus)."""
+        if self._single:
+            return None
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text(
+                    """
+                    SELECT pid FROM pg_locks
+                     WHERE locktype = 'advisory' AND granted
+                       AND classid = :hi AND objid = :lo AND objsubid = 1
+                    """
+                ),
+                {"hi": (self.key >> 32) & 0xFFFFFFFF, "lo": self.key & 0xFFFFFFFF},
+            ).scalar()
+
+    def status(self) -> Dict[str, Any]:
+        try:
+            holder = self.holder_pid()
+        except Exception as e:
+            holder = None
+            self.last_error = str(e)
+        return {
+            "worker": self.worker,
+            "role": self.role,
+            "lock_key": self.key,
+            "holder_pid": holder,
+            "leader_since": self.since.isoformat() if self.since else None,
+            "last_heartbeat": (
+                self.last_heartbeat.isoformat() if self.last_heartbeat else None
+            ),
+            "elections": self.elections,
+            "last_error": self.last_error,
+        }
+
+
+def install_leader_lease(engine=None) -> LeaderLease:
+    global _LEASE_SINGLETON
+    _LEASE_SINGLETON = LeaderLease(engine)
+    return _LEASE_SINGLETON
+
+
+def get_leader_lease() -> LeaderLease | None:
+    return _LEASE_SINGLETON
+
+
+def is_leader() -> bool:
+    """Sans bail installé (scheduler désactivé, scripts, tests) : processus seul."""
+    lease = _LEASE_SINGLETON
+    return lease is None or lease.is_leader
+
+
+def leader_only(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Job de scheduler exécuté uniquement par le leader ; no-op en standby."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_leader():
+            logger.debug("%s ignoré : worker en standby", func.__name__)
+            return None
+        return func(*args, **kwargs)
+
+    return wrapper
@@ -37,41 +37,152 @@ def _get_bool(name: str, default: bool) -> bool:
     )
 
 
+class _TrackedScheduler(BackgroundScheduler):
+    """
+    Chaque job tourne sous db_origin("scheduler:<id>") : ses connexions sont
+    comptées à part sur GET /admin/db/pool (y compris les réveils du timer et
+    le rattrapage après élection, ajoutés plus tard).
+    """
+
+    def add_job(self, func, *args, **kwargs):
+        from freshkeeper.pool_metrics import tracked
+
+        job_id = kwargs.get("id") or getattr(func, "__name__", "job")
+        return super().add_job(tracked(f"scheduler:{job_id}", func), *args, **kwargs)
+
+
 def build_scheduler() -> BackgroundScheduler:
     """
     Construit un BackgroundScheduler avec le job run_scan.
+
+    SCAN_STRATEGY=interval (défaut) : run_scan toutes les SCAN_INTERVAL_MINUTES.
+    SCAN_STRATEGY=timer : réveils précis aux transitions d'expiration
+    (freshkeeper.jobs.expiry_timer) + balayage de sécurité toutes les
+    TIMER_SWEEP_HOURS pour les écritures faites hors API.
+
+    Multi-workers / multi-pods : chaque process construit son scheduler, mais
+    les jobs (scan, rétention, scan de démarrage) ne tournent que sur le leader
+    élu par advisory lock Postgres (freshkeeper.jobs.leader) ; les autres
+    restent en standby et retentent le bail toutes les LEADER_HEARTBEAT_SECONDS.
     """
     global _SCHEDULER_SINGLETON
     if _SCHEDULER_SINGLETON:
         return _SCHEDULER_SINGLETON
 
     # import tardif pour éviter les cycles
+    from freshkeeper.jobs.leader import install_leader_lease, leader_only
     from freshkeeper.services.alert_runner import run_scan
 
+    strategy = os.getenv("SCAN_STRATEGY", "interval").strip().lower()
     interval_minutes = _get_int("SCAN_INTERVAL_MINUTES", 15)
     run_at_startup = _get_bool("SCAN_RUN_AT_STARTUP", True)
     tz = os.getenv("TZ", "UTC")
 
-    scheduler = BackgroundScheduler(timezone=tz)
+    scheduler = _TrackedScheduler(timezone=tz)
+    timer = None
+    if strategy == "timer":
+        from freshkeeper.jobs.expiry_timer import install_expiry_timer
+
+        timer = install_expiry_timer(scheduler)
+        sweep_hours = _get_int("TIMER_SWEEP_HOURS", 24)
+        scheduler.add_job(
+            func=leader_only(timer.rebuild),
+            trigger=IntervalTrigger(hours=sweep_hours),
+            id="alerts_timer_sweep",
+            name=f"Rebuild expiry timer every {sweep_hours} h",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=60,
+        )
+        catchup_job = timer.rebuild  # scan + chargement + armement du 1er réveil
+    else:
+        scheduler.add_job(
+            func=leader_only(run_scan),
+            trigger=IntervalTrigger(minutes=interval_minutes),
+            id="alerts_scan_job",
+            name=f"Scan alerts every {interval_minutes} min",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=60,
+        )
+        catchup_job = run_scan
+
+    retention_hours = _get_int("RETENTION_INTERVAL_HOURS", 24)
+    scheduler.add_job(
+        func=leader_only(_run_retention_job),
+        trigger=IntervalTrigger(hours=retention_hours),
+        id="alerts_retention_job",
+        name=f"Alert retention every {retention_hours} h",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=60,
+    )
+
+    purge_minutes = _get_int("IDEMPOTENCY_PURGE_MINUTES", 60)
     scheduler.add_job(
-        func=run_scan,
-        trigger=IntervalTrigger(minutes=interval_minutes),
-        id="alerts_scan_job",
-        name=f"Scan alerts every {interval_minutes} min",
+        func=leader_only(_run_idempotency_purge),
+        trigger=IntervalTrigger(minutes=purge_minutes),
+        id="idempotency_purge_job",
+        name=f"Purge expired idempotency keys every {purge_minutes} min",
         replace_existing=True,
         max_instances=1,
         coalesce=True,
         misfire_grace_time=60,
     )
 
-    if run_at_startup:
-        try:
-            logger.info("Exécution run_scan au démarrage…")
-            logger.setLevel(logging.INFO)
-            run_scan()
-            logger.info("run_scan exécuté au démarrage")
-        except Exception:
-            logger.exception("Erreur lors de run_scan au démarrage")
+    compact_minutes = _get_int("TABLE_CHANGES_COMPACT_MINUTES", 5)
+    scheduler.add_job(
+        func=leader_only(_run_table_changes_compaction),
+        trigger=IntervalTrigger(minutes=compact_minutes),
+        id="table_changes_compaction_job",
+        name=f"Compact table_change_log every {compact_minutes} min",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=60,
+    )
+
+    def on_elected(job, **kwargs):
+        return lambda: scheduler.add_job(
+            func=leader_only(job),
+            kwargs=kwargs,
+            id="leader_catchup",
+            name="Catch-up after election",
+            replace_existing=True,
+        )
+
+    lease = install_leader_lease()
+    # Élection au démarrage : le scan est celui du warm-up (SCAN_RUN_AT_STARTUP,
+    # annulable) ; en mode timer la roue est chargée dans tous les cas, sinon
+    # rien n'est armé avant le premier balayage (TIMER_SWEEP_HOURS)
+    if timer is not None:
+        lease.on_elected = on_elected(timer.rebuild, scan=False)
+    heartbeat_seconds = _get_int("LEADER_HEARTBEAT_SECONDS", 15)
+    scheduler.add_job(
+        func=lease.heartbeat,
+        trigger=IntervalTrigger(seconds=heartbeat_seconds),
+        id="leader_heartbeat",
+        name=f"Leader lease heartbeat every {heartbeat_seconds} s",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=heartbeat_seconds,
+    )
+    lease.heartbeat()
+    logger.info("Scheduler : worker %s en rôle %s", lease.worker, lease.role)
+
+    # Scan de démarrage : hors du chemin de boot, dans le thread de warm-up
+    # (freshkeeper.jobs.warmup, démarré par l'app) ; annulable, suivi par /ready
+    if run_at_startup and lease.is_leader:
+        from freshkeeper.jobs.warmup import get_warmup
+
+        get_warmup().set_scan(run_scan)
+
+    # Bascule : le nouveau leader rattrape (scan + roue en mode timer) hors heartbeat
+    lease.on_elected = on_elected(catchup_job)
 
     _SCHEDULER_SINGLETON = scheduler
     return scheduler
@@ -79,3 +190,43 @@ def build_scheduler() -> BackgroundScheduler:
 
 def get_scheduler() -> BackgroundScheduler | None:
     return _SCHEDULER_SINGLETON
+
+
+def shutdown_scheduler() -> None:
+    """Arrêt du scheduler + libération immédiate du bail (bascule sans attendre)."""
+    global _SCHEDULER_SINGLETON
+    from freshkeeper.jobs.leader import get_leader_lease
+
+    scheduler, _SCHEDULER_SINGLETON = _SCHEDULER_SINGLETON, None
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=False)
+    lease = get_leader_lease()
+    if lease is not None:
+        lease.release()
+
+
+def _run_retention_job() -> dict:
+    from freshkeeper.database import SessionLocal
+    from freshkeeper.services.alert_maintenance import run_retention
+
+    retention_days = _get_int("RETENTION_DAYS", 0) or None  # 0 => défaut du service
+    with SessionLocal() as db:
+        out = run_retention(db, retention_days=retention_days)
+    logger.info("Rétention des alertes : %s", out)
+    return out
+
+
+def _run_idempotency_purge() -> int:
+    from freshkeeper.idempotency import purge_expired
+
+    n = purge_expired()
+    logger.info("Clés d'idempotence expirées supprimées : %s", n)
+    return n
+
+
+def _run_table_changes_compaction() -> int:
+    from freshkeeper.conditional import compact_table_changes
+
+    n = compact_table_changes()
+    logger.debug("Journal des versions de tables compacté : %s lignes", n)
+    return n
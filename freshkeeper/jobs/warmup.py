@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+STEP_POOL = "pool_warmed"
+STEP_CACHES = "caches_primed"
+STEP_SCAN = "first_scan_done"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# /ready passe au vert sans attendre le scan : il tourne en arrière-plan
+READY_STEPS = (STEP_POOL, STEP_CACHES)
+
+_WARMUP_SINGLETON: "Warmup | None" = None
+
+
+def _get_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class Warmup:
+    """
+    Préchauffage hors du chemin de démarrage, dans un thread dédié :
+      1. pool_warmed     : ouvre DB_POOL_WARM connexions (SELECT 1) ;
+      2. caches_primed   : exécute les primers enregistrés (register_primer) ;
+      3. first_scan_done : scan de démarrage (SCAN_RUN_AT_STARTUP, leader seul).
+
+    cancel() arrête les étapes restantes et annule la requête en cours : les
+    connexions prises par le thread de warm-up sont suivies via les events
+    checkout/checkin du pool, et cancel() appelle cancel() du driver dessus.
+    """
+
+    def __init__(self, engine=None):
+        from freshkeeper.database import get_engine
+
+        self.engine = engine or get_engine()
+        self.steps: Dict[str, str] = {
+            STEP_POOL: PENDING,
+            STEP_CACHES: PENDING,
+            STEP_SCAN: PENDING,
+        }
+        self.errors: Dict[str, str] = {}
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.scan_result: Any = None
+        self._scan: Optional[Callable[[], Any]] = None
+        self._primers: List[Tuple[str, Callable[[], Any]]] = []
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._active: set = set()  # connexions DBAPI du thread de warm-up
+        self._lock = threading.Lock()
+        event.listen(self.engine, "checkout", self._on_checkout)
+        event.listen(self.engine, "checkin", self._on_checkin)
+
+    # -- configuration ---------------------------------------------------------
+    def register_primer(self, name: str, fn: Callable[[], Any]) -> None:
+        # même nom = remplacement (hooks de démarrage rejoués, tests)
+        self._primers = [(n, f) for n, f in self._primers if n != name]
+        self._primers.append((name, fn))
+
+    def set_scan(self, fn: Optional[Callable[[], Any]]) -> None:
+        self._scan = fn
+
+    # -- suivi des connexions (annulation) -------------------------------------
+    def _on_checkout(self, dbapi_conn, _record, _proxy) -> None:
+        if self._thread is not None and threading.current_thread() is self._thread:
+            with self._lock:
+                self._active.add(dbapi_conn)
+
+    def _on_checkin(self, dbapi_conn, _record) -> None:
+        with self._lock:
+            self._active.discard(dbapi_conn)
+
+    # -- exécution ---------------------------------------------------------------
+    def start(self) -> threading.Thread:
+        if self._thread is None:
+            self.started_at = datetime.now(timezone.utc)
+            self._thread = threading.Thread(
+                target=self._run, name="freshkeeper-warmup", daemon=True
+            )
+            self._thread.start()
+        return self._thread
+
+    def _step(self, name: str, fn: Optional[Callable[[], Any]]) -> None:
+        if self._cancel.is_set():
+            self.steps[name] = CANCELLED
+            return
+        if fn is None:
+            self.steps[name] = SKIPPED
+            return
+        self.steps[name] = RUNNING
+        try:
+            result = fn()
+        except Exception as e:
+            self.steps[name] = CANCELLED if self._cancel.is_set() else FAILED
+            self.errors[name] = str(e)
+            logger.exception("Warm-up %s en erreur", name)
+            return
+        if name == STEP_SCAN:
+            self.scan_result = result
+            # run_scan ne lève pas : une annulation remonte en status=error
+            if isinstance(result, dict) and result.get("status") == "error":
+                self.steps[name] = CANCELLED if self._cancel.is_set() else FAILED
+                return
+        self.steps[name] = DONE
+
+    def _run(self) -> None:
+        self._step(STEP_POOL, self._warm_pool)
+        self._step(STEP_CACHES, self._prime_caches)
+        self._step(STEP_SCAN, self._scan)
+        self.finished_at = datetime.now(timezone.utc)
+        logger.info("Warm-up terminé : %s", self.steps)
+
+    def _warm_pool(self) -> int:
+        size = getattr(self.engine.pool, "size", lambda: 1)()
+        n = max(1, min(_get_int("DB_POOL_WARM", 2), size))
+
+        def ping(_):
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        # connexions ouvertes en parallèle pour qu'elles restent toutes au pool
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            list(pool.map(ping, range(n)))
+        return n
+
+    def _prime_caches(self) -> int:
+        for name, fn in self._primers:
+            if self._cancel.is_set():
+                break
+            fn()
+            logger.debug("Cache %s préchauffé", name)
+        return len(self._primers)
+
+    def cancel(self) -> bool:
+        """Annule le warm-up en cours ; True s'il restait quelque chose à annuler."""
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        self._cancel.set()
+        with self._lock:
+            active = list(self._active)
+        for dbapi_conn in active:
+            try:
+                dbapi_conn.cancel()  # psycopg / psycopg2 : annule la requête en cours
+            except Exception:
+                pass
+        return True
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # -- état ----------------------------------------------------------------------
+    @property
+    def ready(self) -> bool:
+        return all(self.steps[s] in (DONE, SKIPPED) for s in READY_STEPS)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "steps": dict(self.steps),
+            "errors": dict(self.errors),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def get_warmup() -> Warmup:
+    global _WARMUP_SINGLETON
+    if _WARMUP_SINGLETON is None:
+        _WARMUP_SINGLETON = Warmup()
+    return _WARMUP_SINGLETON
+
+
+def register_primer(name: str, fn: Callable[[], Any]) -> None:
+    get_warmup().register_primer(name, fn)
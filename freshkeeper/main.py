@@ -4,6 +4,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import IntegrityError
 from fastapi.encoders import jsonable_encoder
 from decimal import Decimal
+from freshkeeper.responses import FastJSONResponse
 
 
 # 1) Charger .env TÔT pour que DATABASE_URL soit dispo à l'import des routeurs
@@ -28,7 +29,14 @@ def _try_import(router_path: str):
 APP_NAME = os.getenv("FRESHKEEPER_APP_NAME", "FreshKeeper API")
 APP_VERSION = os.getenv("FRESHKEEPER_VERSION", "0.1.0")
 
-app = FastAPI(title=APP_NAME, version=APP_VERSION)
+# Réponses JSON via orjson (Decimal/date/datetime natifs), cf. freshkeeper/responses.py
+app = FastAPI(title=APP_NAME, version=APP_VERSION, default_response_class=FastJSONResponse)
+
+# Chemins normalisés avant le routage (freshkeeper/routing.py) : /api/v1, « / » final,
+# storage_locations, alias historiques -> une seule route par handler. Ajouté en
+# premier = le plus interne, juste devant le routeur.
+from freshkeeper.routing import PathNormalizeMiddleware
+app.add_middleware(PathNormalizeMiddleware)
 
 # CORS (par défaut permissif; resserrer avec CORS_ALLOW_ORIGINS="http://192.168.1.18:19000,http://192.168.1.18:19006")
 allow_origins = os.getenv("CORS_ALLOW_ORIGINS", "*").split(",")
@@ -40,6 +48,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Lectures GET sur réplica si DATABASE_READ_URLS (freshkeeper/replicas.py) ;
+# cookie fk_rw après une écriture : le client relit ensuite sur le primaire
+from freshkeeper.replicas import ReadRoutingMiddleware
+app.add_middleware(ReadRoutingMiddleware)
+
+# Idempotency-Key sur les POST de création (freshkeeper/idempotency.py) : un rejeu
+# après timeout renvoie la réponse stockée au lieu de réappliquer l'écriture
+from freshkeeper.idempotency import IdempotencyMiddleware
+app.add_middleware(IdempotencyMiddleware)
+
+# Requêtes SQL comptées par requête HTTP, lentes journalisées (freshkeeper/query_stats.py) ;
+# QUERY_STATS_HEADER=1 : en-têtes X-DB-Queries / Server-Timing
+from freshkeeper.query_stats import QueryStatsMiddleware
+app.add_middleware(QueryStatsMiddleware)
+
+# Latence / statuts / tailles par route canonique, au format Prometheus sur GET /metrics
+# (freshkeeper/metrics.py) ; ajouté en dernier = le plus externe, il mesure tout
+from freshkeeper.metrics import MetricsMiddleware
+app.add_middleware(MetricsMiddleware)
+
+# Exposition Prometheus ; async : lue depuis la boucle qui alimente les séries
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    from starlette.responses import Response
+    from freshkeeper.metrics import CONTENT_TYPE, render_prometheus
+    return Response(render_prometheus(), media_type=CONTENT_TYPE)
+
+# /openapi.json servi depuis des octets précalculés avec ETag (freshkeeper/openapi_schema.py) ;
+# OPENAPI_SCHEMA_FILE : schéma exporté au build (python export_openapi_yaml.py)
+from freshkeeper.openapi_schema import install_openapi_cache
+_openapi_cache = install_openapi_cache(app)
+
 # Health & root
 @app.get("/")
 def root():
@@ -49,6 +89,183 @@ def root():
 def health():
     return {"status": "ok"}
 
+# Engine partagé (freshkeeper/database.py) : un seul pool créé au démarrage
+@app.on_event("startup")
+def _init_db_engine():
+    try:
+        from freshkeeper.database import get_engine
+        get_engine()
+    except Exception as e:
+        print("Init engine failed:", e)
+
+# Schéma OpenAPI généré au démarrage (toutes les routes sont alors déclarées),
+# pas au premier /docs
+@app.on_event("startup")
+def _build_openapi():
+    try:
+        _openapi_cache.build()
+    except Exception as e:
+        print("OpenAPI build failed:", e)
+
+# Scheduler des alertes (ENABLE_SCHEDULER=1) : un par worker, jobs sur le seul leader
+@app.on_event("startup")
+def _start_scheduler():
+    try:
+        from freshkeeper.jobs.scheduler import build_scheduler, is_scheduler_enabled
+        if is_scheduler_enabled():
+            build_scheduler().start()
+    except Exception as e:
+        print("Scheduler start failed:", e)
+
+# Warm-up en arrière-plan (pool, caches, scan de démarrage) : le boot n'attend pas
+@app.on_event("startup")
+def _start_warmup():
+    try:
+        from freshkeeper.cache import prime
+        from freshkeeper.jobs.warmup import get_warmup
+        warmup = get_warmup()
+        # données de référence (freshkeeper/cache.py) chargées avant /ready
+        warmup.register_primer("categories", lambda: prime("categories", _load_categories, ("products",)))
+        warmup.register_primer("storage_locations", lambda: prime("storage_locations", _load_storage_locations, ("storage_locations",)))
+        warmup.start()
+    except Exception as e:
+        print("Warm-up start failed:", e)
+
+# Bus d'invalidation inter-workers (LISTEN freshkeeper_changes) : un thread par worker
+@app.on_event("startup")
+def _start_change_bus():
+    try:
+        from freshkeeper.jobs.change_bus import install_change_listener, is_bus_enabled
+        if is_bus_enabled():
+            install_change_listener()
+    except Exception as e:
+        print("Change bus start failed:", e)
+
+@app.on_event("shutdown")
+def _stop_change_bus():
+    try:
+        from freshkeeper.jobs.change_bus import shutdown_change_listener
+        shutdown_change_listener()
+    except Exception:
+        pass
+
+@app.on_event("shutdown")
+def _cancel_warmup():
+    try:
+        from freshkeeper.jobs.warmup import get_warmup
+        get_warmup().cancel()
+    except Exception:
+        pass
+
+@app.on_event("shutdown")
+def _stop_scheduler():
+    try:
+        from freshkeeper.jobs.scheduler import shutdown_scheduler
+        shutdown_scheduler()
+    except Exception:
+        pass
+
+@app.on_event("shutdown")
+def _dispose_db_engines():
+    try:
+        from freshkeeper.database import dispose_engines
+        dispose_engines()
+    except Exception:
+        pass
+
+@app.on_event("shutdown")
+async def _dispose_async_db_engines():
+    try:
+        from freshkeeper.database import dispose_async_engines
+        await dispose_async_engines()
+    except Exception:
+        pass
+
+# État de l'élection leader (quel worker exécute les jobs) + prochains déclenchements
+@app.get("/admin/scheduler", tags=["admin"])
+def admin_scheduler():
+    from freshkeeper.jobs.leader import get_leader_lease
+    from freshkeeper.jobs.scheduler import get_scheduler
+    lease = get_leader_lease()
+    scheduler = get_scheduler()
+    jobs = []
+    if scheduler is not None:
+        for job in scheduler.get_jobs():
+            nxt = getattr(job, "next_run_time", None)
+            jobs.append({"id": job.id, "name": job.name, "next_run_time": nxt.isoformat() if nxt else None})
+    return {
+        "enabled": scheduler is not None,
+        "running": bool(scheduler and scheduler.running),
+        "election": lease.status() if lease else None,
+        "jobs": jobs,
+    }
+
+# Cache des données de référence (freshkeeper/cache.py) : compteurs hit/miss
+@app.get("/admin/cache", tags=["admin"])
+def admin_cache():
+    from freshkeeper.cache import reference_cache
+    from freshkeeper.jobs.change_bus import get_change_listener
+    listener = get_change_listener()
+    return {**reference_cache.stats(), "bus": listener.status() if listener else None}
+
+# Single-flight (freshkeeper/singleflight.py) : requêtes exécutées / coalescées par route
+@app.get("/admin/singleflight", tags=["admin"])
+def admin_singleflight():
+    from freshkeeper.singleflight import flights
+    return flights.stats()
+
+# Pools SQL (freshkeeper/pool_metrics.py) : checkouts, attente, détention, churn, usage du scheduler
+@app.get("/admin/db/pool", tags=["admin"])
+def admin_db_pool():
+    from freshkeeper.pool_metrics import pool_metrics
+    return pool_metrics()
+
+# Requêtes SQL au-delà de SLOW_QUERY_MS, par empreinte
+@app.get("/admin/db/slow", tags=["admin"])
+def admin_db_slow():
+    from freshkeeper.query_stats import slow_queries
+    return slow_queries()
+
+# Réplicas de lecture : santé, retard de rejeu, lectures servies, replis sur le primaire
+@app.get("/admin/replicas", tags=["admin"])
+def admin_replicas():
+    from freshkeeper.replicas import get_replicas
+    replicas = get_replicas()
+    return replicas.status() if replicas else {"replicas": [], "primary_fallbacks": 0}
+
+@app.post("/admin/cache/clear", tags=["admin"])
+def admin_cache_clear():
+    from freshkeeper.cache import invalidate
+    return {"invalidated": invalidate()}
+
+# Routes de lecture chaudes en async (ASYNC_DB_ENABLED=1) : montées AVANT les
+# routes sync de mêmes chemins, qui ne servent plus alors (cf. routers/async_read.py)
+try:
+    from freshkeeper.database import is_async_db_enabled
+    if is_async_db_enabled():
+        from freshkeeper.routers.async_read import router as _async_read_router
+        app.include_router(_async_read_router)
+except Exception as e:
+    print("Async read routes disabled:", e)
+
+# Tableau de bord : routeur historique routers/dashboard.py (hors
+# freshkeeper.routers.*) ; variante async montée d'abord si ASYNC_DB_ENABLED=1
+try:
+    from freshkeeper.database import is_async_db_enabled
+    from routers import dashboard as _dashboard
+    if is_async_db_enabled():
+        app.include_router(_dashboard.async_router)
+    app.include_router(_dashboard.router)
+except Exception as e:
+    print("Dashboard routes disabled:", e)
+
+# /products/suggest (optionnel) : AVANT /products/{product_id} du routeur products
+try:
+    from freshkeeper.api.suggest import router as suggest_router  # type: ignore
+    app.include_router(suggest_router, prefix="/products")
+except Exception:
+    pass
+
 # Monter les routeurs S'ILS EXISTENT (tous via freshkeeper.routers.*)
 for path in [
     "freshkeeper.routers.storage_locations:router",
@@ -62,207 +279,110 @@ for path in [
     if r:
         app.include_router(r)
 
-# /products/suggest (optionnel)
-try:
-    from freshkeeper.api.suggest import router as suggest_router  # type: ignore
-    app.include_router(suggest_router, prefix="/products")
-except Exception:
-    pass
-# --- Compatibilité pour clients mobiles qui appellent /api/* ---
-try:
-    from freshkeeper.routers import products as _prod
-    from freshkeeper.routers import alerts as _alerts
-    from freshkeeper.routers import lots as _lots
-    app.include_router(_prod.router, prefix="/api")
-    app.include_router(_alerts.router, prefix="/api")
-    app.include_router(_lots.router, prefix="/api")
-except Exception:
-    pass
+# Clients mobiles en /api/* et /api/v1/* : servis par les routes ci-dessus via
+# PathNormalizeMiddleware (/api/v1/products/ -> /products), sans ré-inclusion
 
-# (Optionnel) /api/products/suggest si dispo
-try:
-    from freshkeeper.api import suggest as _suggest
-    app.include_router(_suggest.router, prefix="/api/products")
-except Exception:
-    pass
-# --- Compatibilité clients mobiles: exposer aussi /api/* et /api/v1/* ---
-try:
-    from freshkeeper.routers import products as _prod
-    from freshkeeper.routers import alerts as _alerts
-    from freshkeeper.routers import lots as _lots
-    for _prefix in ("/api", "/api/v1"):
-        app.include_router(_prod.router,   prefix=_prefix)
-        app.include_router(_alerts.router, prefix=_prefix)
-        app.include_router(_lots.router,   prefix=_prefix)
-except Exception:
-    pass
+# Readiness (distinct de /health = liveness) : 503 tant que pool/caches ne sont pas chauds
+@app.get("/ready")
+def ready():
+    from fastapi.responses import JSONResponse
+    from freshkeeper.jobs.warmup import get_warmup
+    status = get_warmup().status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
-# Miroir du /health sous /api et /api/v1
-try:
-    app.add_api_route("/api/health", health, methods=["GET"])
-    app.add_api_route("/api/v1/health", health, methods=["GET"])
-except Exception:
-    pass
-# --- ALIAS directs pour /api/products et /api/v1/products ---
-try:
-    from freshkeeper.routers import products as _prod
-
-    # Liste
-    app.add_api_route("/api/products", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/products/", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products/", _prod.list_products, methods=["GET"], tags=["products"])
 
-    # Détail
-    app.add_api_route("/api/products/{product_id}", _prod.get_product, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products/{product_id}", _prod.get_product, methods=["GET"], tags=["products"])
-except Exception:
-    pass
+@app.post("/admin/warmup/cancel", tags=["admin"])
+def admin_warmup_cancel():
+    from freshkeeper.jobs.warmup import get_warmup
+    warmup = get_warmup()
+    return {"cancelled": warmup.cancel(), **warmup.status()}
 from fastapi import Request
-from starlette.responses import RedirectResponse
-
-# Redirige /api/<tout> -> /<tout>
-@app.api_route("/api_compat_disabled/{path:path}", methods=["GET","POST","PUT","PATCH","DELETE","OPTIONS"])
-async def _api_compat(path: str, request: Request):
-    return RedirectResponse(url=f"/{path}", status_code=307)
-
-# Redirige /api/v1/<tout> -> /<tout>
-@app.api_route("/api_v1_compat_disabled/{path:path}", methods=["GET","POST","PUT","PATCH","DELETE","OPTIONS"])
-async def _api_v1_compat(path: str, request: Request):
-    return RedirectResponse(url=f"/{path}", status_code=307)
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_read_engine
+from freshkeeper.pagination import ID_KEYS, PageParams, fetch_page, list_response, page_params
+from fastapi import Depends, HTTPException
+from freshkeeper.streaming import maybe_stream
+from freshkeeper.conditional import conditional_get
 from decimal import Decimal
 from datetime import date, datetime
 
-def _plain(v):
-    if isinstance(v, Decimal):
-        try: return float(v)
-        except Exception: return str(v)
-    if isinstance(v, (date, datetime)):
-        return v.isoformat()
-    return v
-
-def _fetch_all_sql(table: str, columns: str):
+def _fetch_all_sql(table: str, columns: str, keys=ID_KEYS, page: PageParams = None):
     url = os.getenv("DATABASE_URL")
     if not url:
-        return []
-    eng = create_engine(url, future=True)
-    rows = []
+        return [], {}
+    eng = get_read_engine(url)
     with eng.connect() as c:
-        for r in c.execute(text(f"SELECT {columns} FROM {table} ORDER BY id")).mappings():
-            rows.append({k: _plain(v) for k, v in r.items()})
-    return rows
+        rows, meta = fetch_page(c, table, columns, keys, page or PageParams())
+    return [dict(r) for r in rows], meta
 
 # ---------- ALERTS ----------
 @app.get("/api/alerts", tags=["alerts"])
-@app.get("/api/v1/alerts", tags=["alerts"])
-def _api_alerts_list():
+def _api_alerts_list(request: Request, page: PageParams = Depends(page_params)):
+    cond = conditional_get(request, "alerts")
+    if cond.not_modified:
+        return cond.not_modified_response()
+    streamed = maybe_stream(request, "alerts", "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id", ["id"])
+    if streamed is not None:
+        return cond.apply(streamed)
     try:
-        items = _fetch_all_sql(
+        items, meta = _fetch_all_sql(
             "alerts",
-            "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id"
+            "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id",
+            page=page,
         )
+    except HTTPException:
+        raise
     except Exception:
-        items = []
-    return JSONResponse(content=jsonable_encoder(items or []), status_code=200)
+        # liste vide de repli : sans ETag, pour ne pas la figer côté client
+        return list_response([], {}, page)
+    return cond.apply(list_response(items, meta, page))
 
 # ---------- LOTS ----------
 @app.get("/api/lots", tags=["lots"])
-@app.get("/api/v1/lots", tags=["lots"])
-def _api_lots_list():
+def _api_lots_list(request: Request, page: PageParams = Depends(page_params)):
+    cond = conditional_get(request, "lots")
+    if cond.not_modified:
+        return cond.not_modified_response()
+    streamed = maybe_stream(request, "lots", "id, product_id, quantity, unit, expiry_date, storage_location_id", ["id"])
+    if streamed is not None:
+        return cond.apply(streamed)
     try:
-        items = _fetch_all_sql(
+        items, meta = _fetch_all_sql(
             "lots",
-            "id, product_id, quantity, unit, expiry_date, storage_location_id"
+            "id, product_id, quantity, unit, expiry_date, storage_location_id",
+            page=page,
         )
+    except HTTPException:
+        raise
     except Exception:
-        items = []
-    return JSONResponse(content=jsonable_encoder(items or []), status_code=200)
+        # liste vide de repli : sans ETag, pour ne pas la figer côté client
+        return list_response([], {}, page)
+    return cond.apply(list_response(items, meta, page))
 
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_read_engine
+from freshkeeper.conditional import conditional_get
+from freshkeeper.cache import cache_key, reference_cache
 from decimal import Decimal
 from datetime import date, datetime
 import os
 
-def _plain(v):
-    if isinstance(v, Decimal):
-        try: return float(v)
-        except Exception: return str(v)
-    if isinstance(v, (date, datetime)):
-        return v.isoformat()
-    return v
-
-def _fetch_all_sql(table: str, columns: str):
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        return []
-    eng = create_engine(url, future=True)
-    rows = []
-    with eng.connect() as c:
-        for r in c.execute(text(f"SELECT {columns} FROM {table} ORDER BY id")).mappings():
-            rows.append({k: _plain(v) for k, v in r.items()})
-    return rows
-
-# ---------- ALERTS ----------
-@app.get("/api/alerts", tags=["alerts"])
-@app.get("/api/v1/alerts", tags=["alerts"])
-def _api_alerts_list():
-    try:
-        items = _fetch_all_sql(
-            "alerts",
-            "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id"
-        )
-    except Exception:
-        items = []
-    return JSONResponse(content=jsonable_encoder(items or []), status_code=200)
-
-# ---------- LOTS ----------
-@app.get("/api/lots", tags=["lots"])
-@app.get("/api/v1/lots", tags=["lots"])
-def _api_lots_list():
-    try:
-        items = _fetch_all_sql(
-            "lots",
-            "id, product_id, quantity, unit, expiry_date, storage_location_id"
-        )
-    except Exception:
-        items = []
-    return JSONResponse(content=jsonable_encoder(items or []), status_code=200)
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
-from decimal import Decimal
-from datetime import date, datetime
-import os
-
-def _plain(v):
-    if isinstance(v, Decimal):
-        try: return float(v)
-        except Exception: return str(v)
-    if isinstance(v, (date, datetime)):
-        return v.isoformat()
-    return v
-
 def _engine():
     url = os.getenv("DATABASE_URL")
     if not url: return None
-    from sqlalchemy import create_engine
-    return create_engine(url, future=True)
+    return get_read_engine(url)
 
 # ---------- STATUS ----------
 @app.get("/api/status")
-@app.get("/api/v1/status")
 def _api_status():
     return {"api":"ok","version": os.getenv("FRESHKEEPER_VERSION","0.1.0")}
 
 # ---------- CATEGORIES (dérivées de products.category) ----------
-@app.get("/api/categories")
-@app.get("/api/v1/categories")
-def _api_categories():
+def _load_categories():
     eng = _engine()
     items = []
     if eng is not None:
@@ -270,49 +390,58 @@ def _api_categories():
         with eng.connect() as c:
             for r in c.execute(sql).mappings():
                 items.append({"name": r["category"], "product_count": int(r["product_count"] or 0)})
-    return JSONResponse(content=jsonable_encoder(items), status_code=200)
+    return items
 
-# ---------- STORAGE LOCATIONS (si la table existe : id, name) ----------
-@app.get("/api/storage-locations")
-@app.get("/api/v1/storage-locations")
-def _api_storage_locations():
+@app.get("/api/categories")
+def _api_categories(request: Request):
+    cond = conditional_get(request, "products")
+    if cond.not_modified:
+        return cond.not_modified_response()
+    # cache mémoire (freshkeeper/cache.py), invalidé par les écritures produits
+    items = reference_cache.get_or_load(
+        cache_key("categories", request.query_params), _load_categories, ("products",), cond.version
+    )
+    return cond.apply(FastJSONResponse(items, status_code=200))
+
+# ---------- STORAGE LOCATIONS (si la table existe) ----------
+# Aussi /api/storage-locations, /storage_locations, /api/storage (freshkeeper/routing.py)
+def _load_storage_locations():
     eng = _engine()
     items = []
     if eng is not None:
-        try:
-            sql = text("SELECT id, name FROM storage_locations ORDER BY id")
-            with eng.connect() as c:
-                for r in c.execute(sql).mappings():
-                    items.append({"id": r.get("id"), "name": r.get("name")})
-        except Exception:
-            # table absente -> liste vide
-            items = []
-    return JSONResponse(content=jsonable_encoder(items), status_code=200)
+        sql = text("SELECT id, name, kind, parent_id FROM storage_locations ORDER BY id")
+        with eng.connect() as c:
+            for r in c.execute(sql).mappings():
+                items.append(dict(r))
+    return items
+
+@app.get("/storage-locations", tags=["storage"])
+def _api_storage_locations(request: Request):
+    cond = conditional_get(request, "storage_locations")
+    if cond.not_modified:
+        return cond.not_modified_response()
+    try:
+        items = reference_cache.get_or_load(
+            cache_key("storage_locations", request.query_params), _load_storage_locations, ("storage_locations",), cond.version
+        )
+    except Exception:
+        # table absente -> liste vide (ni ETag, ni cache)
+        return FastJSONResponse([], status_code=200)
+    return cond.apply(FastJSONResponse(items, status_code=200))
 from fastapi import Request
 from fastapi.responses import JSONResponse
-
-# Catch-all placé en DERNIER : loggue tout chemin /api/* inconnu
-@app.api_route("/api_unknown_disabled/{path:path}", methods=["GET","POST","PUT","PATCH","DELETE","OPTIONS"])
-async def _api_unknown(path: str, request: Request):
-    print(f"UNKNOWN /api PATH -> /api/{path}  method={request.method}")
-    return JSONResponse({"detail":"Not Found","path": f"/api/{path}","method": request.method}, status_code=404)
-
-@app.api_route("/api_v1_unknown_disabled/{path:path}", methods=["GET","POST","PUT","PATCH","DELETE","OPTIONS"])
-async def _apiv1_unknown(path: str, request: Request):
-    print(f"UNKNOWN /api/v1 PATH -> /api/v1/{path}  method={request.method}")
-    return JSONResponse({"detail":"Not Found","path": f"/api/v1/{path}","method": request.method}, status_code=404)
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_read_engine
 import os
 
 @app.get("/api/missing-expiry", tags=["lots"])
-@app.get("/api/v1/missing-expiry", tags=["lots"])
 def _api_missing_expiry():
     url = os.getenv("DATABASE_URL")
     items = []
     if url:
-        eng = create_engine(url, future=True)
+        eng = get_read_engine(url)
         sql = text("""
             SELECT l.id AS lot_id,
                    l.product_id,
@@ -329,72 +458,52 @@ def _api_missing_expiry():
         with eng.connect() as c:
             for r in c.execute(sql).mappings():
                 items.append(dict(r))
-    return JSONResponse(content=jsonable_encoder(items), status_code=200)
-# --- ALIAS pack pour /api et /api/v1 chemins mobiles usuels ---
-try:
-    from freshkeeper.routers import products as _prod
-
-    # LIST & DETAILS
-    app.add_api_route("/api/products/list", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products/list", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/products/{product_id}/details", _prod.get_product, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products/{product_id}/details", _prod.get_product, methods=["GET"], tags=["products"])
-except Exception as e:
-    print("Alias products failed:", e)
-
+    return FastJSONResponse(items, status_code=200)
+# /api/products/list et /api/products/{id}/details : alias de freshkeeper/routing.py
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_read_engine
+from freshkeeper.responses import dumps
+from freshkeeper.singleflight import coalesce
+from starlette.responses import Response
 from decimal import Decimal
 from datetime import date, datetime
 import os
 
-def _plain(v):
-    if isinstance(v, Decimal):
-        try: return float(v)
-        except Exception: return str(v)
-    if isinstance(v, (date, datetime)):
-        return v.isoformat()
-    return v
-
 def _sql_all(query: str):
     url = os.getenv("DATABASE_URL")
     if not url: return []
-    eng = create_engine(url, future=True)
+    eng = get_read_engine(url)
     rows=[]
     with eng.connect() as c:
         for r in c.execute(text(query)).mappings():
-            rows.append({k:_plain(v) for k,v in r.items()})
+            rows.append(dict(r))
     return rows
 
 # ALERTS /active
 @app.get("/api/alerts/active", tags=["alerts"])
-@app.get("/api/v1/alerts/active", tags=["alerts"])
 def _alerts_active_alias():
     rows = _sql_all("SELECT id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id FROM alerts ORDER BY id")
     items = [r for r in rows if r.get("is_active")]
-    return JSONResponse(content=jsonable_encoder(items or []), status_code=200)
+    return FastJSONResponse(items or [], status_code=200)
 
 # LOTS /grouped
-@app.get("/api/lots/grouped", tags=["lots"])
-@app.get("/api/v1/lots/grouped", tags=["lots"])
-def _lots_grouped_alias():
+def _grouped_lots_body() -> bytes:
     rows = _sql_all("SELECT id, product_id, quantity, unit, expiry_date, storage_location_id FROM lots ORDER BY id")
     grouped = {}
     for r in rows:
         pid = r.get("product_id")
         grouped.setdefault(pid, []).append(r)
     payload = [{"product_id": pid, "lots": lots} for pid, lots in grouped.items()]
-    return JSONResponse(content=jsonable_encoder(payload or []), status_code=200)
+    return dumps(payload or [])
+
+@app.get("/api/lots/grouped", tags=["lots"])
+def _lots_grouped_alias(request: Request):
+    # appels simultanés : une seule requête SQL, octets partagés (freshkeeper/singleflight.py)
+    body = coalesce("lots_grouped", request, _grouped_lots_body)
+    return Response(body, status_code=200, media_type="application/json")
 
-from fastapi.routing import APIRoute
-try:
-    from freshkeeper.routers import products as _prod
-    # priorité max : on insère au début de la table de routage
-    app.router.routes.insert(0, APIRoute(path="/api/products/list", endpoint=_prod.list_products, methods=["GET"], name="products_list"))
-    app.router.routes.insert(0, APIRoute(path="/api/v1/products/list", endpoint=_prod.list_products, methods=["GET"], name="products_list_v1"))
-except Exception as e:
-    print("Insert routes failed:", e)
 from starlette.responses import Response
 
 @app.get("/favicon.ico", include_in_schema=False)
@@ -405,7 +514,11 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import date
 from fastapi import Body
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_engine
+from freshkeeper.cache import invalidate
+from freshkeeper.jobs.change_bus import publish
+from freshkeeper.services.products import create_product_with_lot
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 import os
@@ -422,67 +535,45 @@ def _ensure_engine():
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL not set")
-    return create_engine(url, future=True)
+    return get_engine(url)
 
 # POST /api/products (et /api/v1/products) — crée le produit, et optionnellement un lot initial
 @app.post("/api/products", tags=["products"])
-@app.post("/api/products/", tags=["products"])
-@app.post("/api/v1/products", tags=["products"])
-@app.post("/api/v1/products/", tags=["products"])
 def api_products_create(payload: ProductCreate = Body(...)):
     eng = _ensure_engine()
+    # Produit (recyclé si même nom) + lot initial optionnel : un seul appel
+    # fk_product_with_lot (freshkeeper/services/products.py)
     with eng.begin() as conn:
-        # 1) Produit (recycler si même nom existe déjà)
-        row = conn.execute(text("SELECT id, name, category FROM products WHERE lower(name)=lower(:n) LIMIT 1"),
-                           {"n": payload.name}).first()
-        if row:
-            product_id = int(row[0])
-            prod_name = row[1]
-            prod_cat  = row[2]
-        else:
-            res = conn.execute(
-                text("INSERT INTO products (name, category) VALUES (:name, :category) RETURNING id"),
-                {"name": payload.name, "category": payload.category}
-            )
-            product_id = int(res.scalar_one())
-            prod_name = payload.name
-            prod_cat  = payload.category
-
-        # 2) Lot initial (optionnel)
-        created_lot_id = None
-        if payload.quantity is not None or payload.expiry_date is not None or payload.unit is not None or payload.storage_location_id is not None:
-            storage_id = payload.storage_location_id if payload.storage_location_id is not None else 1
-            res = conn.execute(
-                text("""
-                    INSERT INTO lots (product_id, quantity, unit, expiry_date, storage_location_id)
-                    VALUES (:pid, :quantity, :unit, :expiry_date, :storage_id)
-                    RETURNING id
-                """),
-                {
-                    "pid": product_id,
-                    "quantity": float(payload.quantity) if payload.quantity is not None else 0.0,
-                    "unit": payload.unit,
-                    "expiry_date": payload.expiry_date,
-                    "storage_id": storage_id
-                }
-            )
-            created_lot_id = int(res.scalar_one())
+        created = create_product_with_lot(
+            conn,
+            name=payload.name,
+            category=payload.category,
+            with_lot=any(v is not None for v in (payload.quantity, payload.expiry_date, payload.unit, payload.storage_location_id)),
+            quantity=payload.quantity,
+            unit=payload.unit,
+            expiry_date=payload.expiry_date,
+            storage_location_id=payload.storage_location_id,
+        )
+    invalidate("products", "lots")
 
     # Réponse simple et compatible avec l’app
-    return JSONResponse(
-        content=jsonable_encoder({
-            "id": product_id,
-            "name": prod_name,
-            "category": prod_cat,
-            "created_lot_id": created_lot_id
-        }),
+    return FastJSONResponse(
+        {
+            "id": created["id"],
+            "name": created["name"],
+            "category": created["category"],
+            "created_lot_id": created["lot_id"]
+        },
         status_code=201
     )
 from fastapi import Request
 from pydantic import BaseModel, ValidationError
 from typing import Optional
 from datetime import date
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_engine
+from freshkeeper.cache import invalidate
+from freshkeeper.jobs.change_bus import publish
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 import os
@@ -499,7 +590,7 @@ def _ensure_engine():
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL not set")
-    return create_engine(url, future=True)
+    return get_engine(url)
 
 async def _parse_payload_any(request: Request) -> dict:
     # Essaye JSON, sinon form, sinon vide
@@ -532,61 +623,32 @@ async def _create_product_and_optional_lot(data: dict):
     payload = ProductCreateCompat(**data)
     eng = _ensure_engine()
     with eng.begin() as conn:
-        # 1) Produit (réutilise si même nom, insensible à la casse)
-        row = conn.execute(
-            text("SELECT id, name, category FROM products WHERE lower(name)=lower(:n) LIMIT 1"),
-            {"n": payload.name}
-        ).first()
-        if row:
-            product_id = int(row[0])
-            prod_name = row[1]
-            prod_cat  = row[2]
-        else:
-            res = conn.execute(
-                text("INSERT INTO products (name, category) VALUES (:name, :category) RETURNING id"),
-                {"name": payload.name, "category": payload.category}
-            )
-            product_id = int(res.scalar_one())
-            prod_name = payload.name
-            prod_cat  = payload.category
-
-        # 2) Lot initial (optionnel)
-        created_lot_id = None
-        if any(data.get(k) is not None for k in ("quantity","unit","expiry_date","storage_location_id")):
-            storage_id = payload.storage_location_id if payload.storage_location_id is not None else 1
-            res = conn.execute(
-                text("""
-                    INSERT INTO lots (product_id, quantity, unit, expiry_date, storage_location_id)
-                    VALUES (:pid, :quantity, :unit, :expiry_date, :storage_id)
-                    RETURNING id
-                """),
-                {
-                    "pid": product_id,
-                    "quantity": float(payload.quantity) if payload.quantity is not None else 0.0,
-                    "unit": payload.unit,
-                    "expiry_date": payload.expiry_date,
-                    "storage_id": storage_id
-                }
-            )
-            created_lot_id = int(res.scalar_one())
+        created = create_product_with_lot(
+            conn,
+            name=payload.name,
+            category=payload.category,
+            with_lot=any(data.get(k) is not None for k in ("quantity","unit","expiry_date","storage_location_id")),
+            quantity=payload.quantity,
+            unit=payload.unit,
+            expiry_date=payload.expiry_date,
+            storage_location_id=payload.storage_location_id,
+        )
+    invalidate("products", "lots")
 
     return {
-        "id": product_id,
-        "name": prod_name,
-        "category": prod_cat,
-        "created_lot_id": created_lot_id
+        "id": created["id"],
+        "name": created["name"],
+        "category": created["category"],
+        "created_lot_id": created["lot_id"]
     }
 
-# Nouveaux alias très permissifs (JSON OU FORM) :
+# Nouveaux alias très permissifs (JSON OU FORM) ; aussi /api/product (freshkeeper/routing.py)
 @app.post("/api/products/create", tags=["products"])
-@app.post("/api/products/create/", tags=["products"])
-@app.post("/api/v1/products/create", tags=["products"])
-@app.post("/api/v1/products/create/", tags=["products"])
 async def api_products_create_compat(request: Request):
     data = await _parse_payload_any(request)
     try:
         result = await _create_product_and_optional_lot(data)
-        return JSONResponse(content=jsonable_encoder(result), status_code=201)
+        return FastJSONResponse(result, status_code=201)
     except ValidationError as ve:
         return JSONResponse(content={"detail":"Invalid payload","errors": jsonable_encoder(ve.errors())}, status_code=422)
     except Exception as e:
@@ -632,105 +694,46 @@ async def _parse_payload_any(request: Request) -> dict:
         pass
 
     return {}
-
-# Alias POST singuliers (au cas où l'app utilise /api/product)
-@app.post("/api/product", tags=["products"])
-@app.post("/api/product/", tags=["products"])
-@app.post("/api/v1/product", tags=["products"])
-@app.post("/api/v1/product/", tags=["products"])
-async def api_product_create_singular(request: Request):
-    data = await _parse_payload_any(request)
-    try:
-        result = await _create_product_and_optional_lot(data)
-        return JSONResponse(content=jsonable_encoder(result), status_code=201)
-    except ValidationError as ve:
-        return JSONResponse(content={"detail":"Invalid payload","errors": jsonable_encoder(ve.errors())}, status_code=422)
-    except Exception as e:
-        return JSONResponse(content={"detail":"Server error","error": str(e)}, status_code=500)
 # ===== Pack d’alias pour couvrir les variantes que les apps utilisent souvent =====
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_read_engine
 from decimal import Decimal
 from datetime import date, datetime
 import os
 
-def _plain(v):
-    if isinstance(v, Decimal):
-        try: return float(v)
-        except Exception: return str(v)
-    if isinstance(v, (date, datetime)):
-        return v.isoformat()
-    return v
-
 def _sql_all(q: str):
     url = os.getenv("DATABASE_URL")
     if not url: return []
-    eng = create_engine(url, future=True)
+    eng = get_read_engine(url)
     rows=[]
     with eng.connect() as c:
         for r in c.execute(text(q)).mappings():
-            rows.append({k:_plain(v) for k,v in r.items()})
+            rows.append(dict(r))
     return rows
 
+from freshkeeper.streaming import stream_query, wants_stream
+from freshkeeper.singleflight import coalesce
+
 # --- INVENTORY (alias vers lots groupés)
 @app.get("/api/inventory", tags=["inventory"])
-@app.get("/api/inventory/", tags=["inventory"])
-@app.get("/api/v1/inventory", tags=["inventory"])
-@app.get("/api/v1/inventory/", tags=["inventory"])
-def api_inventory_alias():
-    rows = _sql_all("SELECT id, product_id, quantity, unit, expiry_date, storage_location_id FROM lots ORDER BY id")
-    grouped = {}
-    for r in rows:
-        pid = r.get("product_id")
-        grouped.setdefault(pid, []).append(r)
-    payload = [{"product_id": pid, "lots": lots} for pid, lots in grouped.items()]
-    return JSONResponse(content=jsonable_encoder(payload or []), status_code=200)
-
-# --- CATEGORIES (avec variantes /, /all, v1)
-@app.get("/api/categories", tags=["categories"])
-@app.get("/api/categories/", tags=["categories"])
-@app.get("/api/categories/all", tags=["categories"])
-@app.get("/api/v1/categories", tags=["categories"])
-@app.get("/api/v1/categories/", tags=["categories"])
-@app.get("/api/v1/categories/all", tags=["categories"])
-def api_categories_alias():
-    rows = _sql_all("SELECT category FROM products WHERE category IS NOT NULL")
-    # comptage simple
-    counts = {}
-    for r in rows:
-        c = r.get("category")
-        if c:
-            counts[c] = counts.get(c, 0) + 1
-    payload = [{"name": name, "product_count": count} for name, count in sorted(counts.items())]
-    return JSONResponse(content=jsonable_encoder(payload), status_code=200)
-
-# --- STORAGE LOCATIONS (avec variantes /, v1, et alias '/storage')
-@app.get("/api/storage-locations", tags=["storage"])
-@app.get("/api/storage-locations/", tags=["storage"])
-@app.get("/api/v1/storage-locations", tags=["storage"])
-@app.get("/api/v1/storage-locations/", tags=["storage"])
-@app.get("/api/storage", tags=["storage"])
-@app.get("/api/storage/", tags=["storage"])
-@app.get("/api/v1/storage", tags=["storage"])
-@app.get("/api/v1/storage/", tags=["storage"])
-def api_storage_locations_alias():
-    rows = _sql_all("SELECT id, name FROM storage_locations ORDER BY id")
-    return JSONResponse(content=jsonable_encoder(rows or []), status_code=200)
-
-# --- PRODUCTS LIST (sans /list, pour apps qui appellent juste /products)
-try:
-    from freshkeeper.routers import products as _prod
-    # formes sans /list
-    app.add_api_route("/api/products", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/products/", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products", _prod.list_products, methods=["GET"], tags=["products"])
-    app.add_api_route("/api/v1/products/", _prod.list_products, methods=["GET"], tags=["products"])
-except Exception as e:
-    print("Alias products list (sans /list) non ajoutés:", e)
+def api_inventory_alias(request: Request):
+    if wants_stream(request):
+        # une ligne NDJSON par produit, groupes dans l'ordre de leur premier lot
+        return stream_query(
+            "SELECT id, product_id, quantity, unit, expiry_date, storage_location_id FROM lots "
+            "ORDER BY min(id) OVER (PARTITION BY product_id), id",
+            group_by="product_id",
+        )
+    body = coalesce("inventory", request, _grouped_lots_body)
+    return Response(body, status_code=200, media_type="application/json")
+
+# /api/categories/all, /api/storage : alias de freshkeeper/routing.py
 # ====== DEBUG SQL: CONNECTIVITÉ + TABLES + échantillons ======
 from fastapi.responses import JSONResponse
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_engine
 import os
 
 def _eng():
@@ -738,7 +741,7 @@ def _eng():
     if not url:
         return None, "DATABASE_URL not set"
     try:
-        eng = create_engine(url, future=True)
+        eng = get_engine(url)
         return eng, None
     except Exception as e:
         return None, str(e)
@@ -823,14 +826,17 @@ def debug_samples():
 # ====== ALIASES & CREATE ENDPOINTS pour compat app mobile ======
 from fastapi import Request
 from fastapi.responses import JSONResponse
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from freshkeeper.database import get_engine
+from freshkeeper.cache import invalidate
+from freshkeeper.jobs.change_bus import publish
 import os
 
 def _eng():
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL not set")
-    return create_engine(url, future=True)
+    return get_engine(url)
 
 async def _payload(request: Request):
     ctype = (request.headers.get("content-type") or "").lower()
@@ -845,32 +851,13 @@ async def _payload(request: Request):
     except Exception:
         return {}
 
-# -------- Storage locations (underscores & tirets, avec/sans /api) --------
-def _list_storage_locations():
-    eng = _eng()
-    with eng.connect() as c:
-        rows = [dict(r) for r in c.execute(text(
-            "SELECT id, name, kind, parent_id FROM storage_locations ORDER BY id"
-        )).mappings()]
-        return rows
-
-for _path in [
-    "/storage-locations", "/storage-locations/",
-    "/storage_locations", "/storage_locations/",
-    "/api/storage-locations", "/api/storage-locations/",
-    "/api/storage_locations", "/api/storage_locations/",
-    "/api/v1/storage-locations", "/api/v1/storage-locations/",
-    "/api/v1/storage_locations", "/api/v1/storage_locations/",
-]:
-    app.add_api_route(_path, lambda: _list_storage_locations(), methods=["GET"], tags=["storage"])
-
+# Storage locations (underscores & tirets, avec/sans /api) : GET /storage-locations plus haut
 # -------- Products: POST (JSON ou FORM) + alias multiples --------
+from starlette.concurrency import run_in_threadpool
+
+from freshkeeper.jobs.expiry_timer import notify_product_change
+
 @app.post("/products")
-@app.post("/products/")
-@app.post("/api/products")
-@app.post("/api/products/")
-@app.post("/api/v1/products")
-@app.post("/api/v1/products/")
 async def _create_product(request: Request):
     p = await _payload(request)
     name = (p.get("name") or "").strip()
@@ -897,24 +884,21 @@ async def _create_product(request: Request):
             "name": name, "category": category, "unit": unit,
             "quantity": quantity, "expiry_date": expiry_date, "location": location
         }).scalar_one()
+        publish(c, "products", [new_id])
         row = c.execute(text("""
             SELECT id, name, category, unit, quantity, expiry_date
             FROM products WHERE id=:id
         """), {"id": new_id}).mappings().one()
-    
+    # Timer d'expiration (SCAN_STRATEGY=timer) : alerte immédiate si stock nul ;
+    # peut scanner en base (standby sans bus) -> hors de la boucle d'événements
+    await run_in_threadpool(notify_product_change, new_id, row["quantity"], row["expiry_date"])
+    invalidate("products")
 
 # -------- Lots: GET existe déjà chez toi; on ajoute POST attendu par l'app --------
 # -------- Lots: POST (JSON ou FORM) -----------------------------------------------
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError, ProgrammingError
-from fastapi.encoders import jsonable_encoder
-from decimal import Decimal
+from freshkeeper.services.lots import upsert_lot
 
 @app.post("/lots")
-@app.post("/lots/")
-@app.post("/api/lots")
-@app.post("/api/lots/")
-@app.post("/api/v1/lots")
-@app.post("/api/v1/lots/")
 async def _create_lot(request: Request):
     p = await _payload(request)
 
@@ -931,7 +915,6 @@ async def _create_lot(request: Request):
     quantity = _float(p.get("quantity"))
     unit = p.get("unit") or None
     expiry_date = p.get("expiry_date") or None  # "YYYY-MM-DD" ou None
-    unit_norm = (unit or "").strip().lower()
 
     missing = []
     if not product_id: missing.append("product_id")
@@ -940,57 +923,64 @@ async def _create_lot(request: Request):
     if missing:
         return JSONResponse({"detail":"Invalid payload","errors":[{"loc":missing,"msg":"Field(s) required"}]}, status_code=400)
 
+    # Un seul INSERT ... ON CONFLICT DO UPDATE ... RETURNING (freshkeeper/services/lots.py)
     eng = _eng()
     with eng.begin() as c:
-        params = {
-            "product_id": product_id,
-            "quantity": quantity,
-            "unit": unit,
-            "expiry_date": expiry_date,
-            "storage_location_id": storage_location_id,
-            "unit_norm": unit_norm,
-        }
+        row = upsert_lot(
+            c,
+            product_id=product_id,
+            quantity=quantity,
+            unit=unit,
+            expiry_date=expiry_date,
+            storage_location_id=storage_location_id,
+        )
+        publish(c, "lots", [row["id"]])
+    invalidate("lots")
 
-        # 1) UPDATE si existe
-        upd_id = c.execute(text("""
-            UPDATE lots
-               SET quantity = quantity + :quantity,
-                   updated_at = NOW()
-             WHERE product_id = :product_id
-               AND storage_location_id = :storage_location_id
-               AND ((expiry_date IS NULL AND :expiry_date IS NULL) OR expiry_date = :expiry_date)
-               AND COALESCE(unit_norm,'') = COALESCE(:unit_norm,'')
-            RETURNING id
-        """), params).scalar_one_or_none()
+    return FastJSONResponse(dict(row), status_code=201)
 
-        if upd_id is None:
-            # 2) Sinon INSERT
-            try:
-                new_id = c.execute(text("""
-                    INSERT INTO lots (product_id, quantity, unit, expiry_date, storage_location_id, unit_norm)
-                    VALUES (:product_id, :quantity, :unit, :expiry_date, :storage_location_id, :unit_norm)
-                    RETURNING id
-                """), params).scalar_one()
-            except (IntegrityError, ProgrammingError, SQLAlchemyError):
-                # 3) Collision/contrainte absente → re-UPDATE
-                new_id = c.execute(text("""
-                    UPDATE lots
-                       SET quantity = quantity + :quantity,
-                           updated_at = NOW()
-                     WHERE product_id = :product_id
-                       AND storage_location_id = :storage_location_id
-                       AND ((expiry_date IS NULL AND :expiry_date IS NULL) OR expiry_date = :expiry_date)
-                       AND COALESCE(unit_norm,'') = COALESCE(:unit_norm,'')
-                    RETURNING id
-                """), params).scalar_one()
-        else:
-            new_id = upd_id
+# -------- Lots: POST /lots/bulk (retour de courses : des centaines de lots d'un coup) --------
+from typing import List
+from starlette.concurrency import run_in_threadpool
+from freshkeeper.services.lots import upsert_lots
 
-        row = c.execute(text("""
-            SELECT id, product_id,
-                   CAST(quantity AS double precision) AS quantity,
-                   unit, expiry_date, storage_location_id
-            FROM lots WHERE id=:id
-        """), {"id": new_id}).mappings().one()
+LOTS_BULK_MAX = int(os.getenv("LOTS_BULK_MAX", "5000"))
 
-    return JSONResponse(jsonable_encoder(dict(row), custom_encoder={Decimal: float}), status_code=201)
+class LotBulkItem(BaseModel):
+    product_id: int
+    quantity: float
+    unit: Optional[str] = None
+    expiry_date: Optional[date] = None
+    storage_location_id: int
+
+def _apply_lots_bulk(lots: List[LotBulkItem]):
+    with _eng().begin() as c:
+        results = upsert_lots(c, [l.model_dump() for l in lots])
+        publish(c, "lots", sorted({r["id"] for r in results}))
+    return results
+
+@app.post("/lots/bulk", tags=["lots"])
+async def _create_lots_bulk(request: Request):
+    """
+    Corps : {"lots": [{product_id, quantity, unit, expiry_date, storage_location_id}, ...]}
+    (ou la liste seule). Une transaction, une instruction (freshkeeper/services/lots.py) :
+    tout ou rien ; une ligne de résultat par lot envoyé, dans le même ordre.
+    """
+    p = await _payload(request)
+    items = p.get("lots") if isinstance(p, dict) else p
+    if not isinstance(items, list) or not items:
+        return JSONResponse({"detail":"Invalid payload","errors":[{"loc":["lots"],"msg":"Non-empty list required"}]}, status_code=400)
+    if len(items) > LOTS_BULK_MAX:
+        return JSONResponse({"detail": f"Too many lots (max {LOTS_BULK_MAX})"}, status_code=413)
+    try:
+        lots = [LotBulkItem.model_validate(i) for i in items]
+    except ValidationError as ve:
+        return JSONResponse(content={"detail":"Invalid payload","errors": jsonable_encoder(ve.errors())}, status_code=422)
+
+    try:
+        # milliers de lignes : hors de la boucle d'événements
+        results = await run_in_threadpool(_apply_lots_bulk, lots)
+    except IntegrityError as e:
+        return JSONResponse({"detail":"Unknown product_id or storage_location_id","error": str(e.orig)}, status_code=409)
+    invalidate("lots")
+    return FastJSONResponse({"count": len(results), "lots": results}, status_code=201)
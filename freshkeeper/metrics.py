@@ -0,0 +1,313 @@
+# freshkeeper/metrics.py
+"""
+Métriques HTTP au format Prometheus (GET /metrics).
+
+MetricsMiddleware (ASGI pur) mesure chaque requête :
+  - http_request_duration_seconds : histogramme de latence ;
+  - http_requests_total : compteur par code de statut ;
+  - http_response_size_bytes : histogramme de taille de réponse (corps émis,
+    flux NDJSON compris) ;
+  - http_requests_in_flight : requêtes en cours, par méthode.
+
+Séries par (méthode, route, handler). La route est le gabarit canonique :
+préfixes d'alias /api et /api/v1 et « / » final retirés, si bien que
+/products, /api/products/ et /api/v1/products tombent dans la même série, celle
+du handler qui les sert. Un chemin sans route reçoit route="<unmatched>".
+
+Coût minimal : seaux préalloués, recherche par bisect, aucun verrou — tout est
+mis à jour depuis la boucle d'événements, un seul thread par worker (les
+handlers `def` tournent dans le threadpool, pas ce middleware). Les valeurs
+sont propres au worker : avec plusieurs workers uvicorn, chacun expose les
+siennes (label `worker` = pid).
+
+Les pools SQL (freshkeeper/pool_metrics.py) sont exportés à la suite.
+METRICS_ENABLED=0 désactive la mesure.
+"""
+from __future__ import annotations
+
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bornes supérieures des seaux ; le dernier seau est +Inf
+LATENCY_BUCKETS: Sequence[float] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+SIZE_BUCKETS: Sequence[float] = (
+    256,
+    1024,
+    4096,
+    16384,
+    65536,
+    262144,
+    1048576,
+    4194304,
+    16777216,
+)
+
+ALIAS_PREFIXES = ("/api/v1", "/api")
+UNMATCHED = "<unmatched>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def is_metrics_enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+
+def canonical_route(path: str) -> str:
+    """Gabarit sans préfixe d'alias ni « / » final : /api/v1/products/ -> /products."""
+    for prefix in ALIAS_PREFIXES:
+        if path == prefix or path.startswith(prefix + "/"):
+            path = path[len(prefix) :]
+            break
+    return path.rstrip("/") or "/"
+
+
+def _route_labels(scope) -> Tuple[str, str]:
+    """(route canonique, handler) de la route retenue par le routeur."""
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED, ""
+    # gabarit complet, préfixe d'include_router compris (FastAPI >= 0.140)
+    ctx = (scope.get("fastapi") or {}).get("effective_route_context")
+    template = getattr(ctx, "path", None) or getattr(route, "path", "") or ""
+    endpoint = scope.get("endpoint") or getattr(route, "endpoint", None)
+    handler = (
+        f"{endpoint.__module__}.{endpoint.__qualname__}"
+        if endpoint is not None and hasattr(endpoint, "__qualname__")
+        else getattr(route, "name", "") or ""
+    )
+    return canonical_route(template), handler
+
+
+class _Buckets:
+    """Histogramme à seaux préalloués, non cumulés (cumulés à l'export)."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # bisect_left : une valeur égale à la borne tombe dans son seau (le <=)
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        out, acc = [], 0
+        for c in self.counts:
+            acc += c
+            out.append(acc)
+        return out
+
+
+class _Series:
+    __slots__ = ("latency", "size", "statuses")
+
+    def __init__(self):
+        self.latency = _Buckets(LATENCY_BUCKETS)
+        self.size = _Buckets(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+
+class HttpMetrics:
+    """Séries HTTP d'un worker ; à n'alimenter que depuis la boucle d'événements."""
+
+    def __init__(self):
+        self.series: Dict[Tuple[str, str, str], _Series] = {}
+        self.in_flight: Dict[str, int] = {}
+
+    def reset(self) -> None:
+        self.series = {}
+        self.in_flight = {}
+
+    def started(self, method: str) -> None:
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def finished(
+        self,
+        method: str,
+        route: str,
+        handler: str,
+        status: int,
+        seconds: float,
+        size: int,
+    ) -> None:
+        self.in_flight[method] -= 1
+        key = (method, route, handler)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series()
+        series.latency.observe(seconds)
+        series.size.observe(size)
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+
+
+http_metrics = HttpMetrics()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, statut, taille et requêtes en cours par route."""
+
+    def __init__(self, app, metrics: Optional[HttpMetrics] = None):
+        self.app = app
+        self.metrics = metrics or http_metrics
+        self.enabled = is_metrics_enabled()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status, size = 500, 0
+
+        async def send_measured(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.started(method)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            # le routeur a complété `scope` en place (route, endpoint)
+            route, handler = _route_labels(scope)
+            self.metrics.finished(
+                method, route, handler, status, time.perf_counter() - t0, size
+            )
+
+
+# ---- Exposition Prometheus ----
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, Any]]) -> str:
+    inner = ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs)
+    return "{" + inner + "}" if inner else ""
+
+
+def _histogram_lines(name: str, labels, bounds, cumulative, count, total) -> List[str]:
+    lines = [
+        f"{name}_bucket{_labels([*labels, ('le', b)])} {n}"
+        for b, n in zip(bounds, cumulative)
+    ]
+    lines.append(f"{name}_bucket{_labels([*labels, ('le', '+Inf')])} {cumulative[-1]}")
+    lines.append(f"{name}_sum{_labels(labels)} {total}")
+    lines.append(f"{name}_count{_labels(labels)} {count}")
+    return lines
+
+
+def _header(name: str, kind: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _render_http(metrics: HttpMetrics, worker: Tuple[str, str]) -> List[str]:
+    # copies : l'export peut aussi tourner hors de la boucle (tests, scripts)
+    series = list(metrics.series.items())
+    in_flight = list(metrics.in_flight.items())
+
+    lines = _header(
+        "http_requests_in_flight", "gauge", "Requêtes HTTP en cours de traitement."
+    )
+    for method, n in in_flight:
+        lines.append(
+            f"http_requests_in_flight{_labels([worker, ('method', method)])} {n}"
+        )
+
+    lines += _header("http_requests_total", "counter", "Requêtes HTTP terminées.")
+    for (method, route, handler), s in series:
+        base = [worker, ("method", method), ("route", route), ("handler", handler)]
+        for status, n in list(s.statuses.items()):
+            lines.append(
+                f"http_requests_total{_labels([*base, ('status', status)])} {n}"
+            )
+
+    for name, attr, help_text in (
+        (
+            "http_request_duration_seconds",
+            "latency",
+            "Durée de traitement des requêtes HTTP.",
+        ),
+        ("http_response_size_bytes", "size", "Taille du corps des réponses HTTP."),
+    ):
+        lines += _header(name, "histogram", help_text)
+        for (method, route, handler), s in series:
+            h = getattr(s, attr)
+            base = [worker, ("method", method), ("route", route), ("handler", handler)]
+            lines += _histogram_lines(
+                name, base, h.bounds, h.cumulative(), h.count, round(h.sum, 6)
+            )
+    return lines
+
+
+def _render_pools(worker: Tuple[str, str]) -> List[str]:
+    from freshkeeper.pool_metrics import pool_metrics
+
+    engines = pool_metrics()["engines"]
+    lines: List[str] = []
+    for gauge in ("size", "checked_out", "overflow"):
+        name = f"db_pool_{gauge}"
+        lines += _header(name, "gauge", f"Pool SQL : {gauge}.")
+        for e in engines:
+            if gauge in e:
+                lines.append(
+                    f"{name}{_labels([worker, ('pool', e['name'])])} {e[gauge]}"
+                )
+
+    lines += _header("db_pool_events_total", "counter", "Événements du pool SQL.")
+    for e in engines:
+        for event, n in e["counters"].items():
+            labels = [worker, ("pool", e["name"]), ("event", event)]
+            lines.append(f"db_pool_events_total{_labels(labels)} {n}")
+
+    for name, key, help_text in (
+        ("db_pool_wait_seconds", "wait_ms", "Attente d'une connexion au checkout."),
+        ("db_pool_hold_seconds", "hold_ms", "Durée de détention d'une connexion."),
+    ):
+        lines += _header(name, "histogram", help_text)
+        for e in engines:
+            snap = e[key]
+            buckets = snap["buckets"]
+            bounds = [float(b) / 1000 for b in buckets if b != "+Inf"]
+            lines += _histogram_lines(
+                name,
+                [worker, ("pool", e["name"])],
+                bounds,
+                list(buckets.values()),
+                snap["count"],
+                round(snap["sum"] / 1000, 6),
+            )
+    return lines
+
+
+def render_prometheus(metrics: Optional[HttpMetrics] = None) -> str:
+    """Texte d'exposition Prometheus 0.0.4 : HTTP puis pools SQL."""
+    worker = ("worker", str(os.getpid()))
+    lines = _render_http(metrics or http_metrics, worker)
+    try:
+        lines += _render_pools(worker)
+    except Exception:
+        pass  # les métriques HTTP restent servies
+    return "\n".join(lines) + "\n"
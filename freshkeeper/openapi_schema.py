@@ -0,0 +1,136 @@
+# freshkeeper/openapi_schema.py
+"""
+Schéma OpenAPI calculé une fois, servi depuis un tampon d'octets avec ETag.
+
+FastAPI génère le schéma au premier GET /openapi.json (ou /docs) après chaque
+déploiement, puis le resérialise à chaque appel. Ici :
+
+  - build() (au démarrage, cf. main.py) génère le schéma et l'encode une seule
+    fois ; OPENAPI_SCHEMA_FILE pointe éventuellement vers un schéma produit au
+    build (export_openapi_yaml.py -> docs/openapi.json), lu tel quel ;
+  - install_openapi_cache(app) remplace la route /openapi.json par une route qui
+    renvoie ces octets, avec ETag (blake2b du contenu) et 304 sur If-None-Match ;
+  - export(app) écrit docs/openapi.json et Doc/freshkeeper-openapi.yaml sans
+    serveur : il suffit d'importer l'application.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from freshkeeper.conditional import _etag_matches
+from freshkeeper.responses import dumps
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+JSON_EXPORT = PROJECT_ROOT / "docs" / "openapi.json"
+YAML_EXPORT = PROJECT_ROOT / "Doc" / "freshkeeper-openapi.yaml"
+
+
+class CachedOpenAPI:
+    """Octets + ETag du schéma de `app`, par root_path (servers diffère)."""
+
+    def __init__(self, app, schema_file: Optional[str] = None):
+        self.app = app
+        self.schema_file = (
+            os.getenv("OPENAPI_SCHEMA_FILE") if schema_file is None else schema_file
+        )
+        self._entries: Dict[str, Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def _schema(self, root_path: str) -> dict:
+        schema = self.app.openapi()
+        if root_path and self.app.root_path_in_servers:
+            servers = schema.get("servers", [])
+            if root_path not in {s.get("url") for s in servers}:
+                schema = {**schema, "servers": [{"url": root_path}, *servers]}
+        return schema
+
+    def _load_file(self) -> Optional[bytes]:
+        if not self.schema_file:
+            return None
+        try:
+            body = Path(self.schema_file).read_bytes()
+            json.loads(body)
+        except (OSError, ValueError) as e:
+            log.warning("Schéma OpenAPI %s ignoré : %s", self.schema_file, e)
+            return None
+        return body
+
+    def build(self, root_path: str = "") -> Tuple[bytes, str]:
+        """(octets, ETag) pour `root_path`, calculés au premier appel seulement."""
+        entry = self._entries.get(root_path)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._entries.get(root_path)
+            if entry is None:
+                body = None if root_path else self._load_file()
+                if body is None:
+                    body = dumps(self._schema(root_path))
+                etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+                entry = self._entries[root_path] = (body, etag)
+        return entry
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.app.openapi_schema = None
+
+    async def endpoint(self, request: Request) -> Response:
+        root_path = request.scope.get("root_path", "").rstrip("/")
+        body, etag = self.build(root_path)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        inm = request.headers.get("if-none-match")
+        if inm is not None and _etag_matches(inm, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+
+def install_openapi_cache(app, schema_file: Optional[str] = None) -> CachedOpenAPI:
+    """Remplace la route /openapi.json de FastAPI par la version en cache."""
+    cache = CachedOpenAPI(app, schema_file)
+    if app.openapi_url:
+        route = Route(app.openapi_url, cache.endpoint, include_in_schema=False)
+        routes = app.router.routes
+        for i, existing in enumerate(routes):
+            if getattr(existing, "path", None) == app.openapi_url:
+                routes[i] = route
+                break
+        else:
+            routes.append(route)
+    app.state.openapi_cache = cache
+    return cache
+
+
+def export(
+    app,
+    json_path: Path = JSON_EXPORT,
+    yaml_path: Optional[Path] = YAML_EXPORT,
+) -> dict:
+    """Écrit le schéma de `app` en JSON (et YAML si PyYAML est installé)."""
+    schema = app.openapi()
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    if yaml_path is not None:
+        try:
+            import yaml  # type: ignore
+        except ImportError:  # pragma: no cover - dépendance optionnelle
+            log.warning("PyYAML absent : %s non écrit (pip install pyyaml)", yaml_path)
+            return schema
+        yaml_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(yaml_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(schema, f, sort_keys=False, allow_unicode=True)
+    return schema
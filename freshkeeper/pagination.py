@@ -0,0 +1,203 @@
+# freshkeeper/pagination.py
+"""
+Pagination keyset (curseur) commune aux listes products / lots / alerts.
+
+Ordre identique aux listes historiques ; la page suivante est lue par
+`(clé de tri, id) > (valeurs du dernier élément)`, donc coût constant quelle
+que soit la profondeur (pas d'OFFSET qui relit les pages précédentes).
+
+Compatibilité : sans page/size/limit/cursor, la route renvoie la liste brute
+comme avant ; avec l'un d'eux, l'enveloppe {items,total,page,size,next_cursor}
+attendue par le mobile (mobile/src/api/products.ts).
+"""
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import text
+
+from freshkeeper.responses import FastJSONResponse
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Borne des clés COALESCE : NULLS LAST sans casser la comparaison de lignes
+# (littéral sans type : date côté Postgres, texte ISO côté SQLite)
+DATE_MAX = "'9999-12-31'"
+
+T = TypeVar("T")
+
+_PARSERS = {
+    "int": int,
+    "str": str,
+    "date": date.fromisoformat,
+    "datetime": datetime.fromisoformat,
+}
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    total: Optional[int] = None
+    page: Optional[int] = None
+    size: int
+    next_cursor: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class SortKey:
+    expr: str  # expression SQL non NULL (COALESCE si la colonne est nullable)
+    kind: str = "int"  # int | str | date | datetime (typage du curseur décodé)
+
+
+ID_KEYS = (SortKey("id"),)
+
+
+@dataclass
+class PageParams:
+    size: Optional[int] = None
+    page: Optional[int] = None
+    cursor: Optional[str] = None
+    total: Optional[str] = None  # None | "estimate" | "exact"
+
+    @property
+    def paginated(self) -> bool:
+        return self.size is not None or self.page is not None or bool(self.cursor)
+
+
+def page_params(
+    page: Optional[int] = Query(None, ge=1),
+    size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    total: Optional[str] = Query(None, pattern="^(estimate|exact)$"),
+) -> PageParams:
+    """Dépendance FastAPI : `limit` est un alias de `size`."""
+    return PageParams(size=size or limit, page=page, cursor=cursor, total=total)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("arity")
+        return [_PARSERS[k.kind](v) for k, v in zip(keys, values)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _total(
+    conn, table: str, where_sql: str, params: Dict[str, Any], mode: str
+) -> Optional[int]:
+    # Session ou Connection
+    bind = conn.get_bind() if hasattr(conn, "get_bind") else conn
+    if mode == "exact" or bind.dialect.name != "postgresql":
+        return conn.execute(
+            text(f"SELECT count(*) FROM {table} {where_sql}"), params
+        ).scalar()
+    # Estimation du planner : O(1), sans parcourir la table
+    plan = conn.execute(
+        text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table} {where_sql}"), params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def fetch_page(
+    conn,
+    table: str,
+    columns: str,
+    keys: Sequence[SortKey],
+    page: PageParams,
+    where: Sequence[str] = (),
+    params: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Lit une page (ou tout, si page.paginated est faux) et retourne
+    (lignes, méta {total,page,size,next_cursor}). `conn` : Connection ou Session.
+    """
+    params = dict(params or {})
+    conds = list(where)
+    where_sql = ("WHERE " + " AND ".join(conds)) if conds else ""
+    order_sql = ", ".join(k.expr for k in keys)
+    key_cols = ", ".join(f"{k.expr} AS _k{i}" for i, k in enumerate(keys))
+
+    if not page.paginated:
+        rows = conn.execute(
+            text(f"SELECT {columns} FROM {table} {where_sql} ORDER BY {order_sql}"),
+            params,
+        ).mappings()
+        return [dict(r) for r in rows], {}
+
+    size = page.size or DEFAULT_PAGE_SIZE
+    offset = ""
+    if page.cursor:
+        values = decode_cursor(page.cursor, keys)
+        marks = ", ".join(f":_c{i}" for i in range(len(keys)))
+        conds.append(f"({order_sql}) > ({marks})")
+        params.update({f"_c{i}": v for i, v in enumerate(values)})
+    elif page.page and page.page > 1:
+        # accès direct à la page N (client mobile) ; ensuite, suivre next_cursor
+        offset = f"OFFSET {(page.page - 1) * size}"
+    page_where = ("WHERE " + " AND ".join(conds)) if conds else ""
+
+    rows = [
+        dict(r)
+        for r in conn.execute(
+            text(
+                f"SELECT {columns}, {key_cols} FROM {table} {page_where} "
+                f"ORDER BY {order_sql} LIMIT {size + 1} {offset}"
+            ),
+            params,
+        ).mappings()
+    ]
+    has_more = len(rows) > size
+    rows = rows[:size]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([rows[-1][f"_k{i}"] for i in range(len(keys))])
+    for r in rows:
+        for i in range(len(keys)):
+            r.pop(f"_k{i}")
+
+    meta = {
+        "total": (
+            _total(conn, table, where_sql, params, page.total) if page.total else None
+        ),
+        "page": page.page if not page.cursor else None,
+        "size": size,
+        "next_cursor": next_cursor,
+    }
+    return rows, meta
+
+
+def list_response(
+    items: List[Dict[str, Any]], meta: Dict[str, Any], page: PageParams
+) -> FastJSONResponse:
+    """Liste brute (historique) ou enveloppe paginée selon les paramètres reçus."""
+    if not page.paginated:
+        return FastJSONResponse(items or [], status_code=200)
+    body = {
+        "items": items,
+        "total": None,
+        "page": page.page,
+        "size": page.size or DEFAULT_PAGE_SIZE,
+        "next_cursor": None,
+        **meta,
+    }
+    return FastJSONResponse(body, status_code=200)
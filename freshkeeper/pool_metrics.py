@@ -0,0 +1,307 @@
+# freshkeeper/pool_metrics.py
+"""
+Instrumentation des pools de connexions SQLAlchemy.
+
+Chaque engine créé par freshkeeper.database est instrumenté :
+  - compteurs : connexions DBAPI ouvertes / fermées (churn), checkouts,
+    checkins, invalidations (dures et douces), détachements ;
+  - histogrammes (ms) : attente d'une connexion au checkout (pool plein =
+    saturation) et durée de détention (checkout -> checkin) ;
+  - jauges lues sur le pool : taille, connexions prêtées, overflow, taux de
+    saturation ;
+  - ventilation par origine (`db_origin`) : "app" par défaut,
+    "scheduler:<job_id>" pour les jobs APScheduler (cf. jobs/scheduler.py).
+
+Exposé sur GET /admin/db/pool. Un engine qui se crée par requête se voit
+immédiatement : `connects` suit `checkouts` au lieu de plafonner à la taille
+du pool.
+"""
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Bornes supérieures des seaux (ms) ; le dernier seau est +Inf
+BUCKETS_MS: Sequence[float] = (
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+)
+
+_origin: ContextVar[str] = ContextVar("freshkeeper_db_origin", default="app")
+
+
+@contextmanager
+def db_origin(name: str) -> Iterator[None]:
+    """Attribue à `name` les connexions empruntées dans le bloc."""
+    token = _origin.set(name)
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def tracked(name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """`fn` exécutée sous db_origin(name) (jobs planifiés, threads de fond)."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with db_origin(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class Histogram:
+    """Histogramme cumulatif à seaux fixes (format Prometheus)."""
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Borne supérieure du seau contenant le quantile `q` (estimation)."""
+        with self._lock:
+            counts, total = list(self._counts), self.count
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def cumulative(self) -> List[int]:
+        with self._lock:
+            counts = list(self._counts)
+        out, acc = [], 0
+        for c in counts:
+            acc += c
+            out.append(acc)
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = self.cumulative()
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{str(b): n for b, n in zip(self.buckets, cumulative)},
+                "+Inf": cumulative[-1],
+            },
+        }
+
+
+class _OriginStats:
+    __slots__ = ("checkouts", "checked_out", "hold_ms")
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checked_out = 0
+        self.hold_ms = Histogram()
+
+
+class PoolStats:
+    """Compteurs et histogrammes d'un engine (alimentés par les événements du pool)."""
+
+    COUNTERS = (
+        "connects",
+        "closes",
+        "checkouts",
+        "checkins",
+        "invalidations",
+        "soft_invalidations",
+        "detaches",
+    )
+
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.wait_ms = Histogram()
+        self.hold_ms = Histogram()
+        self.origins: Dict[str, _OriginStats] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, counter: str) -> None:
+        with self._lock:
+            self.counts[counter] += 1
+
+    def checkout(self, record) -> None:
+        origin = _origin.get()
+        record.info["fk_origin"] = origin
+        record.info["fk_out_at"] = time.perf_counter()
+        with self._lock:
+            self.counts["checkouts"] += 1
+            stats = self.origins.get(origin)
+            if stats is None:
+                stats = self.origins[origin] = _OriginStats()
+            stats.checkouts += 1
+            stats.checked_out += 1
+
+    def checkin(self, record) -> None:
+        origin = record.info.pop("fk_origin", None)
+        out_at = record.info.pop("fk_out_at", None)
+        with self._lock:
+            self.counts["checkins"] += 1
+            stats = self.origins.get(origin) if origin else None
+            if stats is not None:
+                stats.checked_out = max(0, stats.checked_out - 1)
+        if out_at is not None:
+            held = (time.perf_counter() - out_at) * 1000
+            self.hold_ms.observe(held)
+            if stats is not None:
+                stats.hold_ms.observe(held)
+
+    def gauges(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return {"pool_class": type(pool).__name__}
+        size, overflow = pool.size(), pool.overflow()
+        capacity = size + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        return {
+            "pool_class": type(pool).__name__,
+            "size": size,
+            "max_overflow": pool._max_overflow,
+            "checked_in": pool.checkedin(),
+            "checked_out": checked_out,
+            "overflow": overflow,
+            "saturation": round(checked_out / capacity, 4) if capacity > 0 else None,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+            origins = {
+                name: {
+                    "checkouts": o.checkouts,
+                    "checked_out": o.checked_out,
+                    "hold_ms": o.hold_ms.snapshot(),
+                }
+                for name, o in self.origins.items()
+            }
+        return {
+            "name": self.name,
+            **self.gauges(),
+            "counters": counts,
+            "wait_ms": self.wait_ms.snapshot(),
+            "hold_ms": self.hold_ms.snapshot(),
+            "origins": origins,
+        }
+
+
+# {pool logging name : stats} — le nom survit à pool.recreate() (dispose)
+_STATS: Dict[str, PoolStats] = {}
+_STATS_LOCK = threading.Lock()
+
+
+class _TimedCheckout:
+    """Mesure l'attente de _do_get (file d'attente du pool, création incluse)."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = _STATS.get(self._orig_logging_name or "")
+            if stats is not None:
+                stats.wait_ms.observe((time.perf_counter() - t0) * 1000)
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine, name: str) -> PoolStats:
+    """Branche les listeners du pool de `engine` ; idempotent par `name`."""
+    with _STATS_LOCK:
+        stats = _STATS.get(name)
+        if stats is not None and stats.engine is engine:
+            return stats
+        stats = _STATS[name] = PoolStats(name, engine)
+
+    event.listen(engine, "connect", lambda *a: stats.incr("connects"))
+    event.listen(engine, "close", lambda *a: stats.incr("closes"))
+    event.listen(engine, "close_detached", lambda *a: stats.incr("closes"))
+    event.listen(engine, "detach", lambda *a: stats.incr("detaches"))
+    event.listen(engine, "invalidate", lambda *a: stats.incr("invalidations"))
+    event.listen(engine, "soft_invalidate", lambda *a: stats.incr("soft_invalidations"))
+    event.listen(engine, "checkout", lambda dbapi, rec, proxy: stats.checkout(rec))
+    event.listen(engine, "checkin", lambda dbapi, rec: stats.checkin(rec))
+    return stats
+
+
+def display_name(url: str) -> str:
+    """Nom d'engine sans mot de passe (métriques, logs)."""
+    from sqlalchemy.engine import make_url
+
+    try:
+        return make_url(url).render_as_string(hide_password=True)
+    except Exception:
+        return "<url invalide>"
+
+
+def _scheduler_usage(engines: List[Dict[str, Any]]) -> Dict[str, Any]:
+    jobs: Dict[str, Dict[str, Any]] = {}
+    for e in engines:
+        for origin, o in e["origins"].items():
+            if not origin.startswith("scheduler:"):
+                continue
+            job = jobs.setdefault(
+                origin.split(":", 1)[1],
+                {"checkouts": 0, "checked_out": 0, "hold_ms_sum": 0.0},
+            )
+            job["checkouts"] += o["checkouts"]
+            job["checked_out"] += o["checked_out"]
+            job["hold_ms_sum"] = round(job["hold_ms_sum"] + o["hold_ms"]["sum"], 3)
+    return {
+        "checkouts": sum(j["checkouts"] for j in jobs.values()),
+        "checked_out": sum(j["checked_out"] for j in jobs.values()),
+        "jobs": jobs,
+    }
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Instantané de tous les pools instrumentés + usage du scheduler."""
+    with _STATS_LOCK:
+        stats = list(_STATS.values())
+    engines = [s.snapshot() for s in stats]
+    return {"engines": engines, "scheduler": _scheduler_usage(engines)}
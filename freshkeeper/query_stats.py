@@ -0,0 +1,270 @@
+# freshkeeper/query_stats.py
+"""
+Comptage des requêtes SQL par requête HTTP et capture des requêtes lentes.
+
+Les N+1 (une requête par nom dans group_lots_by_name_and_expiry, trois par
+alerte dans run_scan...) ne se voient qu'en charge réelle. Ici, chaque
+instruction passée par un engine SQLAlchemy (hooks before/after_cursor_execute
+posés sur la classe Engine : tous les engines, sync et async) est :
+
+  - comptée, avec sa durée, dans les statistiques de la requête HTTP en cours
+    (QueryStatsMiddleware) ;
+  - journalisée si elle dépasse SLOW_QUERY_MS (200), avec son empreinte
+    (SQL normalisé : littéraux et paramètres remplacés par « ? ») ; les
+    requêtes lentes sont agrégées par empreinte sur GET /admin/db/slow ;
+  - si une requête HTTP dépasse QUERY_COUNT_WARN (50) instructions, un
+    avertissement cite les instructions les plus répétées (signature N+1).
+
+QUERY_STATS_HEADER=1 (débogage) ajoute aux réponses X-DB-Queries et
+Server-Timing (db;dur=...) : ce qui a été exécuté avant l'envoi des en-têtes,
+donc sans les lignes d'un flux NDJSON. QUERY_STATS_ENABLED=0 coupe tout.
+
+Tests : `with assert_max_queries(3): client.get(...)` (fixture query_budget).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() not in ("0", "false", "no", "")
+
+
+# ---- Empreinte ----
+_FP_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),  # chaînes
+    (re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+"), "?"),  # paramètres liés
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),  # nombres
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?+)"),  # IN (?, ?, ...)
+    (re.compile(r"\s+"), " "),
+)
+
+
+def normalize_sql(statement: str) -> str:
+    """SQL sans littéraux ni paramètres : deux appels d'une même requête coïncident."""
+    for pattern, repl in _FP_RULES:
+        statement = pattern.sub(repl, statement)
+    return statement.strip()
+
+
+def _digest(normalized: str) -> str:
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def fingerprint(statement: str) -> str:
+    return _digest(normalize_sql(statement))
+
+
+# ---- Statistiques ----
+class QueryStats:
+    """Instructions exécutées dans une portée (requête HTTP ou bloc de test)."""
+
+    __slots__ = ("count", "db_ms", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        # {texte SQL : nombre} ; texte brut, paramètres liés à part : une boucle
+        # N+1 répète le même texte
+        self.statements: Counter = Counter()
+
+    def add(self, statement: str, ms: float) -> None:
+        self.count += 1
+        self.db_ms += ms
+        self.statements[statement] += 1
+
+    def repeated(self, n: int = 3) -> List[Tuple[str, int]]:
+        return [(normalize_sql(s), c) for s, c in self.statements.most_common(n)]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar(
+    "freshkeeper_query_stats", default=None
+)
+
+# Collecteurs ouverts par assert_max_queries/capture_queries : reçoivent toutes
+# les instructions, quel que soit le thread (le TestClient sert dans le sien)
+_collectors: List[QueryStats] = []
+_collectors_lock = threading.Lock()
+
+# {empreinte : agrégat} des requêtes lentes, borné
+_SLOW_MAX = 200
+_slow: Dict[str, Dict[str, Any]] = {}
+_slow_lock = threading.Lock()
+
+
+def _record_slow(statement: str, ms: float) -> None:
+    sql = normalize_sql(statement)
+    fp = _digest(sql)
+    log.warning("Requête SQL lente %.1f ms [%s] %s", ms, fp, sql[:500])
+    with _slow_lock:
+        entry = _slow.get(fp)
+        if entry is None:
+            if len(_slow) >= _SLOW_MAX:
+                return
+            entry = _slow[fp] = {
+                "sql": sql[:500],
+                "count": 0,
+                "sum_ms": 0.0,
+                "max_ms": 0.0,
+            }
+        entry["count"] += 1
+        entry["sum_ms"] = round(entry["sum_ms"] + ms, 3)
+        entry["max_ms"] = round(max(entry["max_ms"], ms), 3)
+
+
+def slow_queries() -> Dict[str, Any]:
+    """Requêtes lentes par empreinte, les plus coûteuses d'abord."""
+    with _slow_lock:
+        items = [{"fingerprint": fp, **e} for fp, e in _slow.items()]
+    items.sort(key=lambda e: e["sum_ms"], reverse=True)
+    return {"threshold_ms": _get_float("SLOW_QUERY_MS", 200.0), "queries": items}
+
+
+def reset_slow_queries() -> None:
+    with _slow_lock:
+        _slow.clear()
+
+
+# ---- Hooks SQLAlchemy ----
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("fk_query_t0", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("fk_query_t0")
+    if not starts:
+        return
+    ms = (time.perf_counter() - starts.pop()) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, ms)
+    if _collectors:
+        with _collectors_lock:
+            for collector in _collectors:
+                collector.add(statement, ms)
+    if ms >= _SLOW_MS:
+        _record_slow(statement, ms)
+
+
+_SLOW_MS = _get_float("SLOW_QUERY_MS", 200.0)
+_installed = False
+
+
+def install_query_hooks() -> None:
+    """Pose les hooks sur la classe Engine (idempotent)."""
+    global _installed
+    if _installed or not _flag("QUERY_STATS_ENABLED", "1"):
+        return
+    event.listen(Engine, "before_cursor_execute", _before)
+    event.listen(Engine, "after_cursor_execute", _after)
+    _installed = True
+
+
+# ---- Portées ----
+@contextmanager
+def query_scope() -> Iterator[QueryStats]:
+    """Compte les instructions du contexte courant (threads du threadpool compris)."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryStats]:
+    """Compte toutes les instructions exécutées pendant le bloc, tous threads confondus."""
+    install_query_hooks()
+    stats = QueryStats()
+    with _collectors_lock:
+        _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        with _collectors_lock:
+            _collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(budget: int) -> Iterator[QueryStats]:
+    """Échoue si le bloc exécute plus de `budget` instructions SQL."""
+    with capture_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        detail = "\n".join(f"  {n} x {sql[:200]}" for sql, n in stats.repeated(10))
+        raise AssertionError(
+            f"{stats.count} requêtes SQL pour un budget de {budget} :\n{detail}"
+        )
+
+
+class QueryStatsMiddleware:
+    """
+    Middleware ASGI : une portée de comptage par requête HTTP ; en-têtes de
+    débogage si QUERY_STATS_HEADER=1, avertissement au-delà de QUERY_COUNT_WARN.
+    """
+
+    def __init__(self, app, header: Optional[bool] = None):
+        self.app = app
+        self.enabled = _flag("QUERY_STATS_ENABLED", "1")
+        self.header = _flag("QUERY_STATS_HEADER", "0") if header is None else header
+        self.warn_at = int(_get_float("QUERY_COUNT_WARN", 50))
+        if self.enabled:
+            install_query_hooks()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with query_scope() as stats:
+            send_with_header = send
+            if self.header:
+
+                async def send_with_header(message):
+                    if message["type"] == "http.response.start":
+                        timing = (
+                            f'db;desc="{stats.count} queries";dur={stats.db_ms:.1f}'
+                        )
+                        message = {
+                            **message,
+                            "headers": [
+                                *message.get("headers", []),
+                                (b"x-db-queries", str(stats.count).encode()),
+                                (b"server-timing", timing.encode()),
+                            ],
+                        }
+                    await send(message)
+
+            await self.app(scope, receive, send_with_header)
+
+        if stats.count > self.warn_at:
+            log.warning(
+                "%s %s : %d requêtes SQL (%.1f ms) ; plus répétées : %s",
+                scope["method"],
+                scope["path"],
+                stats.count,
+                stats.db_ms,
+                "; ".join(f"{n} x {sql[:120]}" for sql, n in stats.repeated()),
+            )
@@ -0,0 +1,316 @@
+# freshkeeper/replicas.py
+"""
+Routage des lectures vers des réplicas PostgreSQL (optionnel).
+
+DATABASE_READ_URLS="postgresql+psycopg://...@replica1/frigoapp,..." : les
+requêtes GET/HEAD lisent sur un réplica (round-robin), tout le reste — et
+tout ce qui tourne hors requête HTTP (jobs, warm-up) — sur DATABASE_URL.
+Sans DATABASE_READ_URLS, rien ne change.
+
+  - Un réplica est choisi une fois par requête puis conservé : l'ETag
+    (table_change_log) et les lignes viennent du même serveur.
+  - Lecture de ses propres écritures : après un POST/PUT/PATCH/DELETE réussi,
+    le client reçoit un cookie `fk_rw` ; pendant READ_YOUR_WRITES_SECONDS (5),
+    ses GET restent sur le primaire, quel que soit le worker qui les sert.
+  - Santé : chaque réplica est sondé au plus toutes les REPLICA_CHECK_SECONDS
+    (5) — connexion + retard de rejeu ; injoignable, en erreur de connexion
+    (engines sync et async) ou en retard de plus de REPLICA_MAX_LAG_SECONDS
+    (10), il est écarté pour REPLICA_RETRY_SECONDS (30) et les lectures
+    retombent sur les autres réplicas, puis sur le primaire.
+  - La sonde (connexion bloquante) tourne dans le threadpool, lancée par le
+    middleware avant la requête ; le choix du réplica (read_url(), appelé
+    aussi depuis les routes async) ne lit que l'état connu, sans I/O.
+
+État par réplica sur GET /admin/replicas.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, text
+from starlette.concurrency import run_in_threadpool
+
+from freshkeeper.pool_metrics import display_name
+
+log = logging.getLogger(__name__)
+
+RYW_COOKIE = "fk_rw"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Retard de rejeu nul si tout le WAL reçu est rejoué (réplica à jour, même
+# sans écriture récente) ou si le serveur n'est pas un réplica.
+LAG_SQL = """
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() THEN 0
+      WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+@dataclass
+class _ReadScope:
+    """Portée d'une requête GET : réplica retenu (None : primaire)."""
+
+    url: Optional[str] = None
+    chosen: bool = False
+
+
+_read_scope: ContextVar[Optional[_ReadScope]] = ContextVar(
+    "freshkeeper_read_scope", default=None
+)
+
+
+@dataclass
+class _Health:
+    down_until: float = 0.0
+    checked_at: float = 0.0
+    lag_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+    reads: int = 0
+    failures: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class ReplicaSet:
+    """Réplicas de lecture : round-robin sur ceux en bonne santé."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        check_seconds: float = 5.0,
+        retry_seconds: float = 30.0,
+        max_lag_seconds: float = 10.0,
+    ):
+        self.urls = list(urls)
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self._rr = itertools.count()
+        self._health: Dict[str, _Health] = {u: _Health() for u in self.urls}
+        self._hooked: "weakref.WeakSet" = weakref.WeakSet()
+        self._hook_lock = threading.Lock()
+        self.primary_fallbacks = 0
+
+    def watch(self, url: str, eng) -> None:
+        """
+        Erreur de connexion en cours de requête sur `eng` (Engine, ou
+        AsyncEngine.sync_engine) : réplica écarté sans attendre la sonde.
+        """
+        if eng in self._hooked:
+            return
+        with self._hook_lock:
+            if eng not in self._hooked:
+                event.listen(eng, "handle_error", self._on_error(url))
+                self._hooked.add(eng)
+
+    def _engine(self, url: str):
+        from freshkeeper.database import get_engine
+
+        eng = get_engine(url)
+        self.watch(url, eng)
+        return eng
+
+    def _on_error(self, url: str):
+        def handler(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(url, str(context.original_exception))
+
+        return handler
+
+    def mark_down(self, url: str, reason: str) -> None:
+        h = self._health[url]
+        h.down_until = time.monotonic() + self.retry_seconds
+        h.failures += 1
+        h.last_error = reason
+        log.warning(
+            "Réplica %s écarté %.0fs : %s",
+            display_name(url),
+            self.retry_seconds,
+            reason,
+        )
+
+    def healthy(self, url: str) -> bool:
+        """État connu (sans I/O) : sondé par refresh(), écarté par mark_down()."""
+        return self._health[url].down_until <= time.monotonic()
+
+    def _due(self, url: str, now: float) -> bool:
+        h = self._health[url]
+        return h.down_until <= now and now - h.checked_at >= self.check_seconds
+
+    def probe_due(self) -> bool:
+        now = time.monotonic()
+        return any(self._due(u, now) for u in self.urls)
+
+    def refresh(self) -> None:
+        """Sonde les réplicas dont l'état a expiré (bloquant : hors boucle)."""
+        now = time.monotonic()
+        for url in self.urls:
+            if self._due(url, now):
+                self._probe(url)
+
+    def _probe(self, url: str) -> None:
+        h = self._health[url]
+        # une seule sonde à la fois par réplica ; les autres gardent l'état connu
+        if not h._lock.acquire(blocking=False):
+            return
+        try:
+            with self._engine(url).connect() as c:
+                h.lag_seconds = float(c.execute(text(LAG_SQL)).scalar() or 0)
+            h.checked_at = time.monotonic()
+            if h.lag_seconds > self.max_lag_seconds:
+                self.mark_down(url, f"retard {h.lag_seconds:.1f}s")
+            else:
+                h.last_error = None
+        except Exception as e:
+            self.mark_down(url, str(e))
+        finally:
+            h._lock.release()
+
+    def pick(self) -> Optional[str]:
+        """URL du prochain réplica sain, ou None (lire sur le primaire)."""
+        for _ in range(len(self.urls)):
+            url = self.urls[next(self._rr) % len(self.urls)]
+            if self.healthy(url):
+                self._health[url].reads += 1
+                return url
+        self.primary_fallbacks += 1
+        return None
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [
+                {
+                    "url": display_name(u),
+                    "healthy": h.down_until <= now,
+                    "lag_seconds": h.lag_seconds,
+                    "reads": h.reads,
+                    "failures": h.failures,
+                    "last_error": h.last_error,
+                }
+                for u, h in self._health.items()
+            ],
+        }
+
+
+_REPLICAS: Optional[ReplicaSet] = None
+_REPLICAS_LOCK = threading.Lock()
+
+
+def get_replicas() -> Optional[ReplicaSet]:
+    """ReplicaSet de DATABASE_READ_URLS (None si non configuré)."""
+    global _REPLICAS
+    urls = [u.strip() for u in os.getenv("DATABASE_READ_URLS", "").split(",")]
+    urls = [u for u in urls if u]
+    if not urls:
+        return None
+    if _REPLICAS is None or _REPLICAS.urls != urls:
+        with _REPLICAS_LOCK:
+            if _REPLICAS is None or _REPLICAS.urls != urls:
+                _REPLICAS = ReplicaSet(
+                    urls,
+                    check_seconds=_get_float("REPLICA_CHECK_SECONDS", 5.0),
+                    retry_seconds=_get_float("REPLICA_RETRY_SECONDS", 30.0),
+                    max_lag_seconds=_get_float("REPLICA_MAX_LAG_SECONDS", 10.0),
+                )
+    return _REPLICAS
+
+
+def read_url() -> Optional[str]:
+    """
+    URL où lire pour la requête en cours : réplica retenu pour cette requête
+    GET, sinon None (primaire).
+    """
+    scope = _read_scope.get()
+    if scope is None:
+        return None
+    if not scope.chosen:
+        replicas = get_replicas()
+        scope.url = replicas.pick() if replicas else None
+        scope.chosen = True
+    return scope.url
+
+
+def _ryw_seconds() -> float:
+    return _get_float("READ_YOUR_WRITES_SECONDS", 5.0)
+
+
+def _recent_write(headers: List) -> bool:
+    for name, value in headers:
+        if name == b"cookie":
+            cookie = SimpleCookie()
+            try:
+                cookie.load(value.decode("latin-1"))
+            except Exception:
+                continue
+            morsel = cookie.get(RYW_COOKIE)
+            if morsel is not None:
+                try:
+                    return float(morsel.value) > time.time()
+                except ValueError:
+                    return False
+    return False
+
+
+class ReadRoutingMiddleware:
+    """
+    Middleware ASGI : ouvre une portée de lecture pour les GET/HEAD (hors
+    fenêtre read-your-writes) et pose le cookie `fk_rw` après une écriture.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        replicas = get_replicas() if scope["type"] == "http" else None
+        if replicas is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] in SAFE_METHODS:
+            read = None if _recent_write(scope["headers"]) else _ReadScope()
+            if read is not None and replicas.probe_due():
+                await run_in_threadpool(replicas.refresh)
+            token = _read_scope.set(read)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _read_scope.reset(token)
+            return
+
+        window = _ryw_seconds()
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = (
+                    f"{RYW_COOKIE}={time.time() + window:.0f}; Max-Age={window:.0f}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"set-cookie", cookie.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
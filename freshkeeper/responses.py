@@ -0,0 +1,55 @@
+# freshkeeper/responses.py
+"""
+Sérialisation JSON commune : une seule passe, directement depuis les lignes SQL.
+
+orjson encode nativement date/datetime (ISO 8601, comme .isoformat()) et
+Decimal passe par `_default` (-> float), ce qui remplace les copies de
+`_plain` + `jsonable_encoder` + json.dumps. Sans orjson installé, repli sur
+json (stdlib) avec le même `_default`, donc même sortie.
+"""
+from __future__ import annotations
+
+import json
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+
+def _default(v: Any) -> Any:
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (date, datetime, time)):  # repli stdlib uniquement
+        return v.isoformat()
+    if isinstance(v, Mapping):  # RowMapping SQLAlchemy
+        return dict(v)
+    if hasattr(v, "model_dump"):  # modèle pydantic
+        return v.model_dump(mode="json")
+    raise TypeError(f"{type(v).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse sérialisée par `dumps` (orjson si disponible)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,12 +1,22 @@
 ﻿from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
+from freshkeeper.database import get_db, get_read_db
+from freshkeeper.jobs.change_bus import publish
+from freshkeeper.pagination import (
+    DATE_MAX,
+    Page,
+    PageParams,
+    SortKey,
+    fetch_page,
+    page_params,
+)
+from freshkeeper.streaming import maybe_stream
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
@@ -27,28 +37,28 @@ class AlertOut(BaseModel):
         from_attributes = True
 
 
+ALERT_COLUMNS = (
+    "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id"
+)
+# Même ordre que l'historique "due_date NULLS LAST, id"
+ALERT_KEYS = (SortKey(f"COALESCE(due_date, {DATE_MAX})", "date"), SortKey("id"))
+
+
 class AlertPatch(BaseModel):
     is_active: Optional[bool] = None
     message: Optional[str] = None
 
 
-# ---- DB session ----
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # ---- GET /alerts (liste + filtres) ----
-@router.get("", response_model=List[AlertOut])
+@router.get("", response_model=Union[List[AlertOut], Page[AlertOut]])
 def list_alerts(
+    request: Request,
     kind: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
     due_from: Optional[date] = Query(None),
     due_to: Optional[date] = Query(None),
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_read_db),
 ):
     conds = []
     params = {}
@@ -65,17 +75,21 @@ def list_alerts(
         conds.append("due_date <= :due_to")
         params["due_to"] = due_to
 
-    where = ("WHERE " + " AND ".join(conds)) if conds else ""
-    sql = text(
-        f"""
-        SELECT id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id
-        FROM alerts
-        {where}
-        ORDER BY due_date NULLS LAST, id
-    """
+    streamed = maybe_stream(
+        request, "alerts", ALERT_COLUMNS, [k.expr for k in ALERT_KEYS], conds, params
+    )
+    if streamed is not None:
+        return streamed
+    rows, meta = fetch_page(
+        db,
+        "alerts",
+        ALERT_COLUMNS,
+        ALERT_KEYS,
+        page,
+        conds,
+        params,
     )
-    rows = db.execute(sql, params).mappings().all()
-    return rows
+    return {"items": rows, **meta} if page.paginated else rows
 
 
 # ---- PATCH /alerts/{id} ----
@@ -104,7 +118,8 @@ def update_alert(alert_id: int, payload: AlertPatch, db: Session = Depends(get_d
         .mappings()
         .first()
     )
-
+    if row:
+        publish(db, "alerts", [alert_id])  # livré au commit
     db.commit()
     if not row:
         raise HTTPException(status_code=404, detail="Alert not found")
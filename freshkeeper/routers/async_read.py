@@ -0,0 +1,146 @@
+# freshkeeper/routers/async_read.py
+"""
+Variantes `async def` des routes de lecture chaudes : /products (liste et
+détail), /api/lots, /api/alerts, /products/suggest. Celle de
+/dashboard/summary est à côté de la route sync (routers/dashboard.py,
+async_router), montée au même moment par main.py.
+
+Les handlers `def` tournent dans le threadpool Starlette (40 threads par
+défaut) et gardent leur thread pendant tout l'aller-retour SQL : au-delà de
+40 requêtes simultanées, les suivantes font la queue et la latence s'effondre.
+Ici les requêtes passent par l'engine async (freshkeeper.database
+.get_async_engine) : la boucle d'événements reste libre pendant les I/O.
+
+Le SQL n'est pas dupliqué : fetch_page, table_versions, _query_all... sont
+exécutés sur la connexion async via run_sync. Les réponses sont identiques à
+celles des routes sync (ETag/304, pagination, NDJSON).
+
+Monté en premier par main.py si ASYNC_DB_ENABLED=1 (exige sqlalchemy[asyncio]) ;
+sinon les routes sync historiques servent les mêmes chemins.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from freshkeeper.api.suggest import _suggest
+from freshkeeper.conditional import conditional_get_async
+from freshkeeper.database import run_sync
+from freshkeeper.pagination import (
+    ID_KEYS,
+    PageParams,
+    fetch_page,
+    list_response,
+    page_params,
+)
+from freshkeeper.responses import FastJSONResponse
+from freshkeeper.routers.products import (
+    PRODUCT_COLUMNS,
+    _filters,
+    _query_all,
+    _query_one,
+)
+from freshkeeper.streaming import maybe_stream
+
+router = APIRouter()
+
+LOT_COLUMNS = "id, product_id, quantity, unit, expiry_date, storage_location_id"
+ALERT_COLUMNS = (
+    "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id"
+)
+
+
+async def _list(
+    request: Request,
+    table: str,
+    columns: str,
+    page: PageParams,
+    query,
+    where=(),
+    params=None,
+):
+    """Trame commune des listes : 304, NDJSON, puis `query(conn)` en run_sync."""
+    cond = await conditional_get_async(request, table)
+    if cond.not_modified:
+        return cond.not_modified_response()
+    # flux NDJSON : curseur serveur sync, itéré hors de la boucle par Starlette
+    streamed = maybe_stream(request, table, columns, ["id"], where, params)
+    if streamed is not None:
+        return cond.apply(streamed)
+    try:
+        items, meta = await run_sync(query)
+    except HTTPException:
+        raise
+    except Exception:
+        # liste vide de repli : sans ETag, pour ne pas la figer côté client
+        return list_response([], {}, page)
+    return cond.apply(list_response(items, meta, page))
+
+
+# ---- Products ----
+async def list_products(
+    request: Request,
+    search: Optional[str] = None,
+    location: Optional[str] = None,
+    page: PageParams = Depends(page_params),
+):
+    return await _list(
+        request,
+        "products",
+        PRODUCT_COLUMNS,
+        page,
+        lambda c: _query_all(c, search, location, page),
+        *_filters(search, location),
+    )
+
+
+async def get_product(product_id: int):
+    try:
+        obj = await run_sync(_query_one, product_id)
+    except Exception:
+        obj = None
+    if not obj:
+        raise HTTPException(status_code=404, detail="Produit introuvable.")
+    return FastJSONResponse(obj, status_code=200)
+
+
+async def suggest_product(
+    name: str = Query(
+        ..., min_length=1, description="Nom libre saisi par l'utilisateur"
+    ),
+    location: str = Query("pantry", pattern="^(pantry|fridge|freezer)$"),
+):
+    return await run_sync(_suggest, name, location)
+
+
+# ---- Lots / Alerts (listes /api/* de main.py) ----
+async def list_lots(request: Request, page: PageParams = Depends(page_params)):
+    return await _list(
+        request,
+        "lots",
+        LOT_COLUMNS,
+        page,
+        lambda c: fetch_page(c, "lots", LOT_COLUMNS, ID_KEYS, page),
+    )
+
+
+async def list_alerts(request: Request, page: PageParams = Depends(page_params)):
+    return await _list(
+        request,
+        "alerts",
+        ALERT_COLUMNS,
+        page,
+        lambda c: fetch_page(c, "alerts", ALERT_COLUMNS, ID_KEYS, page),
+    )
+
+
+# Mêmes chemins que les routes sync (formes /api/v1, « / » final... ramenées à
+# celles-ci par freshkeeper/routing.py) ; suggest avant /products/{product_id}
+router.add_api_route(
+    "/products/suggest", suggest_product, methods=["GET"], tags=["suggest"]
+)
+router.add_api_route("/products", list_products, methods=["GET"], tags=["products"])
+router.add_api_route(
+    "/products/{product_id}", get_product, methods=["GET"], tags=["products"]
+)
+router.add_api_route("/api/lots", list_lots, methods=["GET"], tags=["lots"])
+router.add_api_route("/api/alerts", list_alerts, methods=["GET"], tags=["alerts"])
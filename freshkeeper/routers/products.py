@@ -1,62 +1,83 @@
-﻿from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import create_engine, text
-from decimal import Decimal
-from datetime import date, datetime
+﻿from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import text
+from typing import Optional
 import os
 
+from freshkeeper.conditional import conditional_get
+from freshkeeper.database import get_read_engine
+from freshkeeper.pagination import ID_KEYS, PageParams, fetch_page, list_response, page_params
+from freshkeeper.responses import FastJSONResponse
+from freshkeeper.streaming import maybe_stream
+
 router = APIRouter()
 
-def _plain(v):
-    if isinstance(v, Decimal):
-        try:
-            return float(v)
-        except Exception:
-            return str(v)
-    if isinstance(v, (date, datetime)):
-        return v.isoformat()
-    return v
+PRODUCT_COLUMNS = "id, name, category, unit, quantity, expiry_date"
 
-def _fetch_all():
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        return []
-    eng = create_engine(url, future=True)
+def _filters(search: Optional[str] = None, location: Optional[str] = None):
+    where, params = [], {}
+    if search:
+        where.append("lower(name) LIKE :search")
+        params["search"] = f"%{search.strip().lower()}%"
+    if location:
+        where.append("location = :location")
+        params["location"] = location
+    return where, params
+
+def _query_all(c, search: Optional[str] = None, location: Optional[str] = None, page: Optional[PageParams] = None):
+    # partagé avec la variante async (routers/async_read.py, via run_sync)
+    where, params = _filters(search, location)
+    return fetch_page(
+        c, "products", PRODUCT_COLUMNS,
+        ID_KEYS, page or PageParams(), where, params,
+    )
+
+def _query_one(c, pid: int):
     sql = text("""
         SELECT id, name, category, unit, quantity, expiry_date
         FROM products
-        ORDER BY id
+        WHERE id = :pid
     """)
-    rows = []
+    r = c.execute(sql, {"pid": pid}).mappings().first()
+    return dict(r) if r else None
+
+def _fetch_all(search: Optional[str] = None, location: Optional[str] = None, page: Optional[PageParams] = None):
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        return [], {}
+    eng = get_read_engine(url)
     with eng.connect() as c:
-        for r in c.execute(sql).mappings():
-            rows.append({k: _plain(v) for k, v in r.items()})
-    return rows
+        return _query_all(c, search, location, page)
 
 def _fetch_one(pid: int):
     url = os.getenv("DATABASE_URL")
     if not url:
         return None
-    eng = create_engine(url, future=True)
-    sql = text("""
-        SELECT id, name, category, unit, quantity, expiry_date
-        FROM products
-        WHERE id = :pid
-    """)
+    eng = get_read_engine(url)
     with eng.connect() as c:
-        r = c.execute(sql, {"pid": pid}).mappings().first()
-        return {k: _plain(v) for k, v in (r or {}).items()} if r else None
+        return _query_one(c, pid)
 
-# ---- Liste : /products ET /products/ ----
-@router.get("/products", include_in_schema=False)
-@router.get("/products/", tags=["products"])
-def list_products():
+# ---- Liste : /products (et /products/, /api/v1/products... cf. freshkeeper/routing.py) ----
+@router.get("/products", tags=["products"])
+def list_products(
+    request: Request,
+    search: Optional[str] = None,
+    location: Optional[str] = None,
+    page: PageParams = Depends(page_params),
+):
+    cond = conditional_get(request, "products")
+    if cond.not_modified:
+        return cond.not_modified_response()
+    streamed = maybe_stream(request, "products", PRODUCT_COLUMNS, ["id"], *_filters(search, location))
+    if streamed is not None:
+        return cond.apply(streamed)
     try:
-        items = _fetch_all()
+        items, meta = _fetch_all(search, location, page)
+    except HTTPException:
+        raise
     except Exception:
-        items = []
-    return JSONResponse(content=jsonable_encoder(items or []), status_code=200)
+        # liste vide de repli : sans ETag, pour ne pas la figer côté client
+        return list_response([], {}, page)
+    return cond.apply(list_response(items, meta, page))
 
 # ---- Détail : /products/{id} ----
 @router.get("/products/{product_id}", tags=["products"])
@@ -67,4 +88,4 @@ def get_product(product_id: int):
         obj = None
     if not obj:
         raise HTTPException(status_code=404, detail="Produit introuvable.")
-    return JSONResponse(content=jsonable_encoder(obj), status_code=200)
+    return FastJSONResponse(obj, status_code=200)
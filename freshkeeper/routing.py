@@ -0,0 +1,125 @@
+# freshkeeper/routing.py
+"""
+Normalisation des chemins avant le routage (une seule table de routes).
+
+Les clients mobiles appellent la même ressource sous plusieurs formes :
+/api/v1/products/, /api/products, /products, /api/storage_locations... Au
+lieu d'enregistrer chaque handler sous chacune d'elles (Starlette teste les
+routes une à une, expression régulière par expression régulière), le
+middleware réécrit scope["path"] vers la forme canonique :
+
+  1. /api/v1/...   -> /api/...
+  2. « / » final retiré (sauf pour « / »)
+  3. segments à « _ » -> « - » quand la forme à tirets existe dans la table
+     (/storage_locations -> /storage-locations)
+  4. alias historiques (ALIASES : /api/products/list, /{id}/details...)
+  5. /api/... -> /... sauf si une route /api/... répond à cette méthode :
+     quelques handlers /api ont leur propre contrat (GET /api/alerts, POST
+     /api/products...) et gardent leur chemin.
+
+Les routes sont donc déclarées une fois : à la racine, ou sous /api quand le
+contrat /api diffère. La table des routes /api et des segments à tirets est
+calculée à la première requête (routes incluses via include_router comprises).
+"""
+from __future__ import annotations
+
+import re
+from typing import FrozenSet, Iterator, List, Optional, Pattern, Tuple
+
+API_PREFIX = "/api"
+VERSION_PREFIX = "/api/v1"
+
+# Chemins historiques -> forme canonique (appliqué après les étapes 1 à 3)
+ALIASES = {
+    "/api/storage": "/api/storage-locations",
+    "/api/categories/all": "/api/categories",
+    "/api/products/list": "/api/products",
+    "/api/product": "/api/products/create",
+}
+_DETAILS = re.compile(r"^(/api/products/[^/]+)/details$")
+
+_Matcher = Tuple[Pattern, Optional[FrozenSet[str]]]
+
+
+def _route_entries(routes) -> Iterator[Tuple[str, Pattern, Optional[FrozenSet[str]]]]:
+    """(gabarit, regex, méthodes) de chaque route, routeurs inclus compris."""
+    for route in routes:
+        contexts = getattr(route, "effective_route_contexts", None)
+        if contexts is not None:  # routeur inclus (FastAPI >= 0.140)
+            for ctx in contexts():
+                yield ctx.path, ctx.path_regex, _methods(ctx)
+            continue
+        path = getattr(route, "path", None)
+        regex = getattr(route, "path_regex", None)
+        if path is None or regex is None:
+            continue
+        yield path, regex, _methods(route)
+
+
+def _methods(route) -> Optional[FrozenSet[str]]:
+    methods = getattr(route, "methods", None)
+    return frozenset(methods) if methods else None
+
+
+class RouteTable:
+    """Ce que la normalisation doit savoir de la table : routes /api, segments à tirets."""
+
+    def __init__(self, routes):
+        self.api: List[_Matcher] = []
+        dashed = set()
+        for path, regex, methods in _route_entries(routes):
+            if path == API_PREFIX or path.startswith(API_PREFIX + "/"):
+                self.api.append((regex, methods))
+            for segment in path.split("/"):
+                if "-" in segment and "{" not in segment:
+                    dashed.add(segment)
+        self.underscored = {s.replace("-", "_"): s for s in dashed}
+
+    def serves_api(self, method: str, path: str) -> bool:
+        for regex, methods in self.api:
+            if regex.match(path) and (methods is None or method in methods):
+                return True
+        return False
+
+
+def normalize_path(path: str, method: str, table: RouteTable) -> str:
+    """Forme canonique de `path` (cf. docstring du module)."""
+    if path == VERSION_PREFIX or path.startswith(VERSION_PREFIX + "/"):
+        path = API_PREFIX + path[len(VERSION_PREFIX) :]
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+    if "_" in path and table.underscored:
+        path = "/".join(table.underscored.get(s, s) for s in path.split("/"))
+    path = ALIASES.get(path, path)
+    details = _DETAILS.match(path)
+    if details:
+        path = details.group(1)
+    if path == API_PREFIX or path.startswith(API_PREFIX + "/"):
+        if not table.serves_api(method, path):
+            path = path[len(API_PREFIX) :] or "/"
+    return path
+
+
+class PathNormalizeMiddleware:
+    """Middleware ASGI : réécrit scope["path"] vers la forme canonique avant le routage."""
+
+    def __init__(self, app):
+        self.app = app
+        self._table: Optional[RouteTable] = None
+
+    def table(self, scope) -> RouteTable:
+        if self._table is None:
+            self._table = RouteTable(scope["app"].router.routes)
+        return self._table
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            path = scope["path"]
+            canonical = normalize_path(
+                path, scope.get("method", "GET"), self.table(scope)
+            )
+            if canonical != path:
+                # en place : les middlewares externes relisent scope["route"]
+                scope["path"] = canonical
+                scope["fk_original_path"] = path
+        await self.app(scope, receive, send)
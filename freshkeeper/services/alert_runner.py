@@ -2,8 +2,9 @@
 from __future__ import annotations
 
 import logging
+import os
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -15,8 +16,62 @@ ALERT_OUT_OF_STOCK = "OUT_OF_STOCK"
 # Fenêtre "bientôt expiré"
 EXPIRE_SOON_DAYS = 3
 
+# Mode de scan : "set" (quelques requêtes ensemblistes) ou "loop" (historique, par produit)
+SCAN_MODE_SET = "set"
+SCAN_MODE_LOOP = "loop"
 
-def run_scan() -> Dict[str, Any]:
+# Nom de l'état persisté dans scan_state (scan incrémental)
+SCAN_STATE_NAME = "alert_runner"
+
+
+def _candidates_sql(scope: str = "") -> str:
+    """
+    Alertes attendues (mêmes règles que la boucle historique), limitées par `scope`
+    (ex: "AND p.id IN (...)") ; scope vide = tous les produits.
+    int(quantity) <= 0 côté Python <=> trunc(quantity) <= 0 côté SQL.
+    """
+    return f"""
+    SELECT p.id AS pid, 'OUT_OF_STOCK' AS kind, CAST(:today AS date) AS due_date
+      FROM products p
+     WHERE p.quantity IS NOT NULL AND trunc(p.quantity) <= 0 {scope}
+    UNION ALL
+    SELECT p.id, 'EXPIRED', p.expiry_date
+      FROM products p
+     WHERE p.expiry_date <= :today {scope}
+    UNION ALL
+    SELECT p.id, 'SOON', p.expiry_date
+      FROM products p
+     WHERE p.expiry_date > :today AND p.expiry_date <= :soon {scope}
+"""
+
+
+def _dirty_products_sql(rollover: bool) -> str:
+    """
+    Produits à réévaluer : modifiés depuis le watermark (produit ou un de ses lots).
+    Au changement de jour, on ajoute la fenêtre de dates qui vient de franchir
+    EXPIRED / SOON et les ruptures (OUT_OF_STOCK porte la date du jour).
+    """
+    sql = """
+        SELECT p.id FROM products p WHERE p.updated_at > :since
+        UNION
+        SELECT l.product_id FROM lots l WHERE l.updated_at > :since
+    """
+    if rollover:
+        sql += """
+        UNION
+        SELECT p.id FROM products p
+         WHERE (p.expiry_date > :last_day AND p.expiry_date <= :today)
+            OR (p.expiry_date > :last_soon AND p.expiry_date <= :soon)
+            OR p.quantity < 1
+        """
+    return sql
+
+
+def run_scan(
+    mode: Optional[str] = None,
+    incremental: Optional[bool] = None,
+    product_ids: Optional[Iterable[int]] = None,
+) -> Dict[str, Any]:
     """
     Scan les produits et UPSERT des alertes en base.
 
@@ -25,6 +80,17 @@ def run_scan() -> Dict[str, Any]:
       - EXPIRED      : expiry_date <= today     -> due_date = expiry_date
       - SOON         : today < expiry_date <= today + EXPIRE_SOON_DAYS -> due_date = expiry_date
 
+    `mode` (ou env ALERT_SCAN_MODE) : "set" par défaut sur PostgreSQL,
+    "loop" pour la boucle historique produit par produit.
+
+    `incremental` (ou env ALERT_SCAN_INCREMENTAL, actif par défaut) : en mode "set",
+    ne réévalue que les produits/lots dont updated_at a bougé depuis le dernier
+    scan (table scan_state), plus une passe de dates au changement de jour.
+    Sans scan_state (patch_scan_watermark.sql non appliqué) : scan complet.
+
+    `product_ids` : scan ciblé sur ces produits uniquement (réveils du timer
+    d'expiration) ; ne lit ni n'avance le watermark.
+
     Retourne un récap dict: {"status","created","updated","errors","checked"}.
     """
     try:
@@ -49,113 +115,268 @@ def run_scan() -> Dict[str, Any]:
     today_utc: date = datetime.utcnow().date()
     soon_threshold: date = today_utc + timedelta(days=EXPIRE_SOON_DAYS)
 
+    mode = (mode or os.getenv("ALERT_SCAN_MODE", SCAN_MODE_SET)).strip().lower()
+    if incremental is None:
+        incremental = os.getenv("ALERT_SCAN_INCREMENTAL", "1").strip().lower() in (
+            "1",
+            "true",
+            "yes",
+            "y",
+            "on",
+        )
+
+    with SessionLocal() as db:
+        if mode == SCAN_MODE_SET and db.get_bind().dialect.name == "postgresql":
+            return _scan_set_based(
+                db, today_utc, soon_threshold, incremental, product_ids
+            )
+        return _scan_loop(db, today_utc, soon_threshold, product_ids)
+
+
+def _scan_set_based(
+    db,
+    today_utc: date,
+    soon_threshold: date,
+    incremental: bool = False,
+    product_ids: Optional[Iterable[int]] = None,
+) -> Dict[str, Any]:
+    """
+    Même résultat que la boucle, en 2 requêtes quel que soit le nombre de produits :
+    un INSERT ... SELECT ... ON CONFLICT DO UPDATE puis une désactivation en masse.
+    En incrémental, les deux requêtes sont limitées aux produits "sales".
+    """
+    from sqlalchemy import text
+    from sqlalchemy.exc import SQLAlchemyError
+
+    from freshkeeper.services.scan_state import load_state, next_watermark, save_state
+
+    params: Dict[str, Any] = {"today": today_utc, "soon": soon_threshold}
+
+    state = None
+    if incremental and product_ids is None:
+        state = load_state(db, SCAN_STATE_NAME)
+    new_watermark = next_watermark(db) if state is not None else None
+
+    scope = ""
+    checked_sql = "SELECT count(*) FROM products"
+    if product_ids is not None:
+        scope = "AND p.id = ANY(:pids)"
+        checked_sql = "SELECT count(*) FROM products WHERE id = ANY(:pids)"
+        params["pids"] = sorted(set(product_ids))
+    elif state is not None and state.watermark and state.rollover_date:
+        rollover = state.rollover_date < today_utc
+        dirty = _dirty_products_sql(rollover)
+        scope = f"AND p.id IN ({dirty})"
+        checked_sql = f"SELECT count(*) FROM ({dirty}) d"
+        params["since"] = state.watermark
+        if rollover:
+            params["last_day"] = state.rollover_date
+            params["last_soon"] = state.rollover_date + timedelta(days=EXPIRE_SOON_DAYS)
+
+    # xmax = 0 => ligne insérée ; sinon ligne existante mise à jour par ON CONFLICT
+    upsert_sql = text(
+        f"""
+        WITH candidates AS ({_candidates_sql(scope)}),
+        upserted AS (
+            INSERT INTO alerts (product_id, kind, due_date, message, is_active)
+            SELECT pid, kind, due_date,
+                   kind || ' for product #' || pid || ' on '
+                        || to_char(due_date, 'YYYY-MM-DD'),
+                   TRUE
+              FROM candidates
+            ON CONFLICT (product_id, kind, due_date) DO UPDATE
+               SET message    = EXCLUDED.message,
+                   is_active  = TRUE,
+                   updated_at = now()
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT ({checked_sql})                                    AS checked,
+               (SELECT count(*) FROM upserted WHERE inserted)     AS created,
+               (SELECT count(*) FROM upserted WHERE NOT inserted) AS updated
+    """
+    )
+
+    # Désactive les anciennes versions du même kind dont la due_date a changé
+    deactivate_sql = text(
+        f"""
+        UPDATE alerts a
+           SET is_active  = FALSE,
+               updated_at = now()
+          FROM ({_candidates_sql(scope)}) c
+         WHERE a.product_id = c.pid
+           AND a.kind       = c.kind
+           AND a.due_date  <> c.due_date
+           AND a.is_active  = TRUE
+    """
+    )
+
+    try:
+        row = db.execute(upsert_sql, params).one()
+        db.execute(deactivate_sql, params)
+        if new_watermark is not None:
+            save_state(db, SCAN_STATE_NAME, new_watermark, today_utc)
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        logger.exception("Scan ensembliste échoué — rollback effectué")
+        return {
+            "status": "error",
+            "created": 0,
+            "updated": 0,
+            "errors": 1,
+            "checked": 0,
+        }
+
+    summary = {
+        "status": "ok",
+        "created": int(row.created),
+        "updated": int(row.updated),
+        "errors": 0,
+        "checked": int(row.checked),
+    }
+    logger.info(
+        "SCAN (set%s) today=%s soon<=%s -> %s",
+        (", targeted" if product_ids is not None else ", incremental" if scope else ""),
+        today_utc,
+        soon_threshold,
+        summary,
+    )
+    return summary
+
+
+def _scan_loop(
+    db,
+    today_utc: date,
+    soon_threshold: date,
+    product_ids: Optional[Iterable[int]] = None,
+) -> Dict[str, Any]:
+    """Boucle historique : jusqu'à 3 requêtes par alerte (référence de parité)."""
+    from sqlalchemy import text
+    from sqlalchemy.exc import SQLAlchemyError
+
     created = 0
     updated = 0
     errors = 0
     checked = 0
 
+    try:
+        # Récupération minimale (évite les soucis d'ORM)
+        rows = db.execute(
+            text("SELECT id, quantity, expiry_date FROM products ORDER BY id")
+        ).all()
+        wanted = set(product_ids) if product_ids is not None else None
+        products: List[Tuple[int, Optional[int], Optional[date]]] = [
+            (r[0], r[1], r[2]) for r in rows if wanted is None or r[0] in wanted
+        ]
+    except SQLAlchemyError as e:
+        logger.exception("Échec du chargement des produits: %s", e)
+        return {
+            "status": "error",
+            "errors": 1,
+            "checked": 0,
+            "created": 0,
+            "updated": 0,
+        }
+
     logger.info(
-        "alert-runner v4 (full-raw-sql) chargé depuis: %s",
-        __file__,
+        "SCAN start: %s products (today=%s, soon<=%s)",
+        len(products),
+        today_utc,
+        soon_threshold,
     )
 
-    with SessionLocal() as db:
-        try:
-            # Récupération minimale (évite les soucis d'ORM)
-            rows = db.execute(
-                text("SELECT id, quantity, expiry_date FROM products ORDER BY id")
-            ).all()
-            products: List[Tuple[int, Optional[int], Optional[date]]] = [
-                (r[0], r[1], r[2]) for r in rows
-            ]
-        except SQLAlchemyError as e:
-            logger.exception("Échec du chargement des produits: %s", e)
-            return {
-                "status": "error",
-                "errors": 1,
-                "checked": 0,
-                "created": 0,
-                "updated": 0,
-            }
-
-        logger.info(
-            "SCAN start: %s products (today=%s, soon<=%s)",
-            len(products),
-            today_utc,
-            soon_threshold,
-        )
-
-        # SQL préparés
-        insert_sql = text(
-            """
-            INSERT INTO alerts (product_id, kind, due_date, message, is_active)
-            VALUES (:pid, :kind, :due_date, :message, TRUE)
-            ON CONFLICT (product_id, kind, due_date) DO NOTHING
-            RETURNING id;
+    # SQL préparés
+    insert_sql = text(
         """
-        )
+        INSERT INTO alerts (product_id, kind, due_date, message, is_active)
+        VALUES (:pid, :kind, :due_date, :message, TRUE)
+        ON CONFLICT (product_id, kind, due_date) DO NOTHING
+        RETURNING id;
+    """
+    )
 
-        update_sql = text(
-            """
-            UPDATE alerts
-               SET message    = :message,
-                   is_active  = TRUE,
-                   updated_at = now()
-             WHERE product_id = :pid
-               AND kind       = :kind
-               AND due_date   = :due_date
-            RETURNING id;
+    update_sql = text(
         """
-        )
+        UPDATE alerts
+           SET message    = :message,
+               is_active  = TRUE,
+               updated_at = now()
+         WHERE product_id = :pid
+           AND kind       = :kind
+           AND due_date   = :due_date
+        RETURNING id;
+    """
+    )
 
-        # Optionnel : on désactive d'anciennes versions du même "kind" si la due_date a changé
-        # (utile si une date d'expiration évolue)
-        deactivate_others_sql = text(
-            """
-            UPDATE alerts
-               SET is_active  = FALSE,
-                   updated_at = now()
-             WHERE product_id = :pid
-               AND kind       = :kind
-               AND due_date  <> :due_date
-               AND is_active  = TRUE;
+    # Optionnel : on désactive d'anciennes versions du même "kind" si la due_date a changé
+    # (utile si une date d'expiration évolue)
+    deactivate_others_sql = text(
         """
-        )
+        UPDATE alerts
+           SET is_active  = FALSE,
+               updated_at = now()
+         WHERE product_id = :pid
+           AND kind       = :kind
+           AND due_date  <> :due_date
+           AND is_active  = TRUE;
+    """
+    )
 
-        for pid, qty, exp in products:
-            checked += 1
-            # Normalisation types
-            try:
-                qty_val = int(qty) if qty is not None else None
-            except Exception:
-                qty_val = None
+    for pid, qty, exp in products:
+        checked += 1
+        # Normalisation types
+        try:
+            qty_val = int(qty) if qty is not None else None
+        except Exception:
+            qty_val = None
 
-            exp_val: Optional[date] = exp  # déjà un date en SQL
+        exp_val: Optional[date] = exp  # déjà un date en SQL
 
-            alerts: List[Tuple[str, date]] = []
+        alerts: List[Tuple[str, date]] = []
 
-            # OUT_OF_STOCK
-            if qty_val is not None and qty_val <= 0:
-                alerts.append((ALERT_OUT_OF_STOCK, today_utc))
+        # OUT_OF_STOCK
+        if qty_val is not None and qty_val <= 0:
+            alerts.append((ALERT_OUT_OF_STOCK, today_utc))
 
-            # EXPIRED / SOON
-            if exp_val is not None:
-                if exp_val <= today_utc:
-                    alerts.append((ALERT_EXPIRED, exp_val))
-                elif today_utc < exp_val <= soon_threshold:
-                    alerts.append((ALERT_SOON, exp_val))
+        # EXPIRED / SOON
+        if exp_val is not None:
+            if exp_val <= today_utc:
+                alerts.append((ALERT_EXPIRED, exp_val))
+            elif today_utc < exp_val <= soon_threshold:
+                alerts.append((ALERT_SOON, exp_val))
 
-            logger.info(
-                "SCAN p_id=%s qty=%s exp=%s -> alerts=%s", pid, qty_val, exp_val, alerts
-            )
+        logger.debug(
+            "SCAN p_id=%s qty=%s exp=%s -> alerts=%s", pid, qty_val, exp_val, alerts
+        )
+
+        for kind, due_date in alerts:
+            try:
+                message = f"{kind} for product #{pid} on {due_date}"
 
-            for kind, due_date in alerts:
-                try:
-                    message = f"{kind} for product #{pid} on {due_date}"
+                # 1) tentative INSERT
+                new_id = db.execute(
+                    insert_sql,
+                    {
+                        "pid": pid,
+                        "kind": kind,
+                        "due_date": due_date,
+                        "message": message,
+                    },
+                ).scalar_one_or_none()
 
-                    # 1) tentative INSERT
-                    new_id = db.execute(
-                        insert_sql,
+                if new_id is not None:
+                    created += 1
+                    logger.debug(
+                        "CREATED alert product_id=%s kind=%s due_date=%s (id=%s)",
+                        pid,
+                        kind,
+                        due_date,
+                        new_id,
+                    )
+                else:
+                    # 2) sinon UPDATE
+                    upd_id = db.execute(
+                        update_sql,
                         {
                             "pid": pid,
                             "kind": kind,
@@ -164,73 +385,52 @@ def run_scan() -> Dict[str, Any]:
                         },
                     ).scalar_one_or_none()
 
-                    if new_id is not None:
-                        created += 1
-                        logger.info(
-                            "CREATED alert product_id=%s kind=%s due_date=%s (id=%s)",
+                    if upd_id is not None:
+                        updated += 1
+                        logger.debug(
+                            "UPDATED alert product_id=%s kind=%s due_date=%s (id=%s)",
                             pid,
                             kind,
                             due_date,
-                            new_id,
+                            upd_id,
                         )
                     else:
-                        # 2) sinon UPDATE
-                        upd_id = db.execute(
-                            update_sql,
-                            {
-                                "pid": pid,
-                                "kind": kind,
-                                "due_date": due_date,
-                                "message": message,
-                            },
-                        ).scalar_one_or_none()
-
-                        if upd_id is not None:
-                            updated += 1
-                            logger.info(
-                                "UPDATED alert product_id=%s kind=%s due_date=%s (id=%s)",
-                                pid,
-                                kind,
-                                due_date,
-                                upd_id,
-                            )
-                        else:
-                            # Cas improbable si quelqu’un a modifié la contrainte pendant la course
-                            errors += 1
-                            logger.error(
-                                "UPSERT manqué product_id=%s kind=%s due_date=%s (aucun row affecté)",
-                                pid,
-                                kind,
-                                due_date,
-                            )
-
-                    # 3) (optionnel) désactiver les autres alertes actives du même kind pour ce produit
-                    db.execute(
-                        deactivate_others_sql,
-                        {"pid": pid, "kind": kind, "due_date": due_date},
-                    )
+                        # Cas improbable si quelqu’un a modifié la contrainte pendant la course
+                        errors += 1
+                        logger.error(
+                            "UPSERT manqué product_id=%s kind=%s due_date=%s (aucun row affecté)",
+                            pid,
+                            kind,
+                            due_date,
+                        )
 
-                except SQLAlchemyError:
-                    errors += 1
-                    logger.exception(
-                        "Erreur sur alert UPSERT product_id=%s kind=%s due_date=%s",
-                        pid,
-                        kind,
-                        due_date,
-                    )
+                # 3) (optionnel) désactiver les autres alertes actives du même kind pour ce produit
+                db.execute(
+                    deactivate_others_sql,
+                    {"pid": pid, "kind": kind, "due_date": due_date},
+                )
 
-        try:
-            db.commit()
-        except SQLAlchemyError:
-            db.rollback()
-            logger.exception("Commit échoué — rollback effectué")
-            return {
-                "status": "error",
-                "errors": errors + 1,
-                "checked": checked,
-                "created": created,
-                "updated": updated,
-            }
+            except SQLAlchemyError:
+                errors += 1
+                logger.exception(
+                    "Erreur sur alert UPSERT product_id=%s kind=%s due_date=%s",
+                    pid,
+                    kind,
+                    due_date,
+                )
+
+    try:
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        logger.exception("Commit échoué — rollback effectué")
+        return {
+            "status": "error",
+            "errors": errors + 1,
+            "checked": checked,
+            "created": created,
+            "updated": updated,
+        }
 
     status = "ok" if errors == 0 else "partial"
     return {
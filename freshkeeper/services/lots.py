@@ -0,0 +1,120 @@
+# freshkeeper/services/lots.py
+"""
+Écriture des lots : un seul upsert partagé par tous les chemins d'écriture
+(POST /lots de main.py, routers/lots.py).
+
+Une seule instruction INSERT ... ON CONFLICT DO UPDATE ... RETURNING : la
+quantité est ajoutée à celle du lot existant (même produit, DLC, emplacement et
+unité normalisée) et la ligne finale revient dans le même aller-retour, sans
+UPDATE préalable ni SELECT de relecture. Deux requêtes concurrentes sur la même
+clé se sérialisent sur l'index unique : aucune quantité perdue, aucun doublon.
+
+upsert_lots() applique un lot de lignes (POST /lots/bulk) en une instruction :
+lignes passées en tableaux (unnest), regroupées par clé (deux lignes de même
+clé dans un envoi ne peuvent pas toucher deux fois la même ligne via ON
+CONFLICT), puis résultat rendu ligne à ligne dans l'ordre d'entrée.
+
+Lots sans DLC : l'index uq_lots_key doit être NULLS NOT DISTINCT
+(scripts/sql/patch_lots_upsert_key.sql, PostgreSQL >= 15), sinon deux
+expiry_date NULL ne sont jamais en conflit et chaque POST crée un lot.
+"""
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import RowMapping
+
+LOT_COLUMNS = "id, product_id, quantity, unit, expiry_date, storage_location_id"
+
+# unit_norm = COALESCE(unit, '') (colonne générée) : unité NULL et '' fusionnent
+UPSERT_LOT_SQL = text(
+    f"""
+    INSERT INTO lots (product_id, quantity, unit, expiry_date, storage_location_id)
+    VALUES (:product_id, :quantity, :unit, :expiry_date, :storage_location_id)
+    ON CONFLICT (product_id, expiry_date, storage_location_id, unit_norm)
+    DO UPDATE SET quantity = lots.quantity + EXCLUDED.quantity,
+                  updated_at = now()
+    RETURNING {LOT_COLUMNS}
+    """
+)
+
+
+def upsert_lot(
+    conn,
+    *,
+    product_id: int,
+    quantity: Union[Decimal, float],
+    storage_location_id: int,
+    unit: Optional[str] = None,
+    expiry_date: Optional[Union[date, str]] = None,
+) -> RowMapping:
+    """
+    Ajoute `quantity` au lot de cette clé (créé au besoin) ; renvoie la ligne finale.
+    `conn` : Connection ou Session, dans la transaction de l'appelant.
+    """
+    params = {
+        "product_id": product_id,
+        "quantity": quantity,
+        "unit": (unit or "").strip() or None,
+        "expiry_date": expiry_date or None,
+        "storage_location_id": storage_location_id,
+    }
+    return conn.execute(UPSERT_LOT_SQL, params).mappings().one()
+
+
+UPSERT_LOTS_SQL = text(
+    f"""
+    WITH input AS (
+        SELECT *
+          FROM unnest(
+                 CAST(:product_id AS integer[]),
+                 CAST(:quantity AS numeric[]),
+                 CAST(:unit AS text[]),
+                 CAST(:expiry_date AS date[]),
+                 CAST(:storage_location_id AS integer[])
+               ) WITH ORDINALITY
+            AS t(product_id, quantity, unit, expiry_date, storage_location_id, n)
+    ),
+    merged AS (
+        INSERT INTO lots (product_id, quantity, unit, expiry_date, storage_location_id)
+        SELECT product_id, sum(quantity), min(unit), expiry_date, storage_location_id
+          FROM input
+         GROUP BY product_id, expiry_date, storage_location_id, COALESCE(unit, '')
+        ON CONFLICT (product_id, expiry_date, storage_location_id, unit_norm)
+        DO UPDATE SET quantity = lots.quantity + EXCLUDED.quantity,
+                      updated_at = now()
+        RETURNING {LOT_COLUMNS}, unit_norm, (xmax = 0) AS created
+    )
+    SELECT m.id, m.product_id, m.quantity, m.unit, m.expiry_date,
+           m.storage_location_id, m.created
+      FROM input i
+      JOIN merged m
+        ON m.product_id = i.product_id
+       AND m.storage_location_id = i.storage_location_id
+       AND m.expiry_date IS NOT DISTINCT FROM i.expiry_date
+       AND m.unit_norm = COALESCE(i.unit, '')
+     ORDER BY i.n
+    """
+)
+
+_BULK_FIELDS = ("product_id", "quantity", "unit", "expiry_date", "storage_location_id")
+
+
+def upsert_lots(conn, rows: Sequence[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    upsert_lot() pour `rows` en une instruction ; une ligne de résultat par
+    ligne d'entrée, même ordre (quantité finale du lot, `created` si inséré).
+    """
+    if not rows:
+        return []
+    params: Dict[str, list] = {f: [] for f in _BULK_FIELDS}
+    for row in rows:
+        params["product_id"].append(row["product_id"])
+        params["quantity"].append(row["quantity"])
+        params["unit"].append((row.get("unit") or "").strip() or None)
+        params["expiry_date"].append(row.get("expiry_date") or None)
+        params["storage_location_id"].append(row["storage_location_id"])
+    return [dict(r) for r in conn.execute(UPSERT_LOTS_SQL, params).mappings()]
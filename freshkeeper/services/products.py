@@ -0,0 +1,127 @@
+# freshkeeper/services/products.py
+"""
+Création d'un produit (ou reprise du produit de même nom) avec son lot initial.
+
+POST /api/products et /api/products/create faisaient trois allers-retours (SELECT
+sur lower(name), INSERT du produit, INSERT du lot) et deux créations
+concurrentes du même nom se heurtaient sur uq_products_name_norm (500).
+
+create_product_with_lot() appelle la fonction SQL fk_product_with_lot
+(scripts/sql/patch_product_with_lot.sql) : produit résolu ou créé via
+name_normalized, lot initial ajouté par le même upsert que services/lots.py,
+notifications du bus d'invalidation, en un seul aller-retour.
+
+Sans la fonction (patch non appliqué), même résultat en Python en 3 à 5
+instructions ; la course est gérée de la même façon (INSERT ... ON CONFLICT DO
+NOTHING, puis relecture).
+"""
+from __future__ import annotations
+
+import weakref
+from datetime import date
+from typing import Any, Dict, Optional, Union
+
+from sqlalchemy import text
+
+from freshkeeper.jobs.change_bus import publish
+from freshkeeper.services.lots import upsert_lot
+
+FUNCTION = "fk_product_with_lot(text,text,boolean,numeric,text,date,integer)"
+
+CREATE_SQL = text(
+    """
+    SELECT id, name, category, created, lot_id
+      FROM fk_product_with_lot(
+             CAST(:name AS text),
+             CAST(:category AS text),
+             CAST(:with_lot AS boolean),
+             CAST(:quantity AS numeric),
+             CAST(:unit AS text),
+             CAST(:expiry_date AS date),
+             CAST(:storage_location_id AS integer)
+           )
+    """
+)
+
+_SELECT_SQL = text(
+    "SELECT id, name, category FROM products WHERE name_normalized = lower(:name)"
+)
+_INSERT_SQL = text(
+    """
+    INSERT INTO products (name, category) VALUES (:name, :category)
+    ON CONFLICT (name_normalized) DO NOTHING
+    RETURNING id, name, category
+    """
+)
+
+# {engine : fonction installée ?} ; vérifié une fois par engine
+_functions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _has_function(conn) -> bool:
+    eng = conn.engine
+    if eng not in _functions:
+        _functions[eng] = bool(
+            conn.execute(
+                text("SELECT to_regprocedure(:f) IS NOT NULL"), {"f": FUNCTION}
+            ).scalar()
+        )
+    return _functions[eng]
+
+
+def create_product_with_lot(
+    conn,
+    *,
+    name: str,
+    category: Optional[str] = None,
+    with_lot: bool = False,
+    quantity: Union[float, None] = None,
+    unit: Optional[str] = None,
+    expiry_date: Optional[Union[date, str]] = None,
+    storage_location_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Produit de nom `name` (insensible à la casse), créé au besoin ; lot initial
+    si `with_lot` (quantité 0 et emplacement 1 par défaut).
+    Renvoie {id, name, category, created, lot_id}.
+    """
+    params = {
+        "name": name,
+        "category": category,
+        "with_lot": with_lot,
+        "quantity": quantity if quantity is not None else 0,
+        "unit": unit,
+        "expiry_date": expiry_date or None,
+        "storage_location_id": (
+            storage_location_id if storage_location_id is not None else 1
+        ),
+    }
+    if _has_function(conn):
+        return dict(conn.execute(CREATE_SQL, params).mappings().one())
+    return _create_without_function(conn, params)
+
+
+def _create_without_function(conn, params: Dict[str, Any]) -> Dict[str, Any]:
+    created = False
+    while True:
+        row = conn.execute(_SELECT_SQL, params).mappings().first()
+        if row is not None:
+            break
+        row = conn.execute(_INSERT_SQL, params).mappings().first()
+        if row is not None:
+            created = True
+            publish(conn, "products", [row["id"]])
+            break
+    result = {**row, "created": created, "lot_id": None}
+    if params["with_lot"]:
+        lot = upsert_lot(
+            conn,
+            product_id=row["id"],
+            quantity=params["quantity"],
+            unit=params["unit"],
+            expiry_date=params["expiry_date"],
+            storage_location_id=params["storage_location_id"],
+        )
+        result["lot_id"] = lot["id"]
+        publish(conn, "lots", [lot["id"]])
+    return result
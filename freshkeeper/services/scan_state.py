@@ -0,0 +1,72 @@
+# freshkeeper/services/scan_state.py
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Marge de sécurité : une transaction commencée avant le scan mais commitée après
+# porte un updated_at antérieur au watermark ; on relit donc les N dernières secondes.
+WATERMARK_LAG_SECONDS_DEFAULT = 120
+
+
+@dataclass(frozen=True)
+class ScanState:
+    watermark: Optional[datetime]  # dernier updated_at déjà traité (heure serveur)
+    rollover_date: Optional[
+        date
+    ]  # dernier jour où la passe "changement de date" a tourné
+
+
+def load_state(db: Session, name: str) -> Optional[ScanState]:
+    """
+    Lit l'état persisté du scan `name`.
+    None si la table scan_state n'existe pas (patch_scan_watermark.sql non appliqué) ;
+    ScanState(None, None) si le scan n'a encore jamais tourné.
+    """
+    exists = db.execute(text("SELECT to_regclass('scan_state') IS NOT NULL")).scalar()
+    if not exists:
+        return None
+    row = db.execute(
+        text("SELECT watermark, rollover_date FROM scan_state WHERE name = :name"),
+        {"name": name},
+    ).first()
+    if row is None:
+        return ScanState(None, None)
+    return ScanState(row[0], row[1])
+
+
+def next_watermark(db: Session) -> datetime:
+    """Watermark à enregistrer en fin de scan (horloge serveur, moins la marge)."""
+    try:
+        lag = int(
+            os.getenv("SCAN_WATERMARK_LAG_SECONDS", WATERMARK_LAG_SECONDS_DEFAULT)
+        )
+    except Exception:
+        lag = WATERMARK_LAG_SECONDS_DEFAULT
+    return db.execute(
+        text("SELECT LOCALTIMESTAMP - make_interval(secs => :lag)"), {"lag": lag}
+    ).scalar_one()
+
+
+def save_state(
+    db: Session, name: str, watermark: datetime, rollover_date: date
+) -> None:
+    """UPSERT de l'état ; le commit reste à l'appelant (même transaction que le scan)."""
+    db.execute(
+        text(
+            """
+            INSERT INTO scan_state (name, watermark, rollover_date, updated_at)
+            VALUES (:name, :watermark, :rollover_date, now())
+            ON CONFLICT (name) DO UPDATE
+               SET watermark     = EXCLUDED.watermark,
+                   rollover_date = EXCLUDED.rollover_date,
+                   updated_at    = now()
+        """
+        ),
+        {"name": name, "watermark": watermark, "rollover_date": rollover_date},
+    )
@@ -0,0 +1,458 @@
+# freshkeeper/services/seed_import.py
+"""
+Import en flux du catalogue : catégories, produits, alias et durées de
+conservation (scripts/seed_products.py).
+
+L'ancien script chargeait tout le fichier (json.load) puis faisait un SELECT
+et un flush ORM par catégorie et par produit : deux à trois allers-retours par
+ligne, et le document entier en mémoire. Ici :
+
+  - lecture incrémentale : JSON ({"categories": [...], "products": [...]} ou
+    tableau de produits), NDJSON (un objet par ligne) ou CSV (avec en-tête) ;
+    la mémoire dépend de la taille d'un lot, pas de celle du fichier ;
+  - lots de SEED_BATCH_SIZE lignes (5000) copiés par COPY dans deux tables
+    temporaires, puis fusionnés en quelques instructions : catégories,
+    produits (ON CONFLICT sur name_normalized), rattachement des produits déjà
+    importés aux catégories arrivées après eux ;
+  - une transaction par lot ; après chaque COMMIT, le nombre de lignes lues
+    est écrit dans un fichier d'état : un import interrompu reprend après le
+    dernier lot validé (les lignes déjà fusionnées sont relues sans aller-retour) ;
+  - lignes inchangées non réécrites (IS DISTINCT FROM) : relancer un import ne
+    touche que ce qui a changé. Dans un même lot, la dernière occurrence d'un
+    nom l'emporte.
+
+Colonnes requises : scripts/sql/patch_seed_import.sql.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from freshkeeper.jobs.change_bus import publish
+
+FORMATS = ("json", "ndjson", "csv")
+LOCATIONS = ("pantry", "fridge", "freezer")
+SECTIONS = {"categories": "category", "products": "product"}
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# ---------------------------------------------------------------- lecture
+
+
+_WS = re.compile(r"[ \t\n\r]*")
+
+
+class _JSONStream:
+    """Lecteur JSON incrémental : valeurs décodées une à une (raw_decode)."""
+
+    def __init__(self, raw: BinaryIO, chunk_size: int = 1 << 16):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.raw.read(self.chunk_size)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos :] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("JSON tronqué")
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON : {char!r} attendu, {found!r} trouvé")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():  # valeur coupée en fin de tampon
+                    continue
+                raise
+            # un nombre en fin de tampon peut continuer dans le bloc suivant
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise ValueError(f"JSON : ',' ou ']' attendu, {sep!r} trouvé")
+
+
+def _iter_json(raw: BinaryIO, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    stream = _JSONStream(raw, chunk_size)
+    if stream.peek() == "[":
+        for item in stream.array():
+            yield "product", item
+        return
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key in SECTIONS and stream.peek() == "[":
+            for item in stream.array():
+                yield SECTIONS[key], item
+        else:
+            stream.value()  # autre clé : ignorée
+        sep = stream.peek()
+        stream.pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise ValueError(f"JSON : ',' ou '}}' attendu, {sep!r} trouvé")
+
+
+def _kind(item: Dict[str, Any]) -> str:
+    return "category" if item.get("type") == "category" else "product"
+
+
+def _iter_ndjson(raw: BinaryIO) -> Iterator[Tuple[str, Any]]:
+    for line in raw:
+        if line.strip():
+            item = json.loads(line)
+            yield _kind(item), item
+
+
+def _iter_csv(raw: BinaryIO) -> Iterator[Tuple[str, Any]]:
+    """
+    Colonnes : name, category, aliases (tableau JSON ou valeurs séparées par
+    '|'), shelf_life (objet JSON) ou shelf_life_pantry/_fridge/_freezer,
+    type (product par défaut, ou category).
+    """
+    wrapper = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    try:
+        yield from _csv_items(csv.DictReader(wrapper))
+    finally:
+        wrapper.detach()  # `raw` reste ouvert (progression, tell())
+
+
+def _csv_items(reader) -> Iterator[Tuple[str, Any]]:
+    for row in reader:
+        item: Dict[str, Any] = {
+            k: v for k, v in row.items() if k and v not in ("", None)
+        }
+        aliases = item.get("aliases")
+        if aliases is not None and not aliases.lstrip().startswith("["):
+            item["aliases"] = aliases.split("|")
+        if "shelf_life" in item:
+            item["shelf_life"] = json.loads(item["shelf_life"])
+        else:
+            days = {
+                loc: int(item[f"shelf_life_{loc}"])
+                for loc in LOCATIONS
+                if f"shelf_life_{loc}" in item
+            }
+            item["shelf_life"] = days or None
+        yield _kind(item), item
+
+
+_READERS = {"json": _iter_json, "ndjson": _iter_ndjson, "csv": _iter_csv}
+
+
+def detect_format(path) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if suffix == ".csv":
+        return "csv"
+    return "json"
+
+
+# ---------------------------------------------------------------- normalisation
+
+
+def _text(value: Any) -> Optional[str]:
+    value = str(value).strip() if value is not None else ""
+    return value or None
+
+
+def _jsonb(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else None
+    if not value:
+        return None
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _category_row(n: int, item: Dict[str, Any]) -> Optional[tuple]:
+    name = _text(item.get("name"))
+    if name is None:
+        return None
+    return (n, name, _jsonb(item.get("shelf_life")))
+
+
+def _product_row(n: int, item: Dict[str, Any]) -> Optional[tuple]:
+    name = _text(item.get("name"))
+    if name is None:
+        return None
+    aliases = item.get("aliases")
+    if isinstance(aliases, list):
+        aliases = [a for a in (_text(a) for a in aliases) if a]
+    return (
+        n,
+        name,
+        _text(item.get("category")),
+        _jsonb(aliases),
+        _jsonb(item.get("shelf_life")),
+    )
+
+
+# ---------------------------------------------------------------- fusion
+
+
+STAGE_DDL = (
+    """
+    CREATE TEMP TABLE IF NOT EXISTS seed_stage_categories (
+      n BIGINT, name TEXT, shelf_life JSONB
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS seed_stage_products (
+      n BIGINT, name TEXT, category TEXT, aliases JSONB, shelf_life JSONB
+    ) ON COMMIT DELETE ROWS
+    """,
+)
+
+MERGE_CATEGORIES_SQL = text(
+    """
+    INSERT INTO product_categories AS pc (name, shelf_life)
+    SELECT DISTINCT ON (name) name, shelf_life
+      FROM seed_stage_categories
+     ORDER BY name, n DESC
+    ON CONFLICT (name) DO UPDATE
+       SET shelf_life = EXCLUDED.shelf_life
+     WHERE EXCLUDED.shelf_life IS NOT NULL
+       AND EXCLUDED.shelf_life IS DISTINCT FROM pc.shelf_life
+    """
+)
+
+# produits des lots précédents qui citaient une catégorie encore inconnue
+ATTACH_CATEGORIES_SQL = text(
+    """
+    UPDATE products p
+       SET category_id = pc.id
+      FROM product_categories pc
+     WHERE pc.name IN (SELECT name FROM seed_stage_categories)
+       AND p.category = pc.name
+       AND p.category_id IS NULL
+    """
+)
+
+MERGE_PRODUCTS_SQL = text(
+    """
+    WITH merged AS (
+        INSERT INTO products AS p (name, category, category_id, aliases, shelf_life)
+        SELECT DISTINCT ON (lower(s.name))
+               s.name, s.category, pc.id, s.aliases, s.shelf_life
+          FROM seed_stage_products s
+          LEFT JOIN product_categories pc ON pc.name = s.category
+         ORDER BY lower(s.name), s.n DESC
+        ON CONFLICT (name_normalized) DO UPDATE
+           SET category = COALESCE(EXCLUDED.category, p.category),
+               category_id = COALESCE(EXCLUDED.category_id, p.category_id),
+               aliases = COALESCE(EXCLUDED.aliases, p.aliases),
+               shelf_life = COALESCE(EXCLUDED.shelf_life, p.shelf_life)
+         WHERE (p.category, p.category_id, p.aliases, p.shelf_life)
+               IS DISTINCT FROM
+               (COALESCE(EXCLUDED.category, p.category),
+                COALESCE(EXCLUDED.category_id, p.category_id),
+                COALESCE(EXCLUDED.aliases, p.aliases),
+                COALESCE(EXCLUDED.shelf_life, p.shelf_life))
+        RETURNING (xmax = 0) AS created
+    )
+    SELECT count(*) FILTER (WHERE created) AS created,
+           count(*) FILTER (WHERE NOT created) AS updated
+      FROM merged
+    """
+)
+
+
+def _copy(conn, table: str, columns: Tuple[str, ...], rows: List[tuple]) -> None:
+    """COPY FROM STDIN (CSV) sur la connexion DBAPI, dans la transaction en cours."""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cur = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cur, "copy"):  # psycopg 3
+            with cur.copy(sql) as copy:
+                copy.write(buf.getvalue())
+        else:  # psycopg2
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+    finally:
+        cur.close()
+
+
+@dataclass
+class ImportStats:
+    records: int = 0  # lignes lues, y compris celles d'une exécution précédente
+    resumed_from: int = 0
+    skipped: int = 0  # lignes sans nom
+    categories: int = 0  # catégories créées ou modifiées
+    created: int = 0
+    updated: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return (self.records - self.resumed_from) / elapsed if elapsed > 0 else 0.0
+
+
+def _merge(conn, categories: List[tuple], products: List[tuple], stats) -> None:
+    if categories:
+        _copy(conn, "seed_stage_categories", ("n", "name", "shelf_life"), categories)
+        stats.categories += conn.execute(MERGE_CATEGORIES_SQL).rowcount
+        conn.execute(ATTACH_CATEGORIES_SQL)
+    if products:
+        _copy(
+            conn,
+            "seed_stage_products",
+            ("n", "name", "category", "aliases", "shelf_life"),
+            products,
+        )
+        created, updated = conn.execute(MERGE_PRODUCTS_SQL).one()
+        stats.created += created
+        stats.updated += updated
+        if created or updated:
+            publish(conn, "products")
+
+
+# ---------------------------------------------------------------- reprise
+
+
+def _state_key(path: Path) -> Dict[str, Any]:
+    st = path.stat()
+    return {"file": str(path.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _load_state(state_path: Path, key: Dict[str, Any]) -> int:
+    """Lignes déjà importées, si l'état correspond au même fichier (taille, mtime)."""
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return 0
+    if {k: state.get(k) for k in key} != key:
+        return 0
+    return int(state.get("done", 0))
+
+
+def _save_state(state_path: Path, key: Dict[str, Any], done: int) -> None:
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    tmp.write_text(json.dumps({**key, "done": done}), encoding="utf-8")
+    os.replace(tmp, state_path)
+
+
+def state_path_for(path) -> Path:
+    return Path(str(path) + ".progress.json")
+
+
+def import_catalog(
+    engine,
+    path,
+    *,
+    fmt: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    state_path=None,
+    restart: bool = False,
+    progress: Optional[Callable[[ImportStats, float], None]] = None,
+) -> ImportStats:
+    """
+    Importe `path` (format deviné d'après l'extension si `fmt` est absent).
+    Reprend après le dernier lot validé sauf si `restart` ; le fichier d'état
+    est supprimé une fois l'import terminé. `progress(stats, fraction)` est
+    appelé après chaque lot (fraction du fichier lue).
+    """
+    path = Path(path)
+    fmt = fmt or detect_format(path)
+    if fmt not in _READERS:
+        raise ValueError(f"format inconnu : {fmt} (attendu : {', '.join(FORMATS)})")
+    batch_size = batch_size or int(_get_float("SEED_BATCH_SIZE", 5000))
+    state_path = Path(state_path) if state_path else state_path_for(path)
+    key = _state_key(path)
+    done = 0 if restart else _load_state(state_path, key)
+    stats = ImportStats(records=done, resumed_from=done)
+    categories: List[tuple] = []
+    products: List[tuple] = []
+
+    with open(path, "rb") as raw, engine.connect() as conn:
+        with conn.begin():
+            for ddl in STAGE_DDL:
+                conn.execute(text(ddl))
+
+        def flush(n: int) -> None:
+            with conn.begin():
+                _merge(conn, categories, products, stats)
+            categories.clear()
+            products.clear()
+            stats.records = n
+            _save_state(state_path, key, n)
+            if progress is not None:
+                progress(stats, raw.tell() / (key["size"] or 1))
+
+        n = 0
+        for n, (kind, item) in enumerate(_READERS[fmt](raw), 1):
+            if n <= done:
+                continue
+            if kind == "category":
+                row, rows = _category_row(n, item), categories
+            else:
+                row, rows = _product_row(n, item), products
+            if row is None:
+                stats.skipped += 1
+                continue
+            rows.append(row)
+            if len(categories) + len(products) >= batch_size:
+                flush(n)
+        if n > stats.records:
+            flush(n)
+
+    state_path.unlink(missing_ok=True)
+    return stats
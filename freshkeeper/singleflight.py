@@ -0,0 +1,209 @@
+# freshkeeper/singleflight.py
+"""
+Coalescence des GET identiques simultanés (single-flight).
+
+À l'ouverture de l'app, des centaines de téléphones appellent /api/inventory,
+/api/lots/grouped ou /dashboard/summary au même instant. Le premier appel
+d'une clé (route + paramètres normalisés) exécute la requête ; les appels
+identiques arrivés pendant ce temps attendent et partagent son résultat au
+lieu de solliciter Postgres. Rien n'est conservé après coup : ce n'est pas un
+cache, seulement un partage du calcul en cours.
+
+Portée configurable par route (`register_scope`) : paramètres de requête pris
+en compte, en-têtes qui distinguent les réponses (ex. Authorization).
+SINGLEFLIGHT_ENABLED=0 désactive tout, SINGLEFLIGHT_DISABLED="inventory,..."
+certaines routes ; un appel en attente depuis SINGLEFLIGHT_WAIT_SECONDS (30)
+calcule lui-même. Compteurs sur GET /admin/singleflight.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+@dataclass(frozen=True)
+class Scope:
+    params: Optional[Tuple[str, ...]] = None  # None : tous ; () : aucun
+    headers: Tuple[str, ...] = ()  # ex. ("authorization",) : une file par client
+    enabled: bool = True
+
+
+# Routes sans paramètres : un ?_=horodatage anti-cache ne doit pas éclater la clé
+_SCOPES: Dict[str, Scope] = {
+    "inventory": Scope(params=()),
+    "lots_grouped": Scope(params=()),
+    "dashboard_summary": Scope(params=()),
+}
+
+
+def register_scope(route: str, scope: Scope) -> None:
+    _SCOPES[route] = scope
+
+
+def get_scope(route: str) -> Scope:
+    scope = _SCOPES.get(route, Scope())
+    if os.getenv("SINGLEFLIGHT_ENABLED", "1").strip().lower() in ("0", "false", "no"):
+        return Scope(enabled=False)
+    disabled = {r.strip() for r in os.getenv("SINGLEFLIGHT_DISABLED", "").split(",")}
+    if route in disabled:
+        return Scope(enabled=False)
+    return scope
+
+
+def flight_key(route: str, request: Request, scope: Scope) -> Hashable:
+    """Route + paramètres retenus (triés, espaces retirés) + en-têtes retenus."""
+    params = tuple(
+        sorted(
+            (k, v.strip())
+            for k, v in request.query_params.multi_items()
+            if scope.params is None or k in scope.params
+        )
+    )
+    headers = tuple(request.headers.get(h, "") for h in scope.headers)
+    return (route, params, headers)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Un calcul en vol par clé ; les appels concurrents de même clé l'attendent."""
+
+    def __init__(self, wait_seconds: float = 30.0):
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        # handlers async : un Future par (boucle, clé), attendu sans bloquer
+        self._futures: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"executions": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+        )
+
+    def do(self, key: Hashable, fn: Callable[[], T], route: str = "default") -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats[route]["executions"] += 1
+            else:
+                self._stats[route]["coalesced"] += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_seconds):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            with self._lock:
+                self._stats[route]["timeouts"] += 1
+            return fn()  # calcul en vol trop long : on n'attend plus
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats[route]["errors"] += 1
+            raise
+        finally:
+            # retiré AVANT de réveiller : un appel arrivé après la fin relance
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def do_async(
+        self, key: Hashable, fn: Callable[[], Awaitable[T]], route: str = "default"
+    ) -> T:
+        """do() pour les handlers async : `fn` est une coroutine function."""
+        loop = asyncio.get_running_loop()
+        fkey = (id(loop), key)
+        with self._lock:
+            future = self._futures.get(fkey)
+            leader = future is None
+            if leader:
+                future = self._futures[fkey] = loop.create_future()
+                self._stats[route]["executions"] += 1
+            else:
+                self._stats[route]["coalesced"] += 1
+
+        if not leader:
+            try:
+                # shield : un appelant annulé n'annule pas le calcul partagé
+                return await asyncio.wait_for(asyncio.shield(future), self.wait_seconds)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._stats[route]["timeouts"] += 1
+                return await fn()
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # marquée lue, même sans appel en attente
+            with self._lock:
+                self._stats[route]["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._futures.pop(fkey, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {r: dict(s) for r, s in self._stats.items()}
+            in_flight = len(self._flights) + len(self._futures)
+        for s in routes.values():
+            total = s["executions"] + s["coalesced"]
+            s["coalesced_ratio"] = round(s["coalesced"] / total, 4) if total else None
+        return {"in_flight": in_flight, "routes": routes}
+
+
+flights = SingleFlight(wait_seconds=_get_float("SINGLEFLIGHT_WAIT_SECONDS", 30.0))
+
+
+def coalesce(route: str, request: Request, fn: Callable[[], T]) -> T:
+    """
+    Exécute `fn` une seule fois pour les appels identiques simultanés de
+    `route`. Le résultat est partagé tel quel : le traiter en lecture seule
+    (idéalement des octets déjà sérialisés, cf. freshkeeper.responses.dumps).
+    """
+    scope = get_scope(route)
+    if not scope.enabled:
+        return fn()
+    return flights.do(flight_key(route, request, scope), fn, route)
+
+
+async def coalesce_async(
+    route: str, request: Request, fn: Callable[[], Awaitable[T]]
+) -> T:
+    """coalesce() pour les handlers async (`fn` : coroutine function)."""
+    scope = get_scope(route)
+    if not scope.enabled:
+        return await fn()
+    return await flights.do_async(flight_key(route, request, scope), fn, route)
@@ -0,0 +1,114 @@
+# freshkeeper/streaming.py
+"""
+Réponses NDJSON en flux pour les grosses listes (/api/lots, /api/alerts,
+/api/products, /api/inventory).
+
+Activé par `Accept: application/x-ndjson` ou `?stream=1`. Une ligne JSON par
+élément ; les lignes sont lues par curseur serveur (stream_results/yield_per)
+et envoyées par paquets, sans jamais matérialiser la liste : mémoire constante
+quel que soit le nombre de lignes.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+
+from freshkeeper.responses import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_DEFAULT = 2000
+
+
+def _batch_size() -> int:
+    try:
+        return int(os.getenv("STREAM_BATCH_SIZE", str(STREAM_BATCH_DEFAULT)))
+    except Exception:
+        return STREAM_BATCH_DEFAULT
+
+
+def wants_stream(request: Request) -> bool:
+    if request.query_params.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return NDJSON_MEDIA_TYPE in (request.headers.get("accept") or "")
+
+
+def stream_query(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    engine=None,
+    group_by: Optional[str] = None,
+    group_key: str = "lots",
+) -> StreamingResponse:
+    """
+    StreamingResponse NDJSON sur `sql` (ordre déjà fixé par la requête).
+
+    `group_by` : regroupe les lignes consécutives de même valeur en
+    {group_by: valeur, group_key: [lignes]} — la requête doit donc trier par
+    cette colonne d'abord (cf. /api/inventory).
+    """
+    from freshkeeper.database import get_read_engine
+
+    eng = engine or get_read_engine()
+    size = _batch_size()
+
+    def rows() -> Iterator[Iterable[Dict[str, Any]]]:
+        # la connexion est ouverte dans le générateur : elle vit le temps du flux
+        with eng.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=size
+            ).execute(text(sql), params or {})
+            for part in result.mappings().partitions(size):
+                yield part
+
+    body = _grouped(rows(), group_by, group_key) if group_by else _flat(rows())
+    return StreamingResponse(body, media_type=NDJSON_MEDIA_TYPE)
+
+
+def _flat(parts: Iterator[Iterable[Dict[str, Any]]]) -> Iterator[bytes]:
+    for part in parts:
+        yield b"".join(dumps(dict(r)) + b"\n" for r in part)
+
+
+def _grouped(
+    parts: Iterator[Iterable[Dict[str, Any]]], group_by: str, group_key: str
+) -> Iterator[bytes]:
+    current, items, out = None, [], []
+    for part in parts:
+        for r in part:
+            row = dict(r)
+            key = row[group_by]
+            if items and key != current:
+                out.append(dumps({group_by: current, group_key: items}) + b"\n")
+                items = []
+            current = key
+            items.append(row)
+        if out:
+            yield b"".join(out)
+            out = []
+    if items:
+        yield dumps({group_by: current, group_key: items}) + b"\n"
+
+
+def select_sql(
+    table: str, columns: str, order_by: Sequence[str], where: Sequence[str] = ()
+) -> str:
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    return f"SELECT {columns} FROM {table} {where_sql} ORDER BY {', '.join(order_by)}"
+
+
+def maybe_stream(
+    request: Request,
+    table: str,
+    columns: str,
+    order_by: Sequence[str],
+    where: Sequence[str] = (),
+    params: Optional[Dict[str, Any]] = None,
+) -> Optional[StreamingResponse]:
+    """StreamingResponse si le client la demande, sinon None (réponse classique)."""
+    if not wants_stream(request):
+        return None
+    return stream_query(select_sql(table, columns, order_by, where), params)
@@ -1,7 +1,22 @@
-import axios from 'axios';
+import axios, { AxiosError, InternalAxiosRequestConfig } from 'axios';
 
 export const API_BASE_URL = process.env.EXPO_PUBLIC_API_BASE_URL || 'http://127.0.0.1:8000';
 
+// rejeux après timeout / coupure réseau (ou 409 "clé en cours" du serveur)
+const MAX_RETRIES = 2;
+const RETRY_DELAY_MS = 1000;
+
+type RetryConfig = InternalAxiosRequestConfig & { _retries?: number };
+
+function newIdempotencyKey(): string {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
+// portée des clés côté serveur hors connexion (sans Authorization ni
+// X-Client-Id, Idempotency-Key est ignorée) ; un id par lancement de l'app
+// suffit : les rejeux ne survivent pas à un redémarrage
+const CLIENT_ID = newIdempotencyKey();
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   timeout: 15000,
@@ -14,7 +29,35 @@ api.interceptors.request.use(async (config) => {
     const token = useAuthStore.getState().token;
     if (token) config.headers.Authorization = `Bearer ${token}`;
   } catch {}
+  config.headers['X-Client-Id'] = CLIENT_ID;
+  // POST : une clé par requête logique ; un rejeu repasse ici avec la même
+  // config, donc la même clé -> le serveur renvoie la réponse déjà calculée
+  // (freshkeeper/idempotency.py)
+  if (config.method === 'post' && !config.headers['Idempotency-Key']) {
+    config.headers['Idempotency-Key'] = newIdempotencyKey();
+  }
   return config;
 });
 
+function retryDelay(error: AxiosError, attempt: number): number | null {
+  const config = error.config as RetryConfig | undefined;
+  if (!config || attempt > MAX_RETRIES) return null;
+  // rejouable sans double effet : lecture, ou POST porteur de sa clé
+  if (config.method !== 'get' && !config.headers['Idempotency-Key']) return null;
+  if (!error.response) return RETRY_DELAY_MS * attempt; // timeout, réseau coupé
+  const retryAfter = Number(error.response.headers['retry-after']);
+  if (error.response.status === 409 && retryAfter > 0) return retryAfter * 1000;
+  return null;
+}
+
+api.interceptors.response.use(undefined, async (error: AxiosError) => {
+  const config = error.config as RetryConfig | undefined;
+  const attempt = (config?._retries ?? 0) + 1;
+  const delay = retryDelay(error, attempt);
+  if (config === undefined || delay === null) throw error;
+  config._retries = attempt;
+  await new Promise((resolve) => setTimeout(resolve, delay));
+  return api.request(config);
+});
+
 export default api;
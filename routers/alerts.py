@@ -1,12 +1,21 @@
 ﻿from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
+from database import get_db
+from freshkeeper.jobs.change_bus import publish
+from freshkeeper.pagination import (
+    DATE_MAX,
+    Page,
+    PageParams,
+    SortKey,
+    fetch_page,
+    page_params,
+)
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
@@ -26,25 +35,22 @@ class AlertOut(BaseModel):
         from_attributes = True
 
 
+# Même ordre que l'historique "due_date NULLS LAST, id"
+ALERT_KEYS = (SortKey(f"COALESCE(due_date, {DATE_MAX})", "date"), SortKey("id"))
+
+
 class AlertPatch(BaseModel):
     is_active: Optional[bool] = None
     message: Optional[str] = None
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-@router.get("", response_model=List[AlertOut])
+@router.get("", response_model=Union[List[AlertOut], Page[AlertOut]])
 def list_alerts(
     kind: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
     due_from: Optional[date] = Query(None),
     due_to: Optional[date] = Query(None),
+    page: PageParams = Depends(page_params),
     db: Session = Depends(get_db),
 ):
     conds, params = [], {}
@@ -61,17 +67,16 @@ def list_alerts(
         conds.append("due_date <= :due_to")
         params["due_to"] = due_to
 
-    where = ("WHERE " + " AND ".join(conds)) if conds else ""
-    sql = text(
-        f"""
-        SELECT id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id
-        FROM alerts
-        {where}
-        ORDER BY due_date NULLS LAST, id
-    """
+    rows, meta = fetch_page(
+        db,
+        "alerts",
+        "id, product_id, kind, due_date, message, is_active, created_at, updated_at, lot_id",
+        ALERT_KEYS,
+        page,
+        conds,
+        params,
     )
-    rows = db.execute(sql, params).mappings().all()
-    return rows
+    return {"items": rows, **meta} if page.paginated else rows
 
 
 @router.patch("/{alert_id}", response_model=AlertOut)
@@ -99,7 +104,8 @@ def update_alert(alert_id: int, payload: AlertPatch, db: Session = Depends(get_d
         .mappings()
         .first()
     )
-
+    if row:
+        publish(db, "alerts", [alert_id])  # livré au commit
     db.commit()
     if not row:
         raise HTTPException(status_code=404, detail="Alert not found")
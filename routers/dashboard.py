@@ -1,16 +1,16 @@
 ﻿from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from pydantic import BaseModel, condecimal
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-try:
-    from database import SessionLocal
-except ImportError:
-    from .database import SessionLocal
+from freshkeeper.database import get_read_db, run_sync
+from freshkeeper.singleflight import coalesce, coalesce_async
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+# Variante async : montée AVANT `router` par main.py si ASYNC_DB_ENABLED=1
+async_router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 
 # ---------- Models ----------
@@ -41,18 +41,21 @@ class RecoItem(BaseModel):
     suggested_qty: condecimal(max_digits=12, decimal_places=3)
 
 
-# ---------- DB session ----------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # ---------- Endpoints ----------
 @router.get("/summary", response_model=Summary)
-def get_summary(db: Session = Depends(get_db)):
+def get_summary(request: Request, db: Session = Depends(get_read_db)):
+    # ouverture de l'app : un seul calcul pour les appels simultanés
+    return coalesce("dashboard_summary", request, lambda: _summary(db))
+
+
+@async_router.get("/summary", response_model=Summary)
+async def get_summary_async(request: Request):
+    return await coalesce_async(
+        "dashboard_summary", request, lambda: run_sync(_summary)
+    )
+
+
+def _summary(db: Session):
     row = (
         db.execute(
             text(
@@ -71,11 +74,11 @@ def get_summary(db: Session = Depends(get_db)):
         .mappings()
         .first()
     )
-    return row
+    return dict(row)
 
 
 @router.get("/expiring", response_model=List[ExpiringItem])
-def get_expiring(days: int = Query(7, ge=0, le=90), db: Session = Depends(get_db)):
+def get_expiring(days: int = Query(7, ge=0, le=90), db: Session = Depends(get_read_db)):
     # filtre: DLU <= J+days
     rows = (
         db.execute(
@@ -117,7 +120,7 @@ def get_expiring(days: int = Query(7, ge=0, le=90), db: Session = Depends(get_db
 
 @router.get("/replenishments", response_model=List[RecoItem])
 def get_replenishments(
-    limit: int = Query(20, ge=1, le=200), db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=200), db: Session = Depends(get_read_db)
 ):
     rows = (
         db.execute(
@@ -1,18 +1,31 @@
 ﻿from datetime import date
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, condecimal
-from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 try:
-    from database import SessionLocal
+    from database import get_db
 except ImportError:
-    from .database import SessionLocal
+    from .database import get_db
+
+from freshkeeper.jobs.change_bus import publish
+from freshkeeper.pagination import (
+    DATE_MAX,
+    Page,
+    PageParams,
+    SortKey,
+    fetch_page,
+    page_params,
+)
+from freshkeeper.services.lots import upsert_lot as merge_lot
 
 router = APIRouter(prefix="/lots", tags=["lots"])
 
+# DLC croissante, lots sans DLC en dernier, puis id
+LOT_KEYS = (SortKey(f"COALESCE(expiry_date, {DATE_MAX})", "date"), SortKey("id"))
+
 
 class LotUpsert(BaseModel):
     product_id: int
@@ -34,36 +47,20 @@ class LotRead(BaseModel):
         from_attributes = True
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("", response_model=LotRead)
 def upsert_lot(payload: LotUpsert, db: Session = Depends(get_db)):
-    # Merge key uses generated column unit_norm, so unit NULL/'' behave the same
-    sql = text(
-        """
-        INSERT INTO lots (product_id, quantity, unit, expiry_date, storage_location_id)
-        VALUES (:product_id, :quantity, :unit, :expiry_date, :storage_location_id)
-        ON CONFLICT (product_id, expiry_date, storage_location_id, unit_norm)
-        DO UPDATE SET quantity = lots.quantity + EXCLUDED.quantity,
-                      updated_at = now()
-        RETURNING id, product_id, quantity, unit, expiry_date, storage_location_id
-    """
-    )
-    row = db.execute(sql, payload.model_dump()).mappings().first()
+    # Single-statement upsert shared with POST /lots (freshkeeper/services/lots.py)
+    row = merge_lot(db, **payload.model_dump())
+    publish(db, "lots", [row["id"]])
     db.commit()
     return row
 
 
-@router.get("", response_model=List[LotRead])
+@router.get("", response_model=Union[List[LotRead], Page[LotRead]])
 def list_lots(
     product_id: Optional[int] = None,
     storage_location_id: Optional[int] = None,
+    page: PageParams = Depends(page_params),
     db: Session = Depends(get_db),
 ):
     conds = []
@@ -74,14 +71,13 @@ def list_lots(
     if storage_location_id is not None:
         conds.append("storage_location_id = :storage_location_id")
         params["storage_location_id"] = storage_location_id
-    where = ("WHERE " + " AND ".join(conds)) if conds else ""
-    sql = text(
-        f"""
-        SELECT id, product_id, quantity, unit, expiry_date, storage_location_id
-        FROM lots
-        {where}
-        ORDER BY COALESCE(expiry_date, DATE '9999-12-31') ASC, id ASC
-    """
+    rows, meta = fetch_page(
+        db,
+        "lots",
+        "id, product_id, quantity, unit, expiry_date, storage_location_id",
+        LOT_KEYS,
+        page,
+        conds,
+        params,
     )
-    rows = db.execute(sql, params).mappings().all()
-    return rows
+    return {"items": rows, **meta} if page.paginated else rows
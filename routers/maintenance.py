@@ -1,28 +1,57 @@
-﻿from fastapi import APIRouter, Depends
+﻿from datetime import timedelta
+
+from fastapi import APIRouter, Depends
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from freshkeeper.services.scan_state import load_state, next_watermark, save_state
+
 try:
-    from database import SessionLocal
+    from database import get_db
 except ImportError:
-    from .database import SessionLocal
+    from .database import get_db
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Nom de l'état persisté dans scan_state (cf. scripts/sql/patch_scan_watermark.sql)
+SCAN_STATE_NAME = "admin_alerts_scan"
 
 
 @router.post("/alerts/scan")
-def scan_alerts(db: Session = Depends(get_db)):
+def scan_alerts(full: bool = False, db: Session = Depends(get_db)):
+    # 0) Incrémental : seuls les lots modifiés depuis le dernier scan (updated_at,
+    #    trigger trg_lots_updated_at), + au changement de jour les lots qui viennent
+    #    de franchir la limite soon/expiry. `full=true` force le scan complet.
+    today = db.execute(text("SELECT CURRENT_DATE")).scalar_one()
+    state = load_state(db, SCAN_STATE_NAME)
+    new_watermark = next_watermark(db) if state is not None else None
+    incremental = bool(
+        not full and state is not None and state.watermark and state.rollover_date
+    )
+    rollover = not incremental or state.rollover_date < today
+
+    params = {}
+    lot_scope = ""
+    cleanup_scope = ""
+    if incremental:
+        params["since"] = state.watermark
+        lot_scope = "l.updated_at > :since"
+        if rollover:
+            params["last_day"] = state.rollover_date
+            params["last_soon"] = state.rollover_date + timedelta(days=3)
+            lot_scope += """
+               OR (l.expiry_date >= :last_day AND l.expiry_date < CURRENT_DATE)
+               OR (l.expiry_date > :last_soon
+                   AND l.expiry_date <= CURRENT_DATE + INTERVAL '3 days')"""
+        else:
+            # Hors changement de jour, seules les modifs de lots peuvent invalider
+            cleanup_scope = """
+          AND a.product_id IN (SELECT product_id FROM lots WHERE updated_at > :since)"""
+        lot_scope = f"AND ({lot_scope})"
+
     # 1) Expirés (red)
     sql_expired = text(
-        """
+        f"""
         INSERT INTO alerts (product_id, lot_id, kind, due_date, message, is_active)
         SELECT p.id, l.id, 'expiry', l.expiry_date,
                'Périmé: ' || p.name || ' le ' || to_char(l.expiry_date,'YYYY-MM-DD'),
@@ -32,17 +61,18 @@ def scan_alerts(db: Session = Depends(get_db)):
         WHERE l.expiry_date IS NOT NULL
           AND l.expiry_date < CURRENT_DATE
           AND l.quantity > 0
+          {lot_scope}
         ON CONFLICT (product_id, kind, due_date)
         DO UPDATE SET is_active = EXCLUDED.is_active,
                       message   = EXCLUDED.message,
                       updated_at = now();
     """
     )
-    db.execute(sql_expired)
+    db.execute(sql_expired, params)
 
     # 2) Bientôt (yellow) J0..J+3
     sql_soon = text(
-        """
+        f"""
         INSERT INTO alerts (product_id, lot_id, kind, due_date, message, is_active)
         SELECT p.id, l.id, 'soon', l.expiry_date,
                'Bientôt: ' || p.name || ' le ' || to_char(l.expiry_date,'YYYY-MM-DD'),
@@ -53,17 +83,18 @@ def scan_alerts(db: Session = Depends(get_db)):
           AND l.expiry_date >= CURRENT_DATE
           AND l.expiry_date <= CURRENT_DATE + INTERVAL '3 days'
           AND l.quantity > 0
+          {lot_scope}
         ON CONFLICT (product_id, kind, due_date)
         DO UPDATE SET is_active = EXCLUDED.is_active,
                       message   = EXCLUDED.message,
                       updated_at = now();
     """
     )
-    db.execute(sql_soon)
+    db.execute(sql_soon, params)
 
     # 3) Désactivation des alertes qui ne sont plus valides
     sql_cleanup = text(
-        """
+        f"""
         UPDATE alerts a
         SET is_active = FALSE, updated_at = now()
         WHERE a.kind IN ('expiry','soon')
@@ -78,12 +109,14 @@ def scan_alerts(db: Session = Depends(get_db)):
                  OR (a.kind = 'soon'   AND l.expiry_date IS NOT NULL AND l.expiry_date >= CURRENT_DATE
                                         AND l.expiry_date <= CURRENT_DATE + INTERVAL '3 days')
               )
-          );
+          ){cleanup_scope};
     """
     )
-    res = db.execute(sql_cleanup)
+    res = db.execute(sql_cleanup, params)
+    if new_watermark is not None:
+        save_state(db, SCAN_STATE_NAME, new_watermark, today)
     db.commit()
-    return {"ok": True}
+    return {"ok": True, "incremental": incremental}
 
 
 @router.post("/reco/refresh")
@@ -6,10 +6,7 @@ from pydantic import BaseModel, condecimal
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-try:
-    from database import SessionLocal
-except ImportError:
-    from .database import SessionLocal
+from freshkeeper.database import get_read_db
 
 router = APIRouter(prefix="/lots", tags=["lots-status"])
 
@@ -24,16 +21,8 @@ class LotStatus(BaseModel):
     status_color: str
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("/status", response_model=List[LotStatus])
-def get_lot_status(db: Session = Depends(get_db)):
+def get_lot_status(db: Session = Depends(get_read_db)):
     rows = (
         db.execute(
             text(
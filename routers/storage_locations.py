@@ -6,9 +6,9 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 try:
-    from database import SessionLocal
+    from database import get_db
 except ImportError:
-    from .database import SessionLocal  # fallback if project layout differs
+    from .database import get_db  # fallback if project layout differs
 
 router = APIRouter(prefix="/storage_locations", tags=["storage_locations"])
 
@@ -23,14 +23,6 @@ class StorageLocation(BaseModel):
         from_attributes = True
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("", response_model=List[StorageLocation])
 def list_locations(db: Session = Depends(get_db)):
     rows = (
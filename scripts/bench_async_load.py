@@ -0,0 +1,119 @@
+"""
+Benchmark de charge : routes de lecture sync (threadpool) contre leurs variantes
+async (freshkeeper/routers/async_read.py), N clients simultanés.
+
+Par défaut, en mémoire (httpx.ASGITransport) : mêmes handlers, même pool SQL,
+même limite de 40 threads Starlette pour les routes sync ; seule la latence
+réseau manque. Avec --url, vise un serveur déjà lancé (uvicorn, une fois avec
+ASYNC_DB_ENABLED=0 puis =1).
+
+Base : DATABASE_URL (PostgreSQL).
+
+Usage :
+  python scripts/bench_async_load.py --clients 500 --requests 10
+  python scripts/bench_async_load.py --url http://127.0.0.1:8000 --clients 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve()
+PROJECT_ROOT = HERE.parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+os.environ.setdefault("ASYNC_DB_ENABLED", "0")  # main.py : routes sync seules
+
+import httpx
+from fastapi import FastAPI
+
+PATHS = ("/api/products?size=50", "/api/lots?size=50", "/api/alerts?size=50")
+
+
+def _sync_app() -> FastAPI:
+    import freshkeeper.main as main
+
+    return main.app
+
+
+def _async_app() -> FastAPI:
+    from freshkeeper.routers.async_read import router
+    from freshkeeper.routing import PathNormalizeMiddleware
+
+    # mêmes URL que l'app : /api/products -> /products (comme main.py)
+    app = FastAPI()
+    app.add_middleware(PathNormalizeMiddleware)
+    app.include_router(router)
+    return app
+
+
+def _pct(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def _load(client: httpx.AsyncClient, clients: int, requests: int):
+    latencies, errors = [], 0
+
+    async def one_client(i: int):
+        nonlocal errors
+        for j in range(requests):
+            path = PATHS[(i + j) % len(PATHS)]
+            t0 = time.perf_counter()
+            r = await client.get(path)
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one_client(i) for i in range(clients)))
+    return latencies, errors, time.perf_counter() - t0
+
+
+async def _run(label: str, client: httpx.AsyncClient, args) -> None:
+    await _load(client, min(args.clients, 20), 2)  # chauffe pools et caches
+    latencies, errors, elapsed = await _load(client, args.clients, args.requests)
+    print(
+        f"{label:<6} {len(latencies):>7} {len(latencies) / elapsed:>8.0f} "
+        f"{statistics.median(latencies) * 1000:>8.1f} "
+        f"{_pct(latencies, 99) * 1000:>8.1f} {errors:>7}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=10, help="par client")
+    parser.add_argument("--url", help="serveur déjà lancé (sinon en mémoire)")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.clients)
+    print(f"{args.clients} clients x {args.requests} requêtes sur {', '.join(PATHS)}")
+    print(
+        f"{'mode':<6} {'req':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'erreurs':>7}"
+    )
+    if args.url:
+        async with httpx.AsyncClient(
+            base_url=args.url, limits=limits, timeout=120
+        ) as client:
+            await _run("url", client, args)
+        return
+
+    from freshkeeper.database import dispose_async_engines
+
+    for label, app in (("sync", _sync_app()), ("async", _async_app())):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=120
+        ) as client:
+            await _run(label, client, args)
+    await dispose_async_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
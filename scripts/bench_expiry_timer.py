@@ -0,0 +1,91 @@
+"""
+Benchmark : empreinte mémoire de la file des réveils d'expiration pour N lots,
+file de priorité naïve (heapq de tuples (datetime, kind, id), une entrée par
+transition) contre la roue à la journée de freshkeeper.jobs.expiry_timer.
+
+Pas de base nécessaire : DLC et quantités synthétiques (DLC sur ~1 an).
+
+Usage :
+  python scripts/bench_expiry_timer.py --lots 1000000
+"""
+
+import argparse
+import heapq
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+HERE = Path(__file__).resolve()
+PROJECT_ROOT = HERE.parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from freshkeeper.jobs.expiry_timer import DayWheel, transitions
+
+SOON_DAYS = 3
+
+
+def _lots(n: int, today: date):
+    rnd = random.Random(42)
+    for pid in range(1, n + 1):
+        qty = 0 if rnd.random() < 0.05 else rnd.randint(1, 10)
+        yield pid, qty, today + timedelta(days=rnd.randint(-30, 365))
+
+
+def _build_heap(n: int, today: date):
+    heap = []
+    for pid, qty, expiry in _lots(n, today):
+        for day in transitions(qty, expiry, today, SOON_DAYS):
+            heapq.heappush(heap, (datetime.combine(day, datetime.min.time()), "T", pid))
+    return heap
+
+
+def _build_wheel(n: int, today: date):
+    wheel = DayWheel()
+    for pid, qty, expiry in _lots(n, today):
+        for day in transitions(qty, expiry, today, SOON_DAYS):
+            wheel.add(day, pid)
+    return wheel
+
+
+def _measure(build, n: int, today: date):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    queue = build(n, today)
+    elapsed = time.perf_counter() - t0
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return queue, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lots", type=int, default=1_000_000)
+    args = parser.parse_args()
+    today = datetime.utcnow().date()
+
+    print(f"{'file':<22} {'entrées':>10} {'mémoire (Mo)':>13} {'construction (s)':>17}")
+    heap, heap_mem, heap_s = _measure(_build_heap, args.lots, today)
+    print(
+        f"{'heapq (datetime,id)':<22} {len(heap):>10} {heap_mem / 1e6:>13.1f} {heap_s:>17.2f}"
+    )
+    del heap
+    wheel, wheel_mem, wheel_s = _measure(_build_wheel, args.lots, today)
+    print(
+        f"{'roue à la journée':<22} {len(wheel):>10} {wheel_mem / 1e6:>13.1f} {wheel_s:>17.2f}"
+    )
+    print(f"gain mémoire : {heap_mem / wheel_mem:.1f}x")
+
+    t0 = time.perf_counter()
+    due = wheel.pop_due(today + timedelta(days=1))
+    print(
+        f"réveil de demain : {len(due)} produits dépilés en "
+        f"{(time.perf_counter() - t0) * 1000:.1f} ms ; prochain jour={wheel.next_day()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
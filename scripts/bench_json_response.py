@@ -0,0 +1,106 @@
+"""
+Micro-benchmark : sérialisation de N lignes de lots (Decimal, date, datetime),
+ancien chemin (_plain + jsonable_encoder + JSONResponse) contre FastJSONResponse.
+
+Pas de base nécessaire.
+
+Usage :
+  python scripts/bench_json_response.py --rows 50000
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+HERE = Path(__file__).resolve()
+PROJECT_ROOT = HERE.parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import freshkeeper.responses as responses
+from freshkeeper.responses import FastJSONResponse
+
+
+def _rows(n: int):
+    base = date(2030, 1, 1)
+    now = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    return [
+        {
+            "id": i,
+            "product_id": i % 500 + 1,
+            "quantity": Decimal(i % 17) + Decimal("0.250"),
+            "unit": "pcs",
+            "expiry_date": base + timedelta(days=i % 365),
+            "storage_location_id": 1,
+            "updated_at": now,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _plain(v):
+    # copie historique de main.py
+    if isinstance(v, Decimal):
+        try:
+            return float(v)
+        except Exception:
+            return str(v)
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    return v
+
+
+def legacy(rows):
+    items = [{k: _plain(v) for k, v in r.items()} for r in rows]
+    return JSONResponse(content=jsonable_encoder(items), status_code=200).body
+
+
+def fast(rows):
+    return FastJSONResponse(rows, status_code=200).body
+
+
+def stdlib_fallback(rows):
+    return json.dumps(
+        rows, default=responses._default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _best(fn, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = _rows(args.rows)
+    assert json.loads(legacy(rows)) == json.loads(fast(rows))  # même contenu
+
+    print(f"orjson: {'oui' if responses.orjson is not None else 'non (repli json)'}")
+    base = _best(legacy, rows, args.repeat)
+    print(f"{'chemin':<34} {'ms':>8} {'gain':>7}")
+    for label, fn in (
+        ("_plain + jsonable_encoder + json", legacy),
+        ("FastJSONResponse", fast),
+        ("repli stdlib (sans orjson)", stdlib_fallback),
+    ):
+        t = _best(fn, rows, args.repeat)
+        print(f"{label:<34} {t * 1000:>8.1f} {base / t:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
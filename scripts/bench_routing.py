@@ -0,0 +1,133 @@
+"""
+Benchmark de la table de routes : coût de résolution d'un chemin, démarrage
+(import de freshkeeper.main) et génération du schéma OpenAPI.
+
+La résolution reproduit ce que fait Starlette pour chaque requête : les routes
+sont essayées dans l'ordre jusqu'à la première correspondance complète ; si
+l'app monte PathNormalizeMiddleware (freshkeeper/routing.py), la normalisation
+du chemin est comptée avec.
+
+Pas de base nécessaire (aucune requête SQL). À lancer avant et après une
+modification de main.py pour comparer.
+
+Usage :
+  python scripts/bench_routing.py
+  python scripts/bench_routing.py --rounds 20000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve()
+PROJECT_ROOT = HERE.parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+os.environ.setdefault("ENABLE_SCHEDULER", "0")
+
+# Chemins réellement appelés par les clients (formes historiques comprises)
+SAMPLES = (
+    ("GET", "/api/v1/products/"),
+    ("GET", "/api/products/12"),
+    ("GET", "/api/v1/products/12/details"),
+    ("GET", "/api/products/list"),
+    ("GET", "/api/lots"),
+    ("GET", "/api/v1/lots/grouped"),
+    ("GET", "/api/inventory/"),
+    ("GET", "/api/storage_locations"),
+    ("GET", "/storage-locations/"),
+    ("GET", "/api/categories/all"),
+    ("GET", "/api/alerts/active"),
+    ("GET", "/api/v1/ready"),
+    ("GET", "/products/suggest"),
+    ("POST", "/api/v1/lots"),
+    ("POST", "/api/products"),
+    ("GET", "/nope"),
+)
+
+
+def _resolver(app):
+    from starlette.routing import Match
+
+    normalize = None
+    for mw in app.user_middleware:
+        if getattr(mw.cls, "__name__", "") == "PathNormalizeMiddleware":
+            from freshkeeper.routing import RouteTable, normalize_path
+
+            table = RouteTable(app.router.routes)
+            normalize = lambda path, method: normalize_path(path, method, table)
+
+    routes = list(app.router.routes)
+
+    def resolve(method: str, path: str):
+        if normalize is not None:
+            path = normalize(path, method)
+        scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    return resolve
+
+
+def _count_routes(app) -> int:
+    n = 0
+    for route in app.router.routes:
+        contexts = getattr(route, "effective_route_contexts", None)
+        n += sum(1 for _ in contexts()) if contexts else 1
+    return n
+
+
+def _startup_seconds(runs: int) -> float:
+    code = "import freshkeeper.main"
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, check=True)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5000, help="par chemin")
+    parser.add_argument("--openapi", type=int, default=20, help="générations")
+    parser.add_argument("--startup", type=int, default=3, help="imports à froid")
+    args = parser.parse_args()
+
+    from freshkeeper.main import app
+
+    resolve = _resolver(app)
+    print(f"routes effectives : {_count_routes(app)}")
+    print(f"{'méthode':<7} {'chemin':<32} {'µs/résolution':>14}  route")
+    total = 0.0
+    for method, path in SAMPLES:
+        route = resolve(method, path)
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            resolve(method, path)
+        us = (time.perf_counter() - t0) / args.rounds * 1e6
+        total += us
+        name = getattr(route, "path", None) or type(route).__name__
+        print(f"{method:<7} {path:<32} {us:>14.1f}  {name if route else '404'}")
+    print(f"moyenne : {total / len(SAMPLES):.1f} µs")
+
+    times = []
+    for _ in range(args.openapi):
+        app.openapi_schema = None
+        t0 = time.perf_counter()
+        app.openapi()
+        times.append(time.perf_counter() - t0)
+    print(f"OpenAPI : {statistics.median(times) * 1000:.1f} ms (médiane)")
+    print(f"import freshkeeper.main : {_startup_seconds(args.startup) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+-- =========================================================
+-- Idempotency-Key des POST de création (freshkeeper/idempotency.py)
+-- (idempotent; safe to re-run)
+-- =========================================================
+BEGIN;
+
+-- une ligne par clé : réservation (status NULL) puis réponse stockée ;
+-- purge des lignes de plus de IDEMPOTENCY_TTL_HOURS par le scheduler
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key          TEXT PRIMARY KEY,
+  fingerprint  BYTEA NOT NULL,
+  status       SMALLINT NULL,
+  content_type TEXT NULL,
+  body         BYTEA NULL,
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- purge par date
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created_at
+  ON idempotency_keys (created_at);
+
+COMMIT;
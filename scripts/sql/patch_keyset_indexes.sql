@@ -0,0 +1,17 @@
+-- =========================================================
+-- Pagination keyset : index alignés sur l'ordre des listes
+-- (freshkeeper/pagination.py ; idempotent; safe to re-run)
+-- =========================================================
+BEGIN;
+
+-- GET /lots : DLC croissante, sans DLC en dernier, puis id
+CREATE INDEX IF NOT EXISTS ix_lots_keyset
+  ON lots ((COALESCE(expiry_date, DATE '9999-12-31')), id);
+
+-- GET /alerts : due_date NULLS LAST, puis id
+CREATE INDEX IF NOT EXISTS ix_alerts_keyset
+  ON alerts ((COALESCE(due_date, DATE '9999-12-31')), id);
+
+-- products / /api/lots / /api/alerts : ORDER BY id -> clé primaire
+
+COMMIT;
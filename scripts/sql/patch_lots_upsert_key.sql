@@ -0,0 +1,40 @@
+-- =========================================================
+-- Upsert des lots en une instruction (freshkeeper/services/lots.py)
+-- uq_lots_key NULLS NOT DISTINCT : les lots sans DLC fusionnent aussi
+-- via ON CONFLICT (PostgreSQL >= 15 ; idempotent; safe to re-run)
+-- =========================================================
+BEGIN;
+
+DO $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM pg_index
+     WHERE indexrelid = to_regclass('uq_lots_key') AND indnullsnotdistinct
+  ) THEN
+    RETURN;
+  END IF;
+
+  -- doublons sans DLC créés avant le patch : quantités regroupées sur le plus
+  -- ancien lot, alertes rattachées à celui-ci
+  CREATE TEMP TABLE lots_merge ON COMMIT DROP AS
+  SELECT id, min(id) OVER w AS keep_id, sum(quantity) OVER w AS total
+    FROM lots
+   WHERE expiry_date IS NULL
+  WINDOW w AS (PARTITION BY product_id, storage_location_id, unit_norm);
+
+  UPDATE lots l SET quantity = m.total, updated_at = now()
+    FROM lots_merge m
+   WHERE l.id = m.keep_id AND m.id = m.keep_id AND m.total <> l.quantity;
+  UPDATE alerts a SET lot_id = m.keep_id
+    FROM lots_merge m
+   WHERE a.lot_id = m.id AND m.id <> m.keep_id;
+  DELETE FROM lots l USING lots_merge m
+   WHERE l.id = m.id AND m.id <> m.keep_id;
+
+  DROP INDEX IF EXISTS uq_lots_key;
+  CREATE UNIQUE INDEX uq_lots_key
+    ON lots (product_id, expiry_date, storage_location_id, unit_norm)
+    NULLS NOT DISTINCT;
+END$$;
+
+COMMIT;
@@ -0,0 +1,61 @@
+-- =========================================================
+-- Création produit + lot initial en un appel (freshkeeper/services/products.py)
+-- Requiert uq_products_name_norm et uq_lots_key NULLS NOT DISTINCT
+-- (patch_lots_upsert_key.sql) ; idempotent; safe to re-run
+-- =========================================================
+BEGIN;
+
+CREATE OR REPLACE FUNCTION fk_product_with_lot(
+  p_name                TEXT,
+  p_category            TEXT,
+  p_with_lot            BOOLEAN,
+  p_quantity            NUMERIC,
+  p_unit                TEXT,
+  p_expiry_date         DATE,
+  p_storage_location_id INTEGER
+) RETURNS TABLE (id INTEGER, name TEXT, category TEXT, created BOOLEAN, lot_id INTEGER)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+  -- produit existant (index uq_products_name_norm) ou créé ; si un INSERT
+  -- concurrent gagne la course, ON CONFLICT attend son COMMIT et la relecture
+  -- suivante (nouvel instantané) le trouve
+  LOOP
+    SELECT p.id, p.name, p.category, FALSE
+      INTO id, name, category, created
+      FROM products p
+     WHERE p.name_normalized = lower(p_name);
+    EXIT WHEN FOUND;
+
+    INSERT INTO products AS p (name, category)
+    VALUES (p_name, p_category)
+    ON CONFLICT (name_normalized) DO NOTHING
+    RETURNING p.id, p.name, p.category, TRUE
+      INTO id, name, category, created;
+    EXIT WHEN FOUND;
+  END LOOP;
+
+  -- même upsert que freshkeeper/services/lots.py (clé uq_lots_key)
+  IF p_with_lot THEN
+    INSERT INTO lots AS l (product_id, quantity, unit, expiry_date, storage_location_id)
+    VALUES (id, p_quantity, NULLIF(btrim(p_unit), ''), p_expiry_date, p_storage_location_id)
+    ON CONFLICT (product_id, expiry_date, storage_location_id, unit_norm)
+    DO UPDATE SET quantity = l.quantity + EXCLUDED.quantity,
+                  updated_at = now()
+    RETURNING l.id INTO lot_id;
+  END IF;
+
+  -- bus d'invalidation (freshkeeper/jobs/change_bus.py), livré au COMMIT
+  IF created THEN
+    PERFORM pg_notify('freshkeeper_changes',
+                      json_build_object('table', 'products', 'keys', json_build_array(id))::text);
+  END IF;
+  IF lot_id IS NOT NULL THEN
+    PERFORM pg_notify('freshkeeper_changes',
+                      json_build_object('table', 'lots', 'keys', json_build_array(lot_id))::text);
+  END IF;
+  RETURN NEXT;
+END;
+$$;
+
+COMMIT;
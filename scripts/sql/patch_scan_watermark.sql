@@ -0,0 +1,36 @@
+-- =========================================================
+-- Scan incrémental des alertes : watermark persisté + updated_at indexés
+-- (idempotent; safe to re-run)
+-- =========================================================
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS scan_state (
+  name          TEXT PRIMARY KEY,          -- ex: 'alert_runner', 'admin_alerts_scan'
+  watermark     TIMESTAMP NULL,            -- dernier updated_at déjà traité
+  rollover_date DATE NULL,                 -- dernier jour de la passe "changement de date"
+  updated_at    TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- products : updated_at maintenu par trigger, comme lots (trg_lots_updated_at)
+ALTER TABLE products
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now();
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_trigger
+     WHERE tgname = 'trg_products_updated_at' AND tgrelid = to_regclass('products')
+  ) THEN
+    CREATE TRIGGER trg_products_updated_at
+    BEFORE UPDATE ON products
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+  END IF;
+END$$;
+
+CREATE INDEX IF NOT EXISTS ix_products_updated_at ON products(updated_at);
+CREATE INDEX IF NOT EXISTS ix_lots_updated_at ON lots(updated_at);
+CREATE INDEX IF NOT EXISTS ix_products_expiry ON products(expiry_date);
+-- passe quotidienne OUT_OF_STOCK (trunc(quantity) <= 0  <=>  quantity < 1)
+CREATE INDEX IF NOT EXISTS ix_products_out_of_stock ON products(id) WHERE quantity < 1;
+
+COMMIT;
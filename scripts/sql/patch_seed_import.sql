@@ -0,0 +1,27 @@
+-- =========================================================
+-- Colonnes du catalogue importé par scripts/seed_products.py
+-- (freshkeeper/services/seed_import.py ; lues par api/suggest.py)
+-- Requiert uq_products_name_norm ; idempotent; safe to re-run
+-- =========================================================
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS product_categories (
+  id   SERIAL PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE
+);
+
+-- durées de conservation par emplacement : {"pantry": 5, "fridge": 7, ...}
+ALTER TABLE product_categories
+  ADD COLUMN IF NOT EXISTS shelf_life JSONB;
+
+ALTER TABLE products
+  ADD COLUMN IF NOT EXISTS category    TEXT,
+  ADD COLUMN IF NOT EXISTS category_id INTEGER REFERENCES product_categories(id) ON DELETE SET NULL,
+  ADD COLUMN IF NOT EXISTS aliases     JSONB,
+  ADD COLUMN IF NOT EXISTS shelf_life  JSONB;
+
+-- rattachement des produits importés avant leur catégorie
+CREATE INDEX IF NOT EXISTS ix_products_category_unlinked
+  ON products (category) WHERE category_id IS NULL;
+
+COMMIT;
@@ -0,0 +1,61 @@
+-- =========================================================
+-- Versions de tables pour les GET conditionnels (ETag / 304)
+-- (freshkeeper/conditional.py ; idempotent; safe to re-run)
+-- =========================================================
+BEGIN;
+
+-- journal en ajout seul : une ligne par instruction d'écriture. Les écrivains
+-- ne verrouillent aucune ligne partagée (pas de sérialisation, pas de
+-- deadlock entre tables). Version d'une table = sum(weight) : nombre
+-- d'instructions validées, quel que soit l'ordre des COMMIT. Compacté (une
+-- ligne par table, même somme) par le scheduler et, dès qu'il s'allonge, par
+-- les lectures de version (freshkeeper/conditional.py).
+CREATE TABLE IF NOT EXISTS table_change_log (
+  name       TEXT NOT NULL,
+  weight     BIGINT NOT NULL DEFAULT 1,
+  changed_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS ix_table_change_log_name ON table_change_log (name);
+
+-- trigger FOR EACH STATEMENT : une ligne par INSERT/UPDATE/DELETE/TRUNCATE,
+-- quel que soit le nombre de lignes touchées
+CREATE OR REPLACE FUNCTION bump_table_change() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO table_change_log (name) VALUES (TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ancienne version : une ligne-compteur par table, mise à jour (verrouillée)
+-- par chaque écriture ; compteurs repris pour que les ETag restent valides
+DO $$
+BEGIN
+  IF to_regclass('table_changes') IS NOT NULL THEN
+    INSERT INTO table_change_log (name, weight, changed_at)
+    SELECT name, seq, changed_at FROM table_changes WHERE seq > 0;
+    DROP TABLE table_changes;
+  END IF;
+END$$;
+
+DO $$
+DECLARE
+  t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['products', 'lots', 'alerts', 'storage_locations'] LOOP
+    IF NOT EXISTS (
+      SELECT 1 FROM pg_trigger
+       WHERE tgname = 'trg_' || t || '_changes' AND tgrelid = to_regclass(t)
+    ) THEN
+      EXECUTE format(
+        'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+        'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_change()',
+        'trg_' || t || '_changes', t);
+    END IF;
+    -- ligne de départ (poids 0) : Last-Modified même sans écriture depuis
+    INSERT INTO table_change_log (name, weight)
+    SELECT t, 0 WHERE NOT EXISTS (SELECT 1 FROM table_change_log WHERE name = t);
+  END LOOP;
+END$$;
+
+COMMIT;
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import freshkeeper.database as database
+from freshkeeper.services import alert_runner
+
+# (nom, quantité, décalage DLC en jours depuis aujourd'hui ; None = pas de DLC)
+PRODUCTS = [
+    ("lait", 0, 2),  # OUT_OF_STOCK + SOON
+    ("beurre", 0.5, -1),  # int(0.5) == 0 -> OUT_OF_STOCK + EXPIRED
+    ("yaourt", 4, 0),  # EXPIRED (DLC = aujourd'hui)
+    ("jambon", 2, 3),  # SOON (borne haute)
+    ("fromage", 1, 4),  # rien
+    ("riz", None, None),  # rien
+    ("pates", -2, None),  # OUT_OF_STOCK seul
+]
+
+
+def _reset(engine, today):
+    with engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        for name, qty, offset in PRODUCTS:
+            c.execute(
+                text(
+                    "INSERT INTO products (name, quantity, expiry_date) "
+                    "VALUES (:n, :q, :e)"
+                ),
+                {
+                    "n": name,
+                    "q": qty,
+                    "e": today + timedelta(days=offset) if offset is not None else None,
+                },
+            )
+        # Ancienne alerte SOON du lait (DLC modifiée) -> doit être désactivée
+        c.execute(
+            text(
+                "INSERT INTO alerts (product_id, kind, due_date, message, is_active) "
+                "VALUES (1, 'SOON', :d, 'old', TRUE)"
+            ),
+            {"d": today + timedelta(days=1)},
+        )
+        # Alerte EXPIRED déjà présente mais inactive -> doit être réactivée (updated)
+        c.execute(
+            text(
+                "INSERT INTO alerts (product_id, kind, due_date, message, is_active) "
+                "VALUES (3, 'EXPIRED', :d, 'old', FALSE)"
+            ),
+            {"d": today},
+        )
+
+
+def _alerts(engine):
+    with engine.connect() as c:
+        return c.execute(
+            text(
+                "SELECT product_id, kind, due_date, message, is_active "
+                "FROM alerts ORDER BY product_id, kind, due_date"
+            )
+        ).all()
+
+
+def test_set_based_scan_matches_loop(pg_engine, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=pg_engine))
+    today = datetime.utcnow().date()
+
+    results = {}
+    for mode in ("loop", "set"):
+        _reset(pg_engine, today)
+        first = alert_runner.run_scan(mode=mode)
+        second = alert_runner.run_scan(mode=mode)  # tout existe déjà -> updated
+        results[mode] = (first, second, _alerts(pg_engine))
+
+    assert results["set"] == results["loop"]
+    first, second, rows = results["set"]
+    assert first == {
+        "status": "ok",
+        "created": 6,
+        "updated": 1,
+        "errors": 0,
+        "checked": len(PRODUCTS),
+    }
+    assert second["created"] == 0 and second["updated"] == 7
+    assert (1, "SOON", today + timedelta(days=1), "old", False) in rows
+
+
+def test_incremental_scan_only_rechecks_changed_products(pg_engine, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=pg_engine))
+    monkeypatch.setenv("SCAN_WATERMARK_LAG_SECONDS", "0")
+    today = datetime.utcnow().date()
+    _reset(pg_engine, today)
+
+    first = alert_runner.run_scan(mode="set", incremental=True)  # pas d'état: complet
+    assert first["checked"] == len(PRODUCTS)
+
+    idle = alert_runner.run_scan(mode="set", incremental=True)
+    assert idle["checked"] == 0 and idle["created"] == 0
+
+    with pg_engine.begin() as c:
+        c.execute(text("UPDATE products SET quantity = 0 WHERE name = 'fromage'"))
+    changed = alert_runner.run_scan(mode="set", incremental=True)
+    assert changed["checked"] == 1 and changed["created"] == 1
+
+
+def test_admin_scan_endpoint_is_incremental(pg_engine, monkeypatch):
+    """
+    POST /admin/alerts/scan (routers/maintenance.py, routeur historique non
+    monté par main.py) : testé sur une app réduite.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from routers import maintenance
+
+    monkeypatch.setenv("SCAN_WATERMARK_LAG_SECONDS", "0")
+    Session = sessionmaker(bind=pg_engine)
+
+    def get_db():
+        with Session() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(maintenance.router)
+    app.dependency_overrides[maintenance.get_db] = get_db
+    client = TestClient(app)
+    today = datetime.utcnow().date()
+    with pg_engine.begin() as c:
+        c.execute(
+            text("TRUNCATE alerts, lots, products, scan_state RESTART IDENTITY CASCADE")
+        )
+        c.execute(text("INSERT INTO products (name) VALUES ('lait')"))
+        c.execute(
+            text(
+                "INSERT INTO lots (product_id, quantity, expiry_date, storage_location_id)"
+                " VALUES (1, 1, :past, 1), (1, 1, :later, 1)"
+            ),
+            {"past": today - timedelta(days=1), "later": today + timedelta(days=10)},
+        )
+
+    def active():
+        with pg_engine.connect() as c:
+            return (
+                c.execute(text("SELECT kind FROM alerts WHERE is_active ORDER BY kind"))
+                .scalars()
+                .all()
+            )
+
+    assert client.post("/admin/alerts/scan").json()["incremental"] is False
+    assert active() == ["expiry"]
+
+    # alerte désactivée à la main, lots inchangés : le scan incrémental l'ignore
+    with pg_engine.begin() as c:
+        c.execute(text("UPDATE alerts SET is_active = FALSE"))
+        c.execute(
+            text("UPDATE lots SET expiry_date = :d WHERE id = 2"),
+            {"d": today + timedelta(days=1)},
+        )
+    assert client.post("/admin/alerts/scan").json()["incremental"] is True
+    assert active() == ["soon"]
+
+    assert client.post("/admin/alerts/scan?full=true").json()["incremental"] is False
+    assert active() == ["expiry", "soon"]
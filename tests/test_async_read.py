@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+import freshkeeper.database as database
+import freshkeeper.main as main
+from freshkeeper.routing import PathNormalizeMiddleware
+from freshkeeper.singleflight import SingleFlight
+
+pytest.importorskip("greenlet")
+
+
+@pytest.fixture()
+def async_client(pg_engine, monkeypatch):
+    """App réduite aux routes async, sur le schéma jetable de pg_engine."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from freshkeeper.routers.async_read import router
+
+    with pg_engine.connect() as c:
+        schema = c.execute(text("SELECT current_schema()")).scalar()
+    aeng = create_async_engine(
+        pg_engine.url,
+        poolclass=NullPool,  # une boucle par requête côté TestClient
+        connect_args={"options": f"-csearch_path={schema}"},
+    )
+    monkeypatch.setattr(database, "get_async_engine", lambda url=None: aeng)
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: pg_engine)
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(PathNormalizeMiddleware)
+    yield TestClient(app)
+    asyncio.run(aeng.dispose())
+
+
+def _seed(engine):
+    with engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(
+            text(
+                "INSERT INTO products (name, category, quantity) "
+                "VALUES ('lait', 'frais', 2), ('riz', 'sec', 1)"
+            )
+        )
+        c.execute(
+            text(
+                "INSERT INTO lots "
+                "(product_id, quantity, unit, expiry_date, storage_location_id) "
+                "VALUES (1, 1.5, 'l', '2030-01-01', 1), (2, 3, 'kg', NULL, 1)"
+            )
+        )
+
+
+def test_async_routes_match_sync_routes(client, async_client, pg_engine):
+    _seed(pg_engine)
+    for path in (
+        "/api/products",
+        "/api/products/?search=lait",
+        "/api/lots",
+        "/api/lots?size=1",
+        "/api/alerts",
+        "/api/products/1",
+    ):
+        sync, fast = client.get(path), async_client.get(path)
+        assert fast.status_code == sync.status_code == 200, path
+        assert fast.json() == sync.json(), path
+        assert fast.headers.get("etag") == sync.headers.get("etag"), path
+
+    assert async_client.get("/api/products/999").status_code == 404
+
+
+def test_async_route_answers_304(async_client, pg_engine):
+    _seed(pg_engine)
+    etag = async_client.get("/api/v1/lots").headers["etag"]
+    again = async_client.get("/api/v1/lots", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+def test_do_async_shares_one_execution():
+    sf = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return b"{}"
+
+    async def run():
+        return await asyncio.gather(*(sf.do_async("k", slow, "r") for _ in range(50)))
+
+    assert asyncio.run(run()) == [b"{}"] * 50
+    assert len(calls) == 1
+    assert sf.stats()["routes"]["r"]["coalesced"] == 49
+    assert sf.stats()["in_flight"] == 0
+
+
+def test_async_dashboard_summary_matches_sync(client, async_client, pg_engine):
+    from routers.dashboard import async_router
+
+    _seed(pg_engine)
+    with pg_engine.begin() as c:  # vues de master_schema_v1.sql, réduites
+        c.execute(
+            text(
+                "CREATE OR REPLACE VIEW v_lot_status AS SELECT l.*, CASE "
+                "WHEN l.expiry_date IS NULL THEN 'green' "
+                "WHEN l.expiry_date < CURRENT_DATE THEN 'red' "
+                "ELSE 'green' END AS status_color FROM lots l"
+            )
+        )
+        c.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS mv_suggested_purchases "
+                "(product_id int, name text, suggested_qty numeric)"
+            )
+        )
+    async_client.app.include_router(async_router)
+
+    sync = client.get("/api/dashboard/summary")
+    fast = async_client.get("/api/dashboard/summary")
+    assert fast.status_code == sync.status_code == 200
+    assert fast.json() == sync.json()
+    assert fast.json()["total_lots"] == 2
@@ -0,0 +1,64 @@
+from sqlalchemy import text
+
+import freshkeeper.cache as cache
+import freshkeeper.database as database
+import freshkeeper.main as main
+from freshkeeper.cache import TTLCache, reference_cache
+
+
+def test_ttl_lru_and_invalidation(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=2, ttl=10)
+
+    c.set("a", 1, tables=("products",))
+    c.set("b", 2, tables=("storage_locations",))
+    assert c.get("a") == (True, 1)  # "a" devient le plus récent
+    c.set("c", 3)
+    assert c.get("b") == (False, None)  # LRU évincé
+    assert c.stats()["evictions"] == 1
+
+    assert c.get("a", version="v2") == (False, None)  # autre version = miss
+    c.set("a", 1, tables=("products",), version="v2")
+    assert c.invalidate("products") == 1
+    assert c.get("a", version="v2") == (False, None)
+
+    now[0] += 11
+    assert c.get("c") == (False, None)  # expiré
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 4, 1)
+
+
+def test_categories_cached_and_invalidated(client, pg_engine, monkeypatch):
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: pg_engine)
+    with pg_engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(
+            text("INSERT INTO products (name, category) VALUES ('lait', 'frais')")
+        )
+
+    before = reference_cache.stats()
+    assert client.get("/api/categories").json() == [
+        {"name": "frais", "product_count": 1}
+    ]
+    assert client.get("/api/categories").json() == [
+        {"name": "frais", "product_count": 1}
+    ]
+    after = reference_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+    # écriture via l'API : hook d'invalidation
+    r = client.post("/api/products", json={"name": "riz", "category": "sec"})
+    assert r.status_code == 201
+    names = [c["name"] for c in client.get("/api/categories").json()]
+    assert names == ["frais", "sec"]
+
+    # écriture hors de ce worker (pas de hook) : la version de table a bougé
+    with pg_engine.begin() as c:
+        c.execute(text("UPDATE products SET category = 'laitier' WHERE name = 'lait'"))
+    names = [c["name"] for c in client.get("/api/categories").json()]
+    assert names == ["laitier", "sec"]
+
+    assert client.get("/admin/cache").json()["size"] >= 1
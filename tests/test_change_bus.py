@@ -0,0 +1,48 @@
+import time
+
+from freshkeeper.cache import reference_cache
+from freshkeeper.jobs.change_bus import ChangeListener, publish
+
+
+def _wait_until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_notify_evicts_matching_entries_in_other_worker(pg_engine):
+    listener = ChangeListener(pg_engine, poll_seconds=0.1)
+    listener.start()
+    try:
+        assert listener.connected.wait(5)
+        reference_cache.set("categories", ["frais"], tables=("products",))
+        reference_cache.set("product:1", {"id": 1}, tables=("products:1",))
+        reference_cache.set("product:2", {"id": 2}, tables=("products:2",))
+        reference_cache.set("storage", [], tables=("storage_locations",))
+
+        # ROLLBACK : rien n'est livré
+        with pg_engine.connect() as c:
+            publish(c, "products", [1])
+            c.rollback()
+        time.sleep(0.3)
+        assert reference_cache.get("categories")[0]
+
+        # COMMIT : listes de la table + la seule ligne 2 évincées
+        with pg_engine.begin() as c:
+            publish(c, "products", [2])
+        assert _wait_until(lambda: not reference_cache.get("product:2")[0])
+        assert not reference_cache.get("categories")[0]
+        assert reference_cache.get("product:1")[0]
+        assert reference_cache.get("storage")[0]
+
+        # sans clés : toute la table
+        with pg_engine.begin() as c:
+            publish(c, "products")
+        assert _wait_until(lambda: not reference_cache.get("product:1")[0])
+        assert listener.status()["received"] == 2
+    finally:
+        listener.stop()
+    assert not listener.connected.is_set()
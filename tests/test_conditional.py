@@ -0,0 +1,122 @@
+from sqlalchemy import text
+
+import freshkeeper.conditional as conditional
+import freshkeeper.database as database
+import freshkeeper.main as main
+
+
+def _use(engine, monkeypatch):
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: engine)
+
+
+def _seed(engine):
+    with engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(
+            text(
+                "INSERT INTO products (name, category) "
+                "VALUES ('lait', 'frais'), ('riz', 'sec')"
+            )
+        )
+
+
+def test_etag_304_and_invalidation(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    _seed(pg_engine)
+
+    for path in ("/api/products", "/api/categories", "/api/storage-locations"):
+        first = client.get(path)
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "no-cache"
+        assert "last-modified" in first.headers
+
+        again = client.get(path, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["etag"] == etag
+
+    # autre requête (filtre) => autre ETag
+    etag = client.get("/api/products").headers["etag"]
+    assert client.get("/api/products?search=lait").headers["etag"] != etag
+
+    # une écriture invalide, y compris une suppression
+    with pg_engine.begin() as c:
+        c.execute(text("DELETE FROM products WHERE name = 'riz'"))
+    changed = client.get("/api/products", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [p["name"] for p in changed.json()] == ["lait"]
+    assert changed.headers["etag"] != etag
+
+
+def test_fallback_to_updated_at_without_change_table(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    _seed(pg_engine)
+    with pg_engine.begin() as c:
+        c.execute(text("DROP TABLE table_change_log CASCADE"))
+        c.execute(text("DROP FUNCTION bump_table_change() CASCADE"))
+
+    first = client.get("/api/lots")
+    etag = first.headers["etag"]
+    assert client.get("/api/lots", headers={"If-None-Match": etag}).status_code == 304
+    with pg_engine.begin() as c:
+        c.execute(
+            text(
+                "INSERT INTO lots (product_id, quantity, storage_location_id) "
+                "VALUES (1, 2, 1)"
+            )
+        )
+    assert client.get("/api/lots", headers={"If-None-Match": etag}).status_code == 200
+
+    # storage_locations n'a pas de updated_at : pas de validateur, réponse normale
+    plain = client.get("/api/storage-locations")
+    assert plain.status_code == 200 and "etag" not in plain.headers
+    assert conditional._sources[pg_engine]["storage_locations"] is None
+
+
+def test_writers_do_not_serialize_on_version_row(pg_engine):
+    """Deux écritures concurrentes sur la même table : aucune n'attend l'autre."""
+    _seed(pg_engine)
+    before = conditional.table_versions(pg_engine, ["products"])[0]
+
+    with pg_engine.connect() as c1, pg_engine.connect() as c2:
+        c1.begin()
+        c1.execute(text("INSERT INTO products (name) VALUES ('pain')"))
+        c2.begin()
+        c2.execute(text("SET LOCAL lock_timeout = '1s'"))
+        c2.execute(text("INSERT INTO products (name) VALUES ('sel')"))
+        c2.commit()
+        after_c2 = conditional.table_versions(pg_engine, ["products"])[0]
+        c1.commit()  # validée après c2, alors qu'elle a écrit avant
+
+    after_c1 = conditional.table_versions(pg_engine, ["products"])[0]
+    assert len({tuple(before), tuple(after_c2), tuple(after_c1)}) == 3
+
+    # compactage : une ligne par table, versions inchangées
+    assert conditional.compact_table_changes(pg_engine) > 0
+    assert conditional.table_versions(pg_engine, ["products"])[0] == after_c1
+    with pg_engine.connect() as c:
+        rows = c.execute(
+            text("SELECT count(*) FROM table_change_log WHERE name = 'products'")
+        ).scalar()
+    assert rows == 1
+
+
+def test_long_log_is_compacted_by_readers(pg_engine, monkeypatch):
+    """Sans scheduler : la lecture qui somme trop de lignes compacte le journal."""
+    _use(pg_engine, monkeypatch)
+    monkeypatch.setenv("TABLE_CHANGES_COMPACT_ROWS", "5")
+    _seed(pg_engine)
+    with pg_engine.begin() as c:
+        for i in range(10):
+            c.execute(text("INSERT INTO products (name) VALUES (:n)"), {"n": f"p{i}"})
+    version = conditional.table_versions(pg_engine, ["products"])[0]
+    with conditional._compacting:  # compactage d'arrière-plan terminé
+        pass
+    with pg_engine.connect() as c:
+        rows = c.execute(
+            text("SELECT count(*) FROM table_change_log WHERE name = 'products'")
+        ).scalar()
+    assert rows == 1
+    assert conditional.table_versions(pg_engine, ["products"])[0] == version
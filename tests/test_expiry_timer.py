@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import freshkeeper.database as database
+from freshkeeper.jobs.expiry_timer import DayWheel, ExpiryTimer, transitions
+
+
+def test_transitions_and_wheel_order():
+    today = datetime.utcnow().date()
+    d = lambda n: today + timedelta(days=n)  # noqa: E731
+
+    assert transitions(5, d(10), today, 3) == [d(7), d(10)]
+    assert transitions(5, d(2), today, 3) == [d(2)]  # déjà SOON -> EXPIRED seul
+    assert transitions(0, None, today, 3) == [d(1)]  # OUT_OF_STOCK re-daté demain
+    assert transitions(5, d(-1), today, 3) == []
+
+    wheel = DayWheel()
+    for day, pid in ((d(7), 1), (d(2), 2), (d(7), 3), (d(2), 2)):
+        wheel.add(day, pid)
+    assert len(wheel) == 4 and wheel.next_day() == d(2)
+    assert wheel.pop_due(d(1)) == set()
+    assert wheel.pop_due(d(2)) == {2}
+    assert wheel.next_day() == d(7)
+    assert wheel.pop_due(d(30)) == {1, 3} and wheel.next_day() is None
+
+
+def test_timer_fires_targeted_scan(pg_engine, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=pg_engine))
+    monkeypatch.setattr(database, "get_engine", lambda url=None: pg_engine)
+    today = datetime.utcnow().date()
+    with pg_engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(
+            text(
+                "INSERT INTO products (name, quantity, expiry_date) VALUES "
+                "('lait', 0, NULL), ('jambon', 2, :far)"
+            ),
+            {"far": today + timedelta(days=10)},
+        )
+
+    timer = ExpiryTimer(BackgroundScheduler(timezone="UTC"))
+    timer.notify(1, 0, None)  # stock tombé à zéro -> réveil immédiat
+    timer.notify(2, 2, today + timedelta(days=10))
+    assert timer.wheel.next_day() == today
+    assert timer.scheduler.get_job(timer.job_id) is not None
+
+    summary = timer.fire()
+    assert summary["due"] == 1 and summary["checked"] == 1
+    assert summary["created"] == 1
+    with pg_engine.connect() as c:
+        rows = c.execute(text("SELECT product_id, kind FROM alerts")).all()
+    assert rows == [(1, "OUT_OF_STOCK")]  # jambon non réévalué
+    # prochains réveils : lait demain (re-datage), jambon à J+7 puis J+10
+    assert timer.wheel.next_day() == today + timedelta(days=1)
+
+
+def test_wheel_armed_at_election_without_startup_scan(pg_engine, monkeypatch):
+    import freshkeeper.jobs.expiry_timer as expiry_timer
+    import freshkeeper.jobs.leader as leader
+    from freshkeeper.jobs import scheduler as sched
+
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=pg_engine))
+    monkeypatch.setattr(database, "get_engine", lambda url=None: pg_engine)
+    for mod, name in (
+        (expiry_timer, "_TIMER_SINGLETON"),
+        (leader, "_LEASE_SINGLETON"),
+        (sched, "_SCHEDULER_SINGLETON"),
+    ):
+        monkeypatch.setattr(mod, name, None)
+    monkeypatch.setenv("SCAN_STRATEGY", "timer")
+    monkeypatch.setenv("SCAN_RUN_AT_STARTUP", "0")
+    today = datetime.utcnow().date()
+    with pg_engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(
+            text(
+                "INSERT INTO products (name, quantity, expiry_date) VALUES ('a', 2, :d)"
+            ),
+            {"d": today + timedelta(days=10)},
+        )
+
+    scheduler = sched.build_scheduler()
+    try:
+        # élu au premier heartbeat : chargement de la roue planifié, sans scan
+        job = scheduler.get_job("leader_catchup")
+        assert job is not None and job.kwargs == {"scan": False}
+        job.func(*job.args, **job.kwargs)
+        timer = expiry_timer.get_expiry_timer()
+        assert timer.wheel.next_day() == today + timedelta(days=7)
+        assert scheduler.get_job(timer.job_id) is not None
+        with pg_engine.connect() as c:
+            assert c.execute(text("SELECT count(*) FROM alerts")).scalar() == 0
+    finally:
+        sched.shutdown_scheduler()
+
+
+def test_leader_schedules_products_written_by_other_workers(pg_engine, monkeypatch):
+    import freshkeeper.jobs.expiry_timer as expiry_timer
+    from freshkeeper.jobs.change_bus import dispatch
+
+    monkeypatch.setattr(database, "get_engine", lambda url=None: pg_engine)
+    today = datetime.utcnow().date()
+    with pg_engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(
+            text(
+                "INSERT INTO products (name, quantity, expiry_date) VALUES "
+                "('lait', 0, NULL), ('jambon', 2, :far)"
+            ),
+            {"far": today + timedelta(days=10)},
+        )
+    timer = ExpiryTimer(BackgroundScheduler(timezone="UTC"))
+    monkeypatch.setattr(expiry_timer, "_TIMER_SINGLETON", timer)
+
+    # NOTIFY publié par l'écriture d'un standby, reçu par le leader
+    dispatch('{"table": "lots", "keys": [1]}')
+    assert timer.wheel.next_day() is None
+    dispatch('{"table": "products", "keys": [1, 2]}')
+    assert timer.wheel.next_day() == today  # stock nul : réveil immédiat
+    assert timer.scheduler.get_job(timer.job_id) is not None
+    assert timer.wheel.pop_due(today) == {1}
+    assert timer.wheel.pop_due(today + timedelta(days=7)) == {1, 2}
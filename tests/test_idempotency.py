@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import freshkeeper.database as database
+import freshkeeper.main as main
+from freshkeeper.idempotency import IdempotencyMiddleware, purge_expired
+
+
+def _use(engine, monkeypatch):
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: engine)
+
+
+def _lot_quantity(engine):
+    with engine.connect() as c:
+        return c.execute(text("SELECT sum(quantity) FROM lots")).scalar()
+
+
+def test_retried_lot_post_is_applied_once(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    with pg_engine.begin() as c:
+        pid = c.execute(
+            text("INSERT INTO products (name) VALUES ('lait') RETURNING id")
+        ).scalar_one()
+    body = {"product_id": pid, "quantity": 2, "storage_location_id": 1}
+    headers = {"Idempotency-Key": "retry-1", "X-Client-Id": "mobile-1"}
+
+    first = client.post("/lots", json=body, headers=headers)
+    # rejeu servi par un autre worker : pas de cache mémoire, lecture en base
+    main.app.middleware_stack = None
+    replays = [client.post("/lots", json=body, headers=headers) for _ in range(3)]
+
+    assert first.status_code == 201 and "idempotent-replayed" not in first.headers
+    for r in replays:
+        assert r.status_code == 201 and r.json() == first.json()
+        assert r.headers["idempotent-replayed"] == "true"
+    assert _lot_quantity(pg_engine) == 2
+
+    # même clé, autre corps : refusé
+    other = client.post("/lots", json={**body, "quantity": 5}, headers=headers)
+    assert other.status_code == 422
+    # sans clé : comportement inchangé (upsert cumulatif)
+    client.post("/lots", json=body)
+    assert _lot_quantity(pg_engine) == 4
+
+
+def _app(release: threading.Event, calls: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/things")
+    async def create(request: Request):
+        calls.append(await request.json())
+        await asyncio.to_thread(release.wait, 5)
+        return {"n": len(calls)}
+
+    @app.post("/boom")
+    def boom():
+        calls.append("boom")
+        return JSONResponse({"detail": "down"}, status_code=503)
+
+    app.add_middleware(IdempotencyMiddleware)
+    return app
+
+
+def test_in_flight_conflict_errors_release_and_purge(pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    release, calls = threading.Event(), []
+    client = TestClient(_app(release, calls))
+    headers = {"Idempotency-Key": "slow", "X-Client-Id": "mobile-1"}
+
+    t = threading.Thread(
+        target=client.post,
+        args=("/things",),
+        kwargs={"json": {"a": 1}, "headers": headers},
+    )
+    t.start()
+    while not calls:
+        time.sleep(0.01)
+    busy = client.post("/things", json={"a": 1}, headers=headers)
+    assert busy.status_code == 409 and busy.headers["retry-after"] == "1"
+    release.set()
+    t.join()
+    assert client.post("/things", json={"a": 1}, headers=headers).json() == {"n": 1}
+    assert len(calls) == 1
+
+    # 5xx : clé libérée, le rejeu réexécute
+    for _ in range(2):
+        r = client.post(
+            "/boom", headers={"Idempotency-Key": "boom", "X-Client-Id": "mobile-1"}
+        )
+        assert r.status_code == 503
+    assert calls.count("boom") == 2
+
+    long_key = {"Idempotency-Key": "x" * 300}
+    assert client.post("/things", headers=long_key).status_code == 400
+
+    with pg_engine.begin() as c:
+        c.execute(
+            text("UPDATE idempotency_keys SET created_at = now() - interval '2 days'")
+        )
+    assert purge_expired(pg_engine) == 1
+
+
+def test_keys_are_scoped_per_client(pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    release, calls = threading.Event(), []
+    release.set()
+    client = TestClient(_app(release, calls))
+
+    def post(**headers):
+        return client.post(
+            "/things", json={"a": 1}, headers={"Idempotency-Key": "k1", **headers}
+        )
+
+    alice = post(Authorization="Bearer alice")
+    bob = post(Authorization="Bearer bob")
+    device = post(**{"X-Client-Id": "tablette"})
+    assert [alice.json(), bob.json(), device.json()] == [{"n": 1}, {"n": 2}, {"n": 3}]
+    assert "idempotent-replayed" not in bob.headers
+
+    again = post(Authorization="Bearer alice")
+    assert again.json() == {"n": 1} and again.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 3
+
+    # anonyme : pas de portée commune, chaque requête passe telle quelle
+    assert [post().json(), post().json()] == [{"n": 4}, {"n": 5}]
@@ -0,0 +1,30 @@
+import random
+
+from freshkeeper.jobs import leader as leader_mod
+from freshkeeper.jobs.leader import ROLE_LEADER, ROLE_STANDBY, LeaderLease
+
+
+def test_single_leader_and_failover(pg_engine, monkeypatch):
+    key = random.randint(1, 2**31 - 1)  # pas de collision avec un scheduler réel
+    a = LeaderLease(pg_engine, key=key)
+    b = LeaderLease(pg_engine, key=key)
+    elected = []
+    b.on_elected = lambda: elected.append("b")
+
+    assert a.heartbeat() is True and a.role == ROLE_LEADER
+    assert b.heartbeat() is False and b.role == ROLE_STANDBY
+    assert a.heartbeat() is True  # renouvellement du bail
+    assert b.status()["holder_pid"] == a.status()["holder_pid"] is not None
+
+    monkeypatch.setattr(leader_mod, "_LEASE_SINGLETON", b)
+    calls = []
+    job = leader_mod.leader_only(lambda: calls.append(1))
+    job()
+    assert calls == []  # standby : job ignoré
+
+    a.release()  # arrêt du worker leader
+    assert b.heartbeat() is True and elected == ["b"]
+    job()
+    assert calls == [1]
+    assert a.heartbeat() is False and a.role == ROLE_STANDBY
+    b.release()
@@ -0,0 +1,122 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import text
+
+import freshkeeper.database as database
+import freshkeeper.main as main
+from freshkeeper.query_stats import capture_queries
+from freshkeeper.services.lots import upsert_lot
+
+N = 50
+
+
+def _use(engine, monkeypatch):
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: engine)
+
+
+def _product(engine) -> int:
+    with engine.begin() as c:
+        return c.execute(
+            text("INSERT INTO products (name) VALUES ('lait') RETURNING id")
+        ).scalar_one()
+
+
+def _lots(engine, product_id):
+    with engine.connect() as c:
+        return c.execute(
+            text("SELECT quantity, unit FROM lots WHERE product_id = :p"),
+            {"p": product_id},
+        ).all()
+
+
+def test_upsert_single_round_trip_and_null_keys(pg_engine):
+    pid = _product(pg_engine)
+    with pg_engine.begin() as c, capture_queries() as stats:
+        first = upsert_lot(c, product_id=pid, quantity=1, storage_location_id=1)
+        again = upsert_lot(
+            c, product_id=pid, quantity=2, storage_location_id=1, unit=" "
+        )
+    # sans DLC ni unité : même lot (uq_lots_key NULLS NOT DISTINCT, unit_norm)
+    assert stats.count == 2
+    assert again["id"] == first["id"] and again["quantity"] == Decimal("3")
+    assert _lots(pg_engine, pid) == [(Decimal("3"), None)]
+
+
+def test_parallel_posts_same_key(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    pid = _product(pg_engine)
+    body = {
+        "product_id": pid,
+        "quantity": 1.5,
+        "unit": "kg",
+        "expiry_date": "2030-01-01",
+        "storage_location_id": 1,
+    }
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(pool.map(lambda _: client.post("/lots", json=body), range(N)))
+    elapsed = time.perf_counter() - t0
+
+    assert {r.status_code for r in responses} == {201}
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert max(r.json()["quantity"] for r in responses) == 1.5 * N
+    assert _lots(pg_engine, pid) == [(Decimal("1.5") * N, "kg")]
+    print(f"\n{N} POST /lots concurrents : {N / elapsed:.0f} req/s")
+
+
+def test_parallel_upserts_lose_no_quantity(pg_engine):
+    pid = _product(pg_engine)
+
+    def add(_):
+        with pg_engine.begin() as c:
+            return upsert_lot(c, product_id=pid, quantity=1, storage_location_id=1)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        rows = list(pool.map(add, range(N)))
+    elapsed = time.perf_counter() - t0
+
+    # chaque upsert voit le total courant : les quantités renvoyées sont 1..N
+    assert sorted(r["quantity"] for r in rows) == list(range(1, N + 1))
+    assert _lots(pg_engine, pid) == [(Decimal(N), None)]
+    print(f"\n{N} upserts concurrents : {N / elapsed:.0f} upserts/s")
+
+
+def test_bulk_endpoint_merges_and_keeps_input_order(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    pid = _product(pg_engine)
+    client.post(
+        "/lots", json={"product_id": pid, "quantity": 1, "storage_location_id": 1}
+    )
+    lots = [
+        {"product_id": pid, "quantity": 2, "storage_location_id": 1},
+        {"product_id": pid, "quantity": 1, "unit": "kg", "storage_location_id": 1},
+        {"product_id": pid, "quantity": 3, "unit": "", "storage_location_id": 1},
+    ]
+
+    with capture_queries() as stats:
+        r = client.post("/api/v1/lots/bulk", json={"lots": lots})
+    assert r.status_code == 201, r.text
+    assert stats.count <= 3  # upsert + publication du changement
+    body = r.json()
+    assert body["count"] == 3
+    first, kg, third = body["lots"]
+    assert first["id"] == third["id"] and first["quantity"] == 6.0
+    assert not first["created"] and kg["created"] and kg["unit"] == "kg"
+    assert sorted(_lots(pg_engine, pid)) == [(Decimal("1"), "kg"), (Decimal("6"), None)]
+
+
+def test_bulk_endpoint_is_all_or_nothing(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    pid = _product(pg_engine)
+    ok = {"product_id": pid, "quantity": 1, "storage_location_id": 1}
+
+    r = client.post("/lots/bulk", json=[ok, {**ok, "product_id": pid + 1000}])
+    assert r.status_code == 409
+    assert client.post("/lots/bulk", json=[ok, {"quantity": 1}]).status_code == 422
+    assert client.post("/lots/bulk", json={"lots": []}).status_code == 400
+    assert _lots(pg_engine, pid) == []
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from freshkeeper.metrics import (
+    HttpMetrics,
+    MetricsMiddleware,
+    canonical_route,
+    render_prometheus,
+)
+
+
+def _app(metrics: HttpMetrics) -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/products/")
+    def list_products():
+        return [{"id": 1}]
+
+    @router.get("/products/{product_id}")
+    def get_product(product_id: int):
+        return {"id": product_id}
+
+    app = FastAPI()
+    for prefix in ("", "/api", "/api/v1"):
+        app.include_router(router, prefix=prefix)
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    return app
+
+
+def test_canonical_route():
+    assert canonical_route("/api/v1/products/") == "/products"
+    assert canonical_route("/api/products/{product_id}") == "/products/{product_id}"
+    assert canonical_route("/apis") == "/apis"
+    assert canonical_route("/api") == "/"
+
+
+def test_aliases_grouped_under_one_series():
+    metrics = HttpMetrics()
+    client = TestClient(_app(metrics))
+    for path in ("/products/", "/api/products/", "/api/v1/products/"):
+        assert client.get(path).status_code == 200
+    client.get("/api/products/7")
+    client.get("/api/products/abc")  # 422
+    client.get("/nope")
+
+    keys = {(m, r) for m, r, _ in metrics.series}
+    assert keys == {
+        ("GET", "/products"),
+        ("GET", "/products/{product_id}"),
+        ("GET", "<unmatched>"),
+    }
+    listing = next(s for (m, r, h), s in metrics.series.items() if r == "/products")
+    assert listing.latency.count == 3 and listing.statuses == {200: 3}
+    assert listing.size.sum == 3 * len(b'[{"id":1}]')
+    detail = next(s for k, s in metrics.series.items() if k[1].endswith("}"))
+    assert detail.statuses == {200: 1, 422: 1}
+    assert metrics.in_flight == {"GET": 0}
+
+
+def test_prometheus_exposition():
+    metrics = HttpMetrics()
+    client = TestClient(_app(metrics))
+    client.get("/api/v1/products/")
+    text = render_prometheus(metrics)
+
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    line = next(
+        l
+        for l in text.splitlines()
+        if l.startswith("http_requests_total{") and 'route="/products"' in l
+    )
+    assert 'status="200"' in line and line.endswith(" 1")
+    assert 'list_products",status' in line
+    buckets = [
+        l
+        for l in text.splitlines()
+        if l.startswith("http_request_duration_seconds_bucket")
+        and 'route="/products"' in l
+    ]
+    assert buckets[-1].endswith(" 1") and 'le="+Inf"' in buckets[-1]
+    assert "# TYPE db_pool_wait_seconds histogram" in text
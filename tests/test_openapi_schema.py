@@ -0,0 +1,48 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from freshkeeper.openapi_schema import export, install_openapi_cache
+
+
+def _app():
+    app = FastAPI(title="t")
+
+    @app.get("/products")
+    def list_products():
+        return []
+
+    return app
+
+
+def test_schema_built_once_and_served_with_etag(monkeypatch):
+    app = _app()
+    cache = install_openapi_cache(app, schema_file="")
+    calls = []
+    generate = app.openapi
+    monkeypatch.setattr(app, "openapi", lambda: calls.append(1) or generate())
+    client = TestClient(app)
+
+    first = client.get("/openapi.json")
+    again = client.get("/openapi.json")
+    assert first.status_code == again.status_code == 200
+    assert first.content == again.content and len(calls) == 1
+    assert "/products" in first.json()["paths"]
+    assert first.headers["etag"] == cache.build()[1]
+
+    r = client.get("/openapi.json", headers={"If-None-Match": first.headers["etag"]})
+    assert r.status_code == 304 and r.content == b""
+    assert client.get("/docs").status_code == 200
+
+
+def test_export_offline_and_precomputed_file(tmp_path):
+    schema = export(_app(), tmp_path / "openapi.json", tmp_path / "api.yaml")
+    assert json.loads((tmp_path / "openapi.json").read_text()) == schema
+    assert "/products:" in (tmp_path / "api.yaml").read_text()
+
+    # schéma exporté au build : servi tel quel, sans génération
+    app = FastAPI()
+    install_openapi_cache(app, schema_file=str(tmp_path / "openapi.json"))
+    r = TestClient(app).get("/openapi.json")
+    assert r.content == (tmp_path / "openapi.json").read_bytes()
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from freshkeeper.pagination import PageParams, encode_cursor, fetch_page
+from routers.lots import LOT_KEYS
+
+COLUMNS = "id, product_id, quantity, unit, expiry_date, storage_location_id"
+
+
+def _seed(engine, n):
+    base = date(2030, 1, 1)
+    with engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(text("INSERT INTO products (name) VALUES ('lait')"))
+        for i in range(n):
+            # DLC en désordre, avec doublons et NULL (ordre secondaire par id)
+            expiry = None if i % 5 == 0 else base + timedelta(days=(i * 7) % 4)
+            c.execute(
+                text(
+                    "INSERT INTO lots (product_id, quantity, unit, expiry_date, "
+                    "storage_location_id) VALUES (1, 1, :u, :e, 1)"
+                ),
+                {"u": f"u{i}", "e": expiry},
+            )
+
+
+def test_keyset_pages_match_legacy_order(pg_engine):
+    _seed(pg_engine, 23)
+    with pg_engine.connect() as c:
+        legacy, meta = fetch_page(c, "lots", COLUMNS, LOT_KEYS, PageParams())
+        assert meta == {} and len(legacy) == 23
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, meta = fetch_page(
+                c, "lots", COLUMNS, LOT_KEYS, PageParams(size=5, cursor=cursor)
+            )
+            seen += rows
+            pages += 1
+            cursor = meta["next_cursor"]
+            if cursor is None:
+                break
+        assert pages == 5 and seen == legacy
+        assert legacy[-1]["expiry_date"] is None  # NULLS LAST conservé
+
+        # accès direct page N (client mobile) = même découpage
+        rows, meta = fetch_page(
+            c, "lots", COLUMNS, LOT_KEYS, PageParams(size=5, page=3, total="exact")
+        )
+        assert rows == legacy[10:15] and meta["total"] == 23 and meta["page"] == 3
+
+        _, meta = fetch_page(
+            c, "lots", COLUMNS, LOT_KEYS, PageParams(size=5, total="estimate")
+        )
+        assert isinstance(meta["total"], int)
+
+
+def test_invalid_cursor_is_400(pg_engine):
+    with pg_engine.connect() as c:
+        for bad in ("not-base64!", encode_cursor([1])):  # arité incorrecte
+            with pytest.raises(HTTPException) as exc:
+                fetch_page(c, "lots", COLUMNS, LOT_KEYS, PageParams(size=5, cursor=bad))
+            assert exc.value.status_code == 400
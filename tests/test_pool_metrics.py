@@ -0,0 +1,84 @@
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from freshkeeper.jobs.scheduler import _TrackedScheduler
+from freshkeeper.pool_metrics import (
+    Histogram,
+    InstrumentedQueuePool,
+    db_origin,
+    instrument,
+    pool_metrics,
+)
+
+
+def test_histogram_buckets_and_quantiles():
+    h = Histogram(buckets=(1, 10, 100))
+    for v in (0.5, 5, 5, 50, 500):
+        h.observe(v)
+    snap = h.snapshot()
+    assert snap["buckets"] == {"1": 1, "10": 3, "100": 4, "+Inf": 5}
+    assert snap["count"] == 5
+    assert snap["p50"] == 10
+    assert snap["p99"] == float("inf")
+
+
+def test_pool_events_wait_and_origins(pg_engine):
+    eng = create_engine(
+        pg_engine.url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_logging_name="test-pool-metrics",
+    )
+    instrument(eng, "test-pool-metrics")
+    try:
+        held = threading.Event()
+
+        def hold():
+            with db_origin("scheduler:retention"):
+                with eng.connect() as c:
+                    c.execute(text("SELECT 1"))
+                    held.set()
+                    time.sleep(0.2)
+
+        t = threading.Thread(target=hold)
+        t.start()
+        held.wait(5)
+        stats = _stats("test-pool-metrics")
+        assert stats["checked_out"] == 1 and stats["saturation"] == 1.0
+        with eng.connect() as c:  # attend la libération : pool de 1
+            c.execute(text("SELECT 1"))
+        t.join()
+
+        stats = _stats("test-pool-metrics")
+        assert stats["counters"]["checkouts"] == 2
+        assert stats["counters"]["checkins"] == 2
+        assert stats["counters"]["connects"] == 1  # connexion réutilisée
+        assert stats["wait_ms"]["p99"] >= 100
+        assert stats["origins"]["scheduler:retention"]["checkouts"] == 1
+        assert stats["origins"]["app"]["checkouts"] == 1
+        assert pool_metrics()["scheduler"]["jobs"]["retention"]["checkouts"] == 1
+
+        eng.dispose()  # le pool recréé garde ses métriques
+        with eng.connect() as c:
+            c.execute(text("SELECT 1"))
+        stats = _stats("test-pool-metrics")
+        assert stats["counters"]["connects"] == 2
+        assert stats["counters"]["closes"] == 1
+        assert stats["wait_ms"]["count"] == 3
+    finally:
+        eng.dispose()
+
+
+def test_scheduler_jobs_are_tagged():
+    from freshkeeper.pool_metrics import _origin
+
+    scheduler = _TrackedScheduler()
+    job = scheduler.add_job(func=_origin.get, trigger="interval", hours=1, id="scan")
+    assert job.func() == "scheduler:scan"
+
+
+def _stats(name):
+    return next(e for e in pool_metrics()["engines"] if e["name"] == name)
@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+import freshkeeper.database as database
+import freshkeeper.main as main
+import freshkeeper.services.products as products
+from freshkeeper.query_stats import capture_queries
+from freshkeeper.services.products import create_product_with_lot
+
+N = 10  # < taille du pool de pg_engine (5 + 10) : toutes au rendez-vous
+
+
+def _use(engine, monkeypatch):
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: engine)
+
+
+def _state(engine):
+    with engine.connect() as c:
+        names = c.execute(text("SELECT name FROM products")).scalars().all()
+        lots = c.execute(text("SELECT product_id, quantity FROM lots")).all()
+    return names, lots
+
+
+def test_create_product_and_lot_in_one_round_trip(client, pg_engine, monkeypatch):
+    _use(pg_engine, monkeypatch)
+    body = {"name": "Lait", "category": "frais", "quantity": 2}
+
+    with capture_queries() as stats:
+        first = client.post("/api/products", json=body)
+    assert first.status_code == 201
+    # + to_regprocedure, une fois par engine
+    assert stats.count == 2
+
+    with capture_queries() as stats:
+        again = client.post("/api/products/create", json={**body, "name": "LAIT"})
+    assert stats.count == 1
+    assert again.json()["id"] == first.json()["id"]
+    assert again.json()["created_lot_id"] == first.json()["created_lot_id"]
+    assert _state(pg_engine) == (["Lait"], [(first.json()["id"], Decimal("4"))])
+
+    # sans champ de lot : produit seul
+    riz = client.post("/api/products", json={"name": "riz"}).json()
+    assert riz["created_lot_id"] is None
+
+
+@pytest.mark.parametrize("with_function", [True, False])
+def test_concurrent_creates_of_same_name(pg_engine, monkeypatch, with_function):
+    if not with_function:
+        monkeypatch.setattr(products, "_has_function", lambda conn: False)
+    barrier = threading.Barrier(N)
+
+    def create(i):
+        with pg_engine.begin() as c:
+            barrier.wait(10)
+            return create_product_with_lot(
+                c,
+                name="Yaourt" if i % 2 else "yaourt",
+                with_lot=True,
+                quantity=1,
+            )
+
+    with ThreadPoolExecutor(max_workers=N) as pool:
+        results = list(pool.map(create, range(N)))
+
+    assert len({r["id"] for r in results}) == 1
+    assert sum(r["created"] for r in results) == 1
+    names, lots = _state(pg_engine)
+    assert len(names) == 1 and lots == [(results[0]["id"], Decimal(N))]
@@ -0,0 +1,83 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import freshkeeper.database as database
+import freshkeeper.main as main
+import freshkeeper.query_stats as query_stats
+from freshkeeper.query_stats import QueryStatsMiddleware, fingerprint, normalize_sql
+
+
+def _use(engine, monkeypatch):
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", lambda url=None: engine)
+
+
+def test_fingerprint_ignores_literals_and_params():
+    a = "SELECT * FROM lots WHERE product_id = 12 AND unit = 'kg'"
+    b = "SELECT *  FROM lots\n WHERE product_id = 7 AND unit = 'g'"
+    assert fingerprint(a) == fingerprint(b)
+    assert normalize_sql("SELECT x FROM t WHERE id IN (%s, %s, %s)") == (
+        "SELECT x FROM t WHERE id IN (?+)"
+    )
+    assert "::date" in normalize_sql("SELECT :d::date")
+    assert fingerprint(a) != fingerprint("SELECT * FROM products WHERE id = 1")
+
+
+def test_request_count_header_and_n_plus_one_warning(pg_engine, monkeypatch, caplog):
+    monkeypatch.setenv("QUERY_COUNT_WARN", "3")
+    app = FastAPI()
+
+    @app.get("/n-plus-one")
+    def n_plus_one():
+        with pg_engine.connect() as c:
+            ids = c.execute(text("SELECT generate_series(1, 4)")).scalars().all()
+            for i in ids:
+                c.execute(text("SELECT :i + 1"), {"i": i})
+        return {"n": len(ids)}
+
+    app.add_middleware(QueryStatsMiddleware, header=True)
+    with caplog.at_level(logging.WARNING, logger="freshkeeper.query_stats"):
+        r = TestClient(app).get("/n-plus-one")
+
+    assert r.headers["x-db-queries"] == "5"
+    assert r.headers["server-timing"].startswith('db;desc="5 queries";dur=')
+    warning = next(m for m in caplog.messages if "/n-plus-one" in m)
+    assert "5 requêtes SQL" in warning and "4 x SELECT ? + ?" in warning
+
+
+def test_slow_queries_logged_by_fingerprint(pg_engine, monkeypatch, caplog):
+    monkeypatch.setattr(query_stats, "_SLOW_MS", 0.0)
+    query_stats.reset_slow_queries()
+    with caplog.at_level(logging.WARNING, logger="freshkeeper.query_stats"):
+        with pg_engine.connect() as c:
+            for i in range(3):
+                c.execute(text("SELECT pg_sleep(0.001), :i"), {"i": i})
+
+    fp = fingerprint("SELECT pg_sleep(0.001), :i")
+    entry = next(
+        q for q in query_stats.slow_queries()["queries"] if q["fingerprint"] == fp
+    )
+    assert entry["count"] == 3 and entry["max_ms"] > 0
+    assert any(fp in m for m in caplog.messages)
+    query_stats.reset_slow_queries()
+
+
+def test_query_budget(client, pg_engine, monkeypatch, query_budget):
+    _use(pg_engine, monkeypatch)
+    with pg_engine.begin() as c:
+        c.execute(text("INSERT INTO products (name) VALUES ('lait'), ('riz')"))
+
+    # présence de table_change_log, versions des tables (ETag), page
+    with query_budget(3) as stats:
+        assert client.get("/api/products").status_code == 200
+    assert stats.count == 3
+
+    with pytest.raises(AssertionError, match="budget de 1"):
+        with query_budget(1):
+            with pg_engine.connect() as c:
+                c.execute(text("SELECT 1"))
+                c.execute(text("SELECT 2"))
@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import freshkeeper.database as database
+import freshkeeper.main as main
+import freshkeeper.replicas as replicas
+from freshkeeper.replicas import ReplicaSet
+
+REPLICA_URL = "postgresql+psycopg://replica.test/frigoapp"
+DEAD_URL = "postgresql+psycopg://postgres@/fk_absente?host=/nonexistent"
+
+
+@pytest.fixture()
+def replica_engine(pg_engine):
+    """Second schéma du même serveur, tenant lieu de réplica (données distinctes)."""
+    with pg_engine.connect() as c:
+        primary_schema = c.execute(text("SELECT current_schema()")).scalar()
+    schema = primary_schema + "_ro"
+    with pg_engine.begin() as c:
+        c.execute(text(f"CREATE SCHEMA {schema}"))
+        c.execute(
+            text(
+                f"CREATE TABLE {schema}.products (id serial PRIMARY KEY, name text, "
+                "category text, unit text, quantity numeric, expiry_date date, "
+                "location text)"
+            )
+        )
+        c.execute(text(f"INSERT INTO {schema}.products (name) VALUES ('réplica')"))
+    eng = create_engine(
+        pg_engine.url, connect_args={"options": f"-csearch_path={schema}"}
+    )
+    yield eng
+    eng.dispose()
+    with pg_engine.begin() as c:
+        c.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+
+@pytest.fixture()
+def routed(pg_engine, replica_engine, monkeypatch):
+    real_get_engine = database.get_engine
+    engines = {REPLICA_URL: replica_engine}
+
+    def get_engine(url=None):
+        if url in engines:
+            return engines[url]
+        if url == DEAD_URL:
+            return real_get_engine(url)
+        return pg_engine
+
+    for mod in (database, main):
+        monkeypatch.setattr(mod, "get_engine", get_engine)
+    monkeypatch.setattr(replicas, "_REPLICAS", None)
+    with pg_engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(text("INSERT INTO products (name) VALUES ('primaire')"))
+    return monkeypatch
+
+
+def _names(response):
+    return [p["name"] for p in response.json()]
+
+
+def test_reads_go_to_replica_writes_to_primary(client, routed):
+    routed.setenv("DATABASE_READ_URLS", REPLICA_URL)
+    assert _names(client.get("/api/products")) == ["réplica"]
+
+    # une écriture réussie pose fk_rw : relecture sur le primaire
+    write = client.post("/admin/cache/clear")
+    assert "fk_rw=" in write.headers["set-cookie"]
+    assert _names(client.get("/api/products")) == ["primaire"]
+
+    client.cookies.clear()
+    assert _names(client.get("/api/products")) == ["réplica"]
+
+
+def test_unhealthy_replica_falls_back_to_primary(client, routed):
+    routed.setenv("DATABASE_READ_URLS", f"{DEAD_URL},{REPLICA_URL}")
+    seen = {tuple(_names(client.get("/api/products"))) for _ in range(4)}
+    assert seen == {("réplica",)}  # l'autre réplica est écarté
+
+    routed.setenv("DATABASE_READ_URLS", DEAD_URL)
+    assert _names(client.get("/api/products")) == ["primaire"]
+    status = client.get("/admin/replicas").json()
+    assert status["replicas"][0]["healthy"] is False
+    assert status["primary_fallbacks"] >= 1
+
+
+def test_without_replicas_everything_reads_primary(client, routed):
+    routed.delenv("DATABASE_READ_URLS", raising=False)
+    assert _names(client.get("/api/products")) == ["primaire"]
+    assert "set-cookie" not in client.post("/admin/cache/clear").headers
+
+
+def test_dashboard_reads_replica(client, routed):
+    import routers.dashboard as dashboard
+
+    def summary(db):
+        # nom du produit lu, pour savoir quelle base a répondu
+        name = db.execute(text("SELECT name FROM products")).scalar()
+        return {
+            "total_products": 1,
+            "total_lots": 0,
+            "expired_count": 0,
+            "soon_count": 0,
+            "green_count": 0,
+            "need_to_buy_count": 0,
+            "nearest_expiry": name,
+        }
+
+    def read():
+        return client.get("/api/dashboard/summary").json()["nearest_expiry"]
+
+    routed.setattr(dashboard, "_summary", summary)
+    routed.setenv("DATABASE_READ_URLS", REPLICA_URL)
+    assert read() == "réplica"
+    client.post("/admin/cache/clear")  # fk_rw : relecture sur le primaire
+    assert read() == "primaire"
+    client.cookies.clear()
+
+
+def test_round_robin_and_lag(monkeypatch):
+    rs = ReplicaSet(["a", "b"], check_seconds=60, max_lag_seconds=5)
+    lags = {"a": 0.0, "b": 0.0}
+
+    def probe(url):
+        h = rs._health[url]
+        h.lag_seconds = lags[url]
+        if h.lag_seconds > rs.max_lag_seconds:
+            rs.mark_down(url, "retard")
+            return False
+        return True
+
+    monkeypatch.setattr(rs, "healthy", probe)
+    assert [rs.pick() for _ in range(4)] == ["a", "b", "a", "b"]
+    lags["b"] = 30.0
+    assert [rs.pick() for _ in range(3)] == ["a", "a", "a"]
+    lags["a"] = 30.0
+    assert rs.pick() is None
+    assert rs.primary_fallbacks == 1
+
+
+def test_probe_runs_off_event_loop(client, routed):
+    """Sonde (connexion bloquante) dans le threadpool, jamais sur la boucle."""
+    routed.setenv("DATABASE_READ_URLS", REPLICA_URL)
+    rs = replicas.get_replicas()
+    probe = rs._probe
+    on_loop = []
+
+    def spy(url):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        probe(url)
+
+    routed.setattr(rs, "_probe", spy)
+    assert _names(client.get("/api/products")) == ["réplica"]
+    assert _names(client.get("/api/products")) == ["réplica"]  # état en cache
+    assert on_loop == [False]
+
+
+def test_async_engine_failover_hook(routed):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    rs = ReplicaSet([DEAD_URL])
+    aeng = create_async_engine(DEAD_URL)
+    rs.watch(DEAD_URL, aeng.sync_engine)
+    rs.watch(DEAD_URL, aeng.sync_engine)  # une seule fois par engine
+
+    async def read():
+        async with aeng.connect() as c:
+            await c.execute(text("SELECT 1"))
+
+    with pytest.raises(Exception):
+        asyncio.run(read())
+    assert rs.healthy(DEAD_URL) is False
+    assert rs.status()["replicas"][0]["failures"] == 1
+    asyncio.run(aeng.dispose())
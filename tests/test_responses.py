@@ -0,0 +1,39 @@
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from freshkeeper import responses
+from freshkeeper.responses import FastJSONResponse
+
+ROW = {
+    "id": 1,
+    "quantity": Decimal("2.500"),
+    "expiry_date": date(2030, 1, 2),
+    "updated_at": datetime(2026, 1, 1, 12, 0, 0, 123456),
+    "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    "unit": "pièce",
+    "note": None,
+}
+
+
+def _legacy(content):
+    # ancien chemin : _plain (Decimal -> float) + jsonable_encoder + JSONResponse
+    plain = {k: float(v) if isinstance(v, Decimal) else v for k, v in content.items()}
+    return JSONResponse(content=jsonable_encoder(plain)).body
+
+
+def test_fast_response_matches_legacy_output():
+    body = FastJSONResponse([ROW]).body
+    assert json.loads(body) == [json.loads(_legacy(ROW))]
+    assert json.loads(body)[0]["quantity"] == 2.5
+    assert json.loads(body)[0]["created_at"] == "2026-01-01T00:00:00+00:00"
+
+
+def test_stdlib_fallback_matches_orjson():
+    fallback = json.dumps(
+        ROW, default=responses._default, ensure_ascii=False, separators=(",", ":")
+    )
+    assert json.loads(fallback) == json.loads(responses.dumps(ROW))
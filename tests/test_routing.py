@@ -0,0 +1,79 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from freshkeeper.routing import (
+    PathNormalizeMiddleware,
+    RouteTable,
+    _route_entries,
+    normalize_path,
+)
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/products")
+    def list_products():
+        return "list"
+
+    @app.get("/products/{product_id}")
+    def get_product(product_id: int):
+        return product_id
+
+    @app.post("/products")
+    def create_product():
+        return "root"
+
+    @app.post("/api/products")
+    def create_product_api():
+        return "api"
+
+    @app.get("/storage-locations")
+    def storage():
+        return "storage"
+
+    app.add_middleware(PathNormalizeMiddleware)
+    return app
+
+
+def test_normalize_path():
+    table = RouteTable(_app().router.routes)
+    cases = {
+        ("GET", "/api/v1/products/"): "/products",
+        ("GET", "/api/products"): "/products",
+        ("GET", "/api/products/list"): "/products",
+        ("GET", "/api/v1/products/12/details"): "/products/12",
+        ("GET", "/api/storage_locations"): "/storage-locations",
+        ("GET", "/api/storage"): "/storage-locations",
+        ("GET", "/products/{x}/"): "/products/{x}",
+        ("GET", "/"): "/",
+        ("GET", "/api"): "/",
+        ("GET", "/apis/x"): "/apis/x",
+        # POST /api/products a son propre handler : le préfixe est conservé
+        ("POST", "/api/v1/products/"): "/api/products",
+        ("POST", "/products/"): "/products",
+    }
+    for (method, path), expected in cases.items():
+        assert normalize_path(path, method, table) == expected, (method, path)
+
+
+def test_middleware_serves_every_form():
+    client = TestClient(_app())
+    for path in ("/products", "/products/", "/api/products", "/api/v1/products/"):
+        assert client.get(path).json() == "list"
+    assert client.get("/api/v1/products/3/details").json() == 3
+    assert client.get("/api/storage_locations/").json() == "storage"
+    assert client.post("/api/v1/products").json() == "api"
+    assert client.post("/products/").json() == "root"
+    assert client.get("/api/nope").status_code == 404
+
+
+def test_main_app_routes_are_declared_once():
+    from freshkeeper.main import app
+
+    seen = set()
+    for path, _, methods in _route_entries(app.router.routes):
+        assert not path.startswith("/api/v1"), path
+        for method in methods or ():
+            assert (method, path) not in seen, (method, path)
+            seen.add((method, path))
@@ -0,0 +1,110 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+from freshkeeper.query_stats import capture_queries
+from freshkeeper.services.seed_import import _iter_json, import_catalog
+
+SEED = (
+    Path(__file__).resolve().parents[1] / "freshkeeper" / "data" / "seed_products.json"
+)
+
+
+def _products(engine):
+    with engine.connect() as c:
+        return {
+            r.name: r
+            for r in c.execute(
+                text(
+                    """
+                    SELECT p.name, p.category, pc.name AS category_name,
+                           p.aliases, p.shelf_life
+                      FROM products p
+                      LEFT JOIN product_categories pc ON pc.id = p.category_id
+                    """
+                )
+            )
+        }
+
+
+def test_json_stream_matches_json_load():
+    doc = SEED.read_bytes()
+    data = json.loads(doc)
+    expected = [("category", c) for c in data["categories"]] + [
+        ("product", p) for p in data["products"]
+    ]
+    # blocs minuscules : chaînes, nombres et séparateurs coupés entre deux lectures
+    assert list(_iter_json(io.BytesIO(doc), chunk_size=3)) == expected
+    assert list(_iter_json(io.BytesIO(b'\xef\xbb\xbf[{"name": "x"}]'))) == [
+        ("product", {"name": "x"})
+    ]
+
+
+def test_import_json_set_based_and_rerun_is_noop(pg_engine, tmp_path):
+    data = json.loads(SEED.read_bytes())
+    with capture_queries() as stats:
+        first = import_catalog(pg_engine, SEED, batch_size=1000)
+    # tables de travail + une transaction : COPY et fusion ensembliste
+    assert stats.count <= 8
+    assert first.created == len({p["name"].lower() for p in data["products"]})
+    assert first.categories == len(data["categories"])
+    assert not Path(str(SEED) + ".progress.json").exists()
+
+    banane = _products(pg_engine)["banane"]
+    assert banane.category == banane.category_name == "fruit"
+    assert banane.aliases == ["bananes"]
+    assert banane.shelf_life == {"pantry": 5, "fridge": 7}
+
+    again = import_catalog(pg_engine, SEED, batch_size=1000)
+    assert (again.created, again.updated, again.categories) == (0, 0, 0)
+
+
+def test_interrupted_import_resumes_after_last_batch(pg_engine, tmp_path):
+    path = tmp_path / "catalogue.ndjson"
+    lines = [{"name": f"produit {i}", "category": "sec"} for i in range(45)]
+    # catégorie après les produits qui la citent : rattachée a posteriori
+    lines.append({"type": "category", "name": "sec", "shelf_life": {"pantry": 90}})
+    path.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+
+    def crash(stats, fraction):
+        if stats.records >= 20:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        import_catalog(pg_engine, path, batch_size=10, progress=crash)
+    state = json.loads((tmp_path / "catalogue.ndjson.progress.json").read_text())
+    assert state["done"] == 20
+    assert len(_products(pg_engine)) == 20
+
+    seen = []
+    stats = import_catalog(
+        pg_engine, path, batch_size=10, progress=lambda s, f: seen.append(f)
+    )
+    assert stats.resumed_from == 20 and stats.records == len(lines)
+    assert stats.created == 25 and seen[-1] == 1.0
+    assert not (tmp_path / "catalogue.ndjson.progress.json").exists()
+    products = _products(pg_engine)
+    assert len(products) == 45
+    assert {p.category_name for p in products.values()} == {"sec"}
+
+
+def test_import_csv(pg_engine, tmp_path):
+    path = tmp_path / "catalogue.csv"
+    path.write_text(
+        "type,name,category,aliases,shelf_life_fridge\n"
+        "category,laitage,,,7\n"
+        ",yaourt,laitage,yaourts|yogourt,14\n"
+        ",  ,laitage,,\n"
+        ',Lait,laitage,"[""lait demi-écrémé""]",\n',
+        encoding="utf-8-sig",
+    )
+    stats = import_catalog(pg_engine, path)
+    assert (stats.created, stats.skipped) == (2, 1)
+    products = _products(pg_engine)
+    assert products["yaourt"].aliases == ["yaourts", "yogourt"]
+    assert products["yaourt"].shelf_life == {"fridge": 14}
+    assert products["Lait"].aliases == ["lait demi-écrémé"]
+    assert products["Lait"].category_name == "laitage"
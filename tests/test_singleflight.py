@@ -0,0 +1,134 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from starlette.requests import Request
+
+import freshkeeper.main as main
+from freshkeeper.singleflight import Scope, SingleFlight, flight_key, flights
+
+
+def _request(query: bytes = b"", headers=()):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "query_string": query,
+            "headers": list(headers),
+        }
+    )
+
+
+def test_key_normalization_and_scope():
+    everything = Scope()
+    assert flight_key("r", _request(b"b=2&a=%201"), everything) == flight_key(
+        "r", _request(b"a=1&b=2"), everything
+    )
+    only_a = Scope(params=("a",))
+    assert flight_key("r", _request(b"a=1&_=123"), only_a) == flight_key(
+        "r", _request(b"a=1&_=456"), only_a
+    )
+    per_client = Scope(params=(), headers=("authorization",))
+    assert flight_key(
+        "r", _request(headers=[(b"authorization", b"A")]), per_client
+    ) != (flight_key("r", _request(headers=[(b"authorization", b"B")]), per_client))
+
+
+def test_concurrent_calls_share_one_execution():
+    sf = SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait(5)
+        return b"[]"
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        futures = [pool.submit(sf.do, "k", slow, "r") for _ in range(20)]
+        time.sleep(0.2)  # tous les appels sont en vol
+        gate.set()
+        results = [f.result() for f in futures]
+
+    assert results == [b"[]"] * 20
+    assert len(calls) == 1
+    assert sf.stats()["routes"]["r"]["executions"] == 1
+    assert sf.stats()["routes"]["r"]["coalesced"] == 19
+    assert sf.stats()["in_flight"] == 0
+
+    # le vol est terminé : un nouvel appel relance le calcul
+    gate.set()
+    sf.do("k", slow, "r")
+    assert len(calls) == 2
+
+
+def test_error_is_shared_with_waiters():
+    sf = SingleFlight()
+    gate = threading.Event()
+
+    def boom():
+        gate.wait(5)
+        raise RuntimeError("db down")
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(sf.do, "k", boom, "r") for _ in range(5)]
+        time.sleep(0.2)
+        gate.set()
+        for f in futures:
+            with pytest.raises(RuntimeError):
+                f.result()
+    assert sf.stats()["routes"]["r"]["errors"] == 1
+
+
+def test_inventory_route_runs_query_once(monkeypatch):
+    queries = []
+
+    def slow_sql_all(q):
+        queries.append(q)
+        time.sleep(0.3)
+        return [{"id": 1, "product_id": 7, "quantity": 1}]
+
+    monkeypatch.setattr(main, "_sql_all", slow_sql_all)
+    before = flights.stats()["routes"].get("inventory", {}).get("coalesced", 0)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(
+            pool.map(
+                lambda i: main.api_inventory_alias(_request(f"_={i}".encode())),
+                range(10),
+            )
+        )
+    assert len(queries) == 1
+    assert {r.body for r in responses} == {
+        b'[{"product_id":7,"lots":[{"id":1,"product_id":7,"quantity":1}]}]'
+    }
+    assert flights.stats()["routes"]["inventory"]["coalesced"] - before == 9
+
+
+def test_dashboard_summary_is_served_and_coalesced(client, monkeypatch):
+    import routers.dashboard as dashboard
+
+    calls = []
+    summary = {
+        "total_products": 3,
+        "total_lots": 4,
+        "expired_count": 1,
+        "soon_count": 1,
+        "green_count": 2,
+        "need_to_buy_count": 0,
+        "nearest_expiry": None,
+    }
+
+    def slow_summary(db):
+        calls.append(1)
+        time.sleep(0.3)
+        return summary
+
+    monkeypatch.setattr(dashboard, "_summary", slow_summary)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(
+            pool.map(lambda _: client.get("/api/dashboard/summary"), range(10))
+        )
+    assert {r.status_code for r in responses} == {200}
+    assert all(r.json() == summary for r in responses)
+    assert len(calls) == 1
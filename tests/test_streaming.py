@@ -0,0 +1,49 @@
+import json
+from datetime import date
+
+from sqlalchemy import text
+
+import freshkeeper.database as database
+
+
+def _seed(engine):
+    with engine.begin() as c:
+        c.execute(text("TRUNCATE alerts, lots, products RESTART IDENTITY CASCADE"))
+        c.execute(text("INSERT INTO products (name) VALUES ('lait'), ('beurre')"))
+        # lots entrelacés : 1=p1, 2=p2, 3=p1, 4=p2, 5=p1
+        for i, pid in enumerate((1, 2, 1, 2, 1)):
+            c.execute(
+                text(
+                    "INSERT INTO lots (product_id, quantity, unit, expiry_date, "
+                    "storage_location_id) VALUES (:p, 1.5, :u, :e, 1)"
+                ),
+                {"p": pid, "u": f"u{i}", "e": date(2030, 1, i + 1)},
+            )
+
+
+def _lines(resp):
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+
+def test_ndjson_lots_and_inventory(client, pg_engine, monkeypatch):
+    monkeypatch.setattr(database, "get_engine", lambda url=None: pg_engine)
+    _seed(pg_engine)
+
+    lots = _lines(client.get("/api/lots", headers={"Accept": "application/x-ndjson"}))
+    assert [r["id"] for r in lots] == [1, 2, 3, 4, 5]
+    assert lots[0] == {
+        "id": 1,
+        "product_id": 1,
+        "quantity": 1.5,
+        "unit": "u0",
+        "expiry_date": "2030-01-01",
+        "storage_location_id": 1,
+    }
+
+    inventory = _lines(client.get("/api/inventory?stream=1"))
+    assert [(g["product_id"], [r["id"] for r in g["lots"]]) for g in inventory] == [
+        (1, [1, 3, 5]),
+        (2, [2, 4]),
+    ]
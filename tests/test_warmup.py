@@ -0,0 +1,34 @@
+import time
+
+from sqlalchemy import text
+
+from freshkeeper.jobs.warmup import CANCELLED, DONE, Warmup
+
+
+def test_warmup_ready_before_scan_and_cancellable(pg_engine):
+    def slow_scan():
+        with pg_engine.connect() as conn:
+            conn.execute(text("SELECT pg_sleep(30)"))
+
+    warmup = Warmup(pg_engine)
+    primed = []
+    warmup.register_primer("categories", lambda: primed.append(1))
+    warmup.set_scan(slow_scan)
+    assert warmup.status()["ready"] is False
+
+    warmup.start()
+    deadline = time.monotonic() + 10
+    while warmup.steps["first_scan_done"] != "running":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    # le trafic peut être admis alors que le scan tourne encore
+    assert warmup.ready and primed == [1]
+    assert warmup.steps["pool_warmed"] == DONE
+
+    t0 = time.monotonic()
+    assert warmup.cancel() is True
+    warmup.join(timeout=10)
+    assert time.monotonic() - t0 < 5  # requête annulée, pas 30 s d'attente
+    assert warmup.steps["first_scan_done"] == CANCELLED
+    assert "first_scan_done" in warmup.status()["errors"]